@@ -2,10 +2,21 @@ import os
 import logging
 from typing import Dict, Any, Optional, List
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 logger = logging.getLogger(__name__)
 
+# Shared client configuration: a connection pool large enough for concurrent
+# transfers and adaptive retries with client-side rate limiting.
+AWS_CLIENT_CONFIG = Config(
+    max_pool_connections=64,
+    retries={'max_attempts': 10, 'mode': 'adaptive'},
+    tcp_keepalive=True,
+    s3={'use_accelerate_endpoint': False, 'addressing_style': 'virtual'}
+)
+
 class CloudManager:
     """Manages cloud infrastructure and resources."""
     
@@ -19,10 +30,23 @@ class CloudManager:
     def _initialize_clients(self):
         """Initialize cloud service clients based on provider."""
         if self.provider == 'aws':
-            self.s3_client = boto3.client('s3', region_name=self.region)
-            self.s3_resource = boto3.resource('s3', region_name=self.region)
-            self.sagemaker_client = boto3.client('sagemaker', region_name=self.region)
-            self.cloudwatch_client = boto3.client('cloudwatch', region_name=self.region)
+            self.s3_client = boto3.client(
+                's3', region_name=self.region, config=AWS_CLIENT_CONFIG
+            )
+            self.s3_resource = boto3.resource(
+                's3', region_name=self.region, config=AWS_CLIENT_CONFIG
+            )
+            self.sagemaker_client = boto3.client(
+                'sagemaker', region_name=self.region, config=AWS_CLIENT_CONFIG
+            )
+            self.cloudwatch_client = boto3.client(
+                'cloudwatch', region_name=self.region, config=AWS_CLIENT_CONFIG
+            )
+            self._transfer_config = TransferConfig(
+                multipart_threshold=8 * 1024 * 1024,
+                multipart_chunksize=8 * 1024 * 1024,
+                max_concurrency=10
+            )
         else:
             raise ValueError(f"Unsupported cloud provider: {self.provider}")
             
@@ -66,6 +90,52 @@ class CloudManager:
             logger.error(f"Failed to download file: {str(e)}")
             return False
             
+    def copy_object(self, src_bucket: str, src_key: str, dst_bucket: str, dst_key: str) -> bool:
+        """Copy an object within cloud storage without routing bytes through the client.
+        
+        Large objects are copied server-side in parallel parts (UploadPartCopy).
+        
+        Args:
+            src_bucket: Source bucket name
+            src_key: Source object key
+            dst_bucket: Destination bucket name
+            dst_key: Destination object key
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            self.s3_client.copy(
+                {'Bucket': src_bucket, 'Key': src_key},
+                dst_bucket,
+                dst_key,
+                Config=self._transfer_config
+            )
+            logger.info(f"Successfully copied {src_bucket}/{src_key} to {dst_bucket}/{dst_key}")
+            return True
+        except ClientError as e:
+            logger.error(f"Failed to copy object: {str(e)}")
+            return False
+            
+    def delete_file(self, remote_path: str, bucket: Optional[str] = None) -> bool:
+        """Delete a file from cloud storage.
+        
+        Args:
+            remote_path: Path in cloud storage
+            bucket: Optional bucket name, defaults to configured bucket
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            bucket = bucket or self.config['storage']['bucket_name']
+            self.s3_client.delete_object(Bucket=bucket, Key=remote_path)
+            logger.info(f"Successfully deleted {bucket}/{remote_path}")
+            return True
+        except ClientError as e:
+            logger.error(f"Failed to delete file: {str(e)}")
+            return False
+            
     def list_files(self, prefix: str = "", bucket: Optional[str] = None) -> List[str]:
         """List files in cloud storage.
         
@@ -2,13 +2,15 @@ import boto3
 import logging
 from botocore.exceptions import ClientError
 
+from cloud.cloud_manager import AWS_CLIENT_CONFIG
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def create_project_bucket(bucket_name: str, region: str = 'us-west-2'):
     """Create an S3 bucket for the project."""
     try:
-        s3_client = boto3.client('s3', region_name=region)
+        s3_client = boto3.client('s3', region_name=region, config=AWS_CLIENT_CONFIG)
         
         # Create bucket with location constraint
         location = {'LocationConstraint': region}
@@ -34,14 +34,16 @@ class FileDataSource(DataSource):
             '.json': self._read_json,
             '.parquet': self._read_parquet
         }
+        
+        # Resolve the reader once so unsupported files fail at construction
+        file_ext = Path(file_path).suffix.lower()
+        if file_ext not in self.supported_formats:
+            raise ValueError(f"Unsupported file format: {file_ext}")
+        self._reader = self.supported_formats[file_ext]
     
     def read_data(self) -> Union[pd.DataFrame, Dict, List]:
         """Read data from file."""
-        file_ext = Path(self.file_path).suffix.lower()
-        if file_ext not in self.supported_formats:
-            raise ValueError(f"Unsupported file format: {file_ext}")
-        
-        return self.supported_formats[file_ext]()
+        return self._reader()
     
     def _read_csv(self) -> pd.DataFrame:
         """Read CSV file."""
@@ -134,11 +136,17 @@ class IngestionPipeline:
                 if not self.validators[source_type](data):
                     raise ValueError(f"Data validation failed for {source_type}")
             
-            # Convert data to JSON if it's a DataFrame
+            # Write DataFrames as zstd-compressed Parquet; columnar output is
+            # much smaller and faster to serialize than record-oriented JSON
             if isinstance(data, pd.DataFrame):
-                temp_file = Path('data/temp/temp_data.json')
+                temp_file = Path('data/temp/temp_data.parquet')
                 temp_file.parent.mkdir(parents=True, exist_ok=True)
-                data.to_json(temp_file, orient='records')
+                data.to_parquet(
+                    temp_file,
+                    engine='pyarrow',
+                    compression='zstd',
+                    compression_level=3
+                )
                 file_path = str(temp_file)
             else:
                 # Save data to temporary file
@@ -126,6 +126,50 @@ class StorageManager:
             logger.error(f"Error storing data: {str(e)}")
             raise
     
+    def move_data(self,
+                  storage_path: str,
+                  category: str,
+                  subcategory: str) -> str:
+        """Move stored data to another category without re-uploading it.
+        
+        The object is copied server-side and the source is removed once the
+        copy has succeeded, e.g. to promote ``raw/`` data to ``processed/``.
+        
+        Args:
+            storage_path: Current path in cloud storage
+            category: Destination category (raw/processed/models/metadata)
+            subcategory: Destination subcategory within category
+            
+        Returns:
+            New cloud storage path of the data
+        """
+        if category not in self.storage_structure:
+            raise ValueError(f"Invalid category: {category}")
+        if subcategory not in self.storage_structure[category]:
+            raise ValueError(f"Invalid subcategory: {subcategory}")
+        
+        try:
+            bucket = self._get_bucket_name()
+            new_path = f"{category}/{subcategory}/{Path(storage_path).name}"
+            
+            if not self.cloud_manager.copy_object(
+                src_bucket=bucket,
+                src_key=storage_path,
+                dst_bucket=bucket,
+                dst_key=new_path
+            ):
+                raise RuntimeError(f"Failed to copy {storage_path} to {new_path}")
+            
+            if not self.cloud_manager.delete_file(remote_path=storage_path, bucket=bucket):
+                raise RuntimeError(
+                    f"Copied {storage_path} to {new_path} but failed to delete the source"
+                )
+            return new_path
+            
+        except Exception as e:
+            logger.error(f"Error moving data: {str(e)}")
+            raise
+    
     def _store_metadata(self, path: str, metadata: Dict):
         """Store metadata for a data file."""
         try:
@@ -1,10 +1,14 @@
 import requests
-from typing import Dict, Any, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import aiohttp
+import asyncio
+import orjson
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 from datetime import datetime
 from .base_connector import BaseConnector
 import json
-import backoff
 
 logger = logging.getLogger(__name__)
 
@@ -17,13 +21,34 @@ class APIConnector(BaseConnector):
         self.headers = config.get('headers', {})
         self.auth = config.get('auth')
         self.session = None
+        self.async_session = None
         self.timeout = config.get('timeout', 30)
         self.verify_ssl = config.get('verify_ssl', True)
+        self.pool_connections = config.get('pool_connections', 32)
+        self.pool_maxsize = config.get('pool_maxsize', 64)
     
     def connect(self) -> bool:
         """Establish connection session."""
         try:
             self.session = requests.Session()
+            
+            # Reuse pooled keep-alive connections and retry transient failures
+            adapter = HTTPAdapter(
+                pool_connections=self.pool_connections,
+                pool_maxsize=self.pool_maxsize,
+                max_retries=Retry(
+                    total=3,
+                    connect=3,
+                    read=3,
+                    backoff_factor=0.3,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                    respect_retry_after_header=True
+                )
+            )
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+            self.session.headers.update({'Connection': 'keep-alive'})
             self.session.headers.update(self.headers)
             if self.auth:
                 self.session.auth = tuple(self.auth)
@@ -54,20 +79,44 @@ class APIConnector(BaseConnector):
             logger.error(f"Error disconnecting from API: {str(e)}")
             return False
     
-    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=3)
+    async def aconnect(self) -> bool:
+        """Establish an asynchronous connection session."""
+        try:
+            self.async_session = aiohttp.ClientSession(
+                headers=self.headers,
+                auth=aiohttp.BasicAuth(*self.auth) if self.auth else None,
+                connector=aiohttp.TCPConnector(
+                    limit=100,
+                    keepalive_timeout=85,
+                    ssl=self.verify_ssl
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            logger.info("Successfully established async API session")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error creating async API session: {str(e)}")
+            return False
+    
+    async def adisconnect(self) -> bool:
+        """Close the asynchronous connection session."""
+        try:
+            if self.async_session:
+                await self.async_session.close()
+                self.async_session = None
+            return True
+        except Exception as e:
+            logger.error(f"Error closing async API session: {str(e)}")
+            return False
+    
     def fetch_data(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Fetch data from API endpoint."""
         try:
             if not self.session:
                 raise ConnectionError("Not connected to API")
             
-            # Parse query parameters
-            endpoint = query.get('endpoint', '')
-            method = query.get('method', 'GET')
-            params = query.get('params', {})
-            data = query.get('data')
-            
-            url = f"{self.base_url.rstrip('/')}/{endpoint.lstrip('/')}"
+            method, url, params, data = self._build_request(query)
             
             # Make request
             response = self.session.request(
@@ -80,22 +129,77 @@ class APIConnector(BaseConnector):
             )
             response.raise_for_status()
             
-            # Parse response
-            result = response.json()
-            if isinstance(result, list):
-                return result
-            elif isinstance(result, dict):
-                # Handle paginated results
-                if 'data' in result:
-                    return result['data']
-                return [result]
-            else:
-                raise ValueError(f"Unexpected response format: {type(result)}")
+            return self._parse_result(orjson.loads(response.content))
             
         except Exception as e:
             logger.error(f"Error fetching API data: {str(e)}")
             raise
     
+    async def afetch_data(self, queries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Fetch data for several queries concurrently.
+        
+        Args:
+            queries: Query dictionaries in the same format as ``fetch_data``
+            
+        Returns:
+            Results for each query, in the order the queries were given
+        """
+        try:
+            if not self.async_session:
+                raise ConnectionError("Not connected to API")
+            
+            return await asyncio.gather(*[self._afetch_one(query) for query in queries])
+            
+        except Exception as e:
+            logger.error(f"Error fetching API data: {str(e)}")
+            raise
+    
+    def fetch_many(self, queries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Synchronous wrapper around ``afetch_data``."""
+        async def _run():
+            if not await self.aconnect():
+                raise ConnectionError("Could not create async API session")
+            try:
+                return await self.afetch_data(queries)
+            finally:
+                await self.adisconnect()
+        
+        return asyncio.run(_run())
+    
+    async def _afetch_one(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Fetch a single query on the async session."""
+        method, url, params, data = self._build_request(query)
+        async with self.async_session.request(
+            method,
+            url,
+            params=params,
+            json=data if data else None
+        ) as response:
+            response.raise_for_status()
+            return self._parse_result(orjson.loads(await response.read()))
+    
+    def _build_request(self, query: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any], Any]:
+        """Parse query parameters into request arguments."""
+        endpoint = query.get('endpoint', '')
+        method = query.get('method', 'GET')
+        params = query.get('params', {})
+        data = query.get('data')
+        
+        url = f"{self.base_url.rstrip('/')}/{endpoint.lstrip('/')}"
+        return method, url, params, data
+    
+    def _parse_result(self, result: Any) -> List[Dict[str, Any]]:
+        """Normalize a decoded API response into a list of records."""
+        if isinstance(result, list):
+            return result
+        elif isinstance(result, dict):
+            # Handle paginated results
+            if 'data' in result:
+                return result['data']
+            return [result]
+        else:
+            raise ValueError(f"Unexpected response format: {type(result)}")
+    
     def validate_connection(self) -> bool:
         """Validate API connection is active."""
         try:
@@ -1,10 +1,31 @@
 from sqlalchemy import create_engine, text
-from typing import Dict, Any, List
+from sqlalchemy.engine import make_url
+from typing import Dict, Any, List, Iterator, Mapping
+import io
 import logging
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from .base_connector import BaseConnector
 
 logger = logging.getLogger(__name__)
 
+# Postgres type OIDs whose COPY text Arrow parses to the same value the
+# driver returns. Other columns are read as text and cast by the driver.
+_PG_ARROW_TYPES = {
+    16: pa.bool_(),             # bool
+    20: pa.int64(),             # int8
+    21: pa.int16(),             # int2
+    23: pa.int32(),             # int4
+    25: pa.string(),            # text
+    700: pa.float64(),          # float4, returned as a Python float
+    701: pa.float64(),          # float8
+    1042: pa.string(),          # bpchar
+    1043: pa.string(),          # varchar
+    1082: pa.date32(),          # date
+    1114: pa.timestamp('us')    # timestamp without time zone
+}
+_PG_NUMERIC = 1700
+
 class DatabaseConnector(BaseConnector):
     """Connector for SQL databases."""
     
@@ -13,11 +34,26 @@ class DatabaseConnector(BaseConnector):
         self.connection_string = config['connection_string']
         self.engine = None
         self.batch_size = config.get('batch_size', 1000)
+        self.pool_size = config.get('pool_size', 10)
+        self.max_overflow = config.get('max_overflow', 20)
+        self.pool_timeout = config.get('pool_timeout', 30)
     
     def connect(self) -> bool:
         """Establish database connection."""
         try:
-            self.engine = create_engine(self.connection_string)
+            engine_kwargs = {
+                'pool_pre_ping': True,
+                'pool_recycle': 3600,
+                'execution_options': {'stream_results': True}
+            }
+            # SQLite uses single-connection pools that reject sizing options
+            if make_url(self.connection_string).get_backend_name() != 'sqlite':
+                engine_kwargs.update(
+                    pool_size=self.pool_size,
+                    max_overflow=self.max_overflow,
+                    pool_timeout=self.pool_timeout
+                )
+            self.engine = create_engine(self.connection_string, **engine_kwargs)
             # Test connection
             with self.engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
@@ -50,14 +86,135 @@ class DatabaseConnector(BaseConnector):
             if not sql:
                 raise ValueError("SQL query is required")
             
+            # Bulk pulls on Postgres skip per-row marshaling via COPY
+            if query.get('use_copy') and self.engine.dialect.name == 'postgresql':
+                return self._copy_rows(sql, params)
+            
+            # The engine defaults to server-side cursors; pull rows in
+            # batch_size chunks so the driver does not buffer a second copy
+            # of the full result set
             with self.engine.connect() as conn:
                 result = conn.execute(text(sql), params)
-                return [dict(zip(result.keys(), row)) for row in result]
+                keys = tuple(result.keys())
+                rows = []
+                while True:
+                    chunk = result.fetchmany(self.batch_size)
+                    if not chunk:
+                        break
+                    rows.extend(dict(zip(keys, row)) for row in chunk)
+                return rows
                 
         except Exception as e:
             logger.error(f"Error fetching database data: {str(e)}")
             raise
     
+    def stream_data(self, query: Dict[str, Any]) -> Iterator[List[Mapping[str, Any]]]:
+        """Stream query results in batches using a server-side cursor.
+        
+        Rows are yielded as read-only mappings, ``batch_size`` at a time, so
+        memory use is bounded by the batch rather than the full result set.
+        """
+        try:
+            if not self.engine:
+                raise ConnectionError("Not connected to database")
+            
+            sql = query.get('sql')
+            params = query.get('params', {})
+            
+            if not sql:
+                raise ValueError("SQL query is required")
+            
+            with self.engine.connect().execution_options(
+                stream_results=True,
+                yield_per=self.batch_size
+            ) as conn:
+                result = conn.execute(text(sql), params)
+                for partition in result.partitions(self.batch_size):
+                    yield [row._mapping for row in partition]
+                    
+        except Exception as e:
+            logger.error(f"Error streaming database data: {str(e)}")
+            raise
+    
+    def _copy_rows(self, sql: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Run a query through Postgres COPY, returning the same values as
+        the cursor path.
+        
+        COPY does not accept bind parameters, so they are rendered into the
+        statement by the engine dialect before it is sent.
+        """
+        from psycopg2.extensions import string_types
+        
+        statement = text(sql).bindparams(**params) if params else text(sql)
+        compiled = statement.compile(
+            dialect=self.engine.dialect,
+            compile_kwargs={'literal_binds': True}
+        )
+        
+        raw_conn = self.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            # Plan the query without reading rows to learn its column types
+            cursor.execute(f"SELECT * FROM ({compiled}) AS copy_query LIMIT 0")
+            description = cursor.description
+            
+            rows = self._copy_to_table(cursor, compiled, description).to_pylist()
+            
+            # Columns Arrow reads as text are cast by the driver's own
+            # typecasters, e.g. unconstrained NUMERIC to Decimal
+            casters = {
+                column.name: string_types[column.type_code]
+                for column in description
+                if column.type_code not in _PG_ARROW_TYPES
+                and self._arrow_type(column) == pa.string()
+                and column.type_code in string_types
+            }
+            if casters:
+                for row in rows:
+                    for name, cast in casters.items():
+                        if row[name] is not None:
+                            row[name] = cast(row[name], cursor)
+            
+            cursor.close()
+        finally:
+            raw_conn.close()
+        
+        return rows
+    
+    def _copy_to_table(self, cursor: Any, compiled: Any, description: Any) -> pa.Table:
+        """COPY a compiled query to CSV and parse it into an Arrow table.
+        
+        Column types come from the cursor description rather than being
+        inferred from the text, so values like "00123" stay strings.
+        """
+        buffer = io.BytesIO()
+        cursor.copy_expert(f"COPY ({compiled}) TO STDOUT WITH CSV HEADER", buffer)
+        
+        # COPY writes NULL unquoted, empty strings as "" and booleans as t/f
+        buffer.seek(0)
+        return pa_csv.read_csv(
+            buffer,
+            convert_options=pa_csv.ConvertOptions(
+                column_types={column.name: self._arrow_type(column) for column in description},
+                null_values=[''],
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False,
+                true_values=['t'],
+                false_values=['f']
+            )
+        )
+    
+    def _arrow_type(self, column: Any) -> pa.DataType:
+        """Arrow type that parses a result column's COPY text losslessly."""
+        if column.type_code == _PG_NUMERIC:
+            # Declared NUMERIC(p, s) fits a decimal; unconstrained NUMERIC
+            # is left as text for the driver to cast
+            precision, scale = column.precision, column.scale
+            if precision and 0 < precision <= 38 and scale is not None and scale >= 0:
+                return pa.decimal128(precision, scale)
+            return pa.string()
+        return _PG_ARROW_TYPES.get(column.type_code, pa.string())
+    
     def validate_connection(self) -> bool:
         """Validate database connection is active."""
         try:
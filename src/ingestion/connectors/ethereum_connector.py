@@ -1,11 +1,33 @@
 from web3 import Web3
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Sequence
 import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import httpx
 from .base_connector import BaseConnector
+from .httpx_provider import HTTPXProvider
 
 logger = logging.getLogger(__name__)
 
+_fromtimestamp = datetime.fromtimestamp
+
+def _copy_block(block: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a formatted block and its transactions.
+    
+    Cached blocks are handed out as copies so a caller mutating its result
+    cannot alter the cached block seen by later fetches.
+    """
+    return {
+        **block,
+        'transactions': [
+            dict(tx) if isinstance(tx, dict) else tx
+            for tx in block['transactions']
+        ]
+    }
+
 class EthereumConnector(BaseConnector):
     """Connector for Ethereum blockchain data."""
     
@@ -14,13 +36,36 @@ class EthereumConnector(BaseConnector):
         self.provider_url = config['provider_url']
         self.web3 = None
         self.start_block = config.get('start_block', 'latest')
+        self.max_batch = config.get('max_batch', 100)
+        self.concurrency = config.get('concurrency', 16)
+        self._client = None
+        self._pool = None
+        self._local = threading.local()
+        
+        # Blocks deeper than finality_depth are immutable, so formatted
+        # copies can be served from an LRU cache on re-reads
+        self.finality_depth = config.get('finality_depth', 64)
+        self.block_cache_size = config.get('block_cache_size', 4096)
+        self._block_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
     
     def connect(self) -> bool:
         """Establish connection to Ethereum node."""
         try:
+            # Share one HTTP/2 client so concurrent fetches multiplex over a
+            # few keep-alive connections
+            self._client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=64,
+                    max_keepalive_connections=32
+                ),
+                timeout=30.0
+            )
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency)
+            
             # Create Web3 instance with provider
-            provider = Web3.HTTPProvider(self.provider_url)
-            self.web3 = Web3(provider)
+            self.web3 = self._create_web3()
             
             # Test connection
             try:
@@ -42,6 +87,13 @@ class EthereumConnector(BaseConnector):
         """Close connection to Ethereum node."""
         try:
             self.web3 = None
+            if self._pool:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            if self._client:
+                self._client.close()
+                self._client = None
+            self._local = threading.local()
             return True
         except Exception as e:
             logger.error(f"Error disconnecting from Ethereum node: {str(e)}")
@@ -57,15 +109,57 @@ class EthereumConnector(BaseConnector):
             end_block = query.get('end_block', 'latest')
             include_transactions = query.get('include_transactions', True)
             
+            head = None
             if end_block == 'latest':
-                end_block = self.web3.eth.block_number
+                end_block = head = self.web3.eth.block_number
             if start_block == 'latest':
                 start_block = end_block
             
-            blocks = []
-            for block_num in range(start_block, end_block + 1):
-                block = self.web3.eth.get_block(block_num, include_transactions)
-                blocks.append(self._format_block(block))
+            block_numbers = range(start_block, end_block + 1)
+            blocks = [None] * len(block_numbers)
+            
+            # Serve finalized blocks from the cache and fetch only the rest
+            missing = []
+            with self._cache_lock:
+                for i, block_num in enumerate(block_numbers):
+                    key = (block_num, include_transactions)
+                    cached = self._block_cache.get(key)
+                    if cached is None:
+                        missing.append(i)
+                    else:
+                        self._block_cache.move_to_end(key)
+                        blocks[i] = _copy_block(cached)
+            
+            if not missing:
+                return blocks
+            
+            # Submit blocks as JSON-RPC batches, keeping several batches in
+            # flight at once; map() preserves block order
+            chunks = [
+                missing[i:i + self.max_batch]
+                for i in range(0, len(missing), self.max_batch)
+            ]
+            fetched_blocks = self._pool.map(
+                lambda chunk: self._fetch_blocks(
+                    [block_numbers[j] for j in chunk],
+                    include_transactions
+                ),
+                chunks
+            )
+            for chunk, fetched in zip(chunks, fetched_blocks):
+                for i, block in zip(chunk, fetched):
+                    blocks[i] = self._format_block(block)
+            
+            if self.block_cache_size:
+                if head is None:
+                    head = self.web3.eth.block_number
+                self._cache_blocks(
+                    blocks,
+                    block_numbers,
+                    missing,
+                    include_transactions,
+                    head - self.finality_depth
+                )
             
             return blocks
             
@@ -73,6 +167,38 @@ class EthereumConnector(BaseConnector):
             logger.error(f"Error fetching Ethereum data: {str(e)}")
             raise
     
+    def _create_web3(self) -> Web3:
+        """Create a Web3 instance backed by the shared HTTP/2 client."""
+        return Web3(HTTPXProvider(self.provider_url, client=self._client))
+    
+    def _cache_blocks(self,
+                      blocks: List[Dict[str, Any]],
+                      block_numbers: range,
+                      indices: List[int],
+                      include_transactions: bool,
+                      finalized: int):
+        """Cache newly fetched blocks at or below the finalized height."""
+        with self._cache_lock:
+            for i in indices:
+                if block_numbers[i] > finalized:
+                    continue
+                self._block_cache[(block_numbers[i], include_transactions)] = _copy_block(blocks[i])
+                if len(self._block_cache) > self.block_cache_size:
+                    self._block_cache.popitem(last=False)
+    
+    def _fetch_blocks(self, block_numbers: Sequence[int], include_transactions: bool) -> List[Any]:
+        """Fetch a range of blocks in a single JSON-RPC batch request."""
+        # Batching is tracked on the provider, so each worker thread uses
+        # its own Web3 instance
+        web3 = getattr(self._local, 'web3', None)
+        if web3 is None:
+            web3 = self._local.web3 = self._create_web3()
+        
+        with web3.batch_requests() as batch:
+            for block_num in block_numbers:
+                batch.add(web3.eth.get_block(block_num, include_transactions))
+            return batch.execute()
+    
     def validate_connection(self) -> bool:
         """Validate connection to Ethereum node."""
         try:
@@ -82,15 +208,21 @@ class EthereumConnector(BaseConnector):
     
     def _format_block(self, block: Any) -> Dict[str, Any]:
         """Format block data for storage."""
+        # A block holds either full transactions or only hashes, so pick
+        # the formatting path once instead of per transaction
+        transactions = block['transactions']
+        if transactions and isinstance(transactions[0], Mapping):
+            format_tx = self._format_transaction
+            formatted_txs = [format_tx(tx) for tx in transactions]
+        else:
+            formatted_txs = [tx.hex() for tx in transactions]
+        
         return {
             'number': block['number'],
             'hash': block['hash'].hex(),
             'parent_hash': block['parentHash'].hex(),
-            'timestamp': datetime.fromtimestamp(block['timestamp']),
-            'transactions': [
-                self._format_transaction(tx) if isinstance(tx, dict) else tx.hex()
-                for tx in block['transactions']
-            ],
+            'timestamp': _fromtimestamp(block['timestamp']),
+            'transactions': formatted_txs,
             'gas_used': block['gasUsed'],
             'gas_limit': block['gasLimit'],
             'base_fee_per_gas': block.get('baseFeePerGas'),
@@ -0,0 +1,52 @@
+from typing import Any, List, Tuple, Union
+import logging
+import httpx
+from web3.providers.base import JSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+logger = logging.getLogger(__name__)
+
+class HTTPXProvider(JSONBaseProvider):
+    """Web3 JSON-RPC provider backed by a shared ``httpx.Client``.
+
+    With an HTTP/2 client, concurrent requests from many threads are
+    multiplexed over a few connections instead of opening one per request.
+    """
+
+    def __init__(self, endpoint_uri: str, client: httpx.Client, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.endpoint_uri = endpoint_uri
+        self.client = client
+
+    def __str__(self) -> str:
+        return f"HTTPX connection {self.endpoint_uri}"
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        """Send a single JSON-RPC request."""
+        raw_response = self._post(self.encode_rpc_request(method, params))
+        return self.decode_rpc_response(raw_response)
+
+    def make_batch_request(
+        self, batch_requests: List[Tuple[RPCEndpoint, Any]]
+    ) -> Union[List[RPCResponse], RPCResponse]:
+        """Send several JSON-RPC requests in one HTTP request."""
+        raw_response = self._post(self.encode_batch_rpc_request(batch_requests))
+        response = self.decode_rpc_response(raw_response)
+        if not isinstance(response, list):
+            # RPC errors return a single error object for the whole batch
+            return response
+        return sorted(response, key=lambda r: r['id'])
+
+    def _post(self, request_data: bytes) -> bytes:
+        """POST encoded request data and return the raw response body."""
+        try:
+            response = self.client.post(
+                self.endpoint_uri,
+                content=request_data,
+                headers={'Content-Type': 'application/json'}
+            )
+            response.raise_for_status()
+            return response.content
+        except httpx.TransportError as e:
+            # Web3 treats OSError as "not connected"
+            raise ConnectionError(str(e)) from e
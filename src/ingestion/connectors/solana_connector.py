@@ -1,11 +1,19 @@
 from solana.rpc.api import Client
 from typing import Dict, Any, List
+from collections import namedtuple
 import logging
 from datetime import datetime
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
 from .base_connector import BaseConnector
 
 logger = logging.getLogger(__name__)
 
+# Compact per-transaction record; blocks can carry thousands of these.
+# Use ``_asdict()`` where a dict view is needed.
+TxRecord = namedtuple('TxRecord', 'signature slot error fee status')
+
 class SolanaConnector(BaseConnector):
     """Connector for Solana blockchain data."""
     
@@ -14,6 +22,9 @@ class SolanaConnector(BaseConnector):
         self.endpoint = config['endpoint']
         self.client = None
         self.commitment = config.get('commitment', 'confirmed')
+        self.batch_size = config.get('batch_size', 100)
+        self.timeout = config.get('timeout', 30)
+        self._session = None
     
     def connect(self) -> bool:
         """Establish connection to Solana node."""
@@ -21,6 +32,12 @@ class SolanaConnector(BaseConnector):
             # Create Solana client
             self.client = Client(self.endpoint)
             
+            # Keep-alive session for batched JSON-RPC requests
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+            
             # Test connection with version check
             try:
                 response = self.client.get_version()
@@ -47,6 +64,9 @@ class SolanaConnector(BaseConnector):
         """Close connection to Solana node."""
         try:
             self.client = None
+            if self._session:
+                self._session.close()
+                self._session = None
             return True
         except Exception as e:
             logger.error(f"Error disconnecting from Solana node: {str(e)}")
@@ -61,22 +81,57 @@ class SolanaConnector(BaseConnector):
             slot = query.get('slot')
             until_slot = query.get('until_slot', slot)
             
-            blocks = []
-            for current_slot in range(slot, until_slot + 1):
-                response = self.client.get_block(
-                    current_slot,
-                    encoding='json',
-                    commitment=self.commitment
-                )
-                if 'result' in response:
-                    blocks.append(self._format_block(response['result']))
+            # Request slots as JSON-RPC batches to pay one round-trip per chunk
+            slots = range(slot, until_slot + 1)
+            blocks = [None] * len(slots)
+            count = 0
+            for i in range(0, len(slots), self.batch_size):
+                for result in self._fetch_blocks(slots[i:i + self.batch_size]):
+                    blocks[count] = self._format_block(result)
+                    count += 1
             
+            # Drop the unused tail left by skipped slots
+            del blocks[count:]
             return blocks
             
         except Exception as e:
             logger.error(f"Error fetching Solana data: {str(e)}")
             raise
     
+    def _fetch_blocks(self, slots: range) -> List[Dict[str, Any]]:
+        """Fetch several slots in a single JSON-RPC batch request.
+        
+        Skipped or unavailable slots return an error instead of a result and
+        are left out, matching the per-slot behaviour of ``get_block``.
+        """
+        payload = [
+            {
+                'jsonrpc': '2.0',
+                'id': i,
+                'method': 'getBlock',
+                'params': [
+                    current_slot,
+                    {
+                        'encoding': 'json',
+                        'commitment': self.commitment,
+                        'maxSupportedTransactionVersion': 0
+                    }
+                ]
+            }
+            for i, current_slot in enumerate(slots)
+        ]
+        response = self._session.post(self.endpoint, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        
+        responses = orjson.loads(response.content)
+        if not isinstance(responses, list):
+            # RPC errors return a single error object for the whole batch
+            error = responses.get('error', responses) if isinstance(responses, dict) else responses
+            raise ValueError(f"Solana batch request failed: {error}")
+        
+        responses.sort(key=lambda r: r['id'])
+        return [r['result'] for r in responses if r.get('result')]
+    
     def validate_connection(self) -> bool:
         """Validate connection to Solana node."""
         try:
@@ -101,12 +156,14 @@ class SolanaConnector(BaseConnector):
             'block_time': block.get('blockTime')
         }
     
-    def _format_transaction(self, tx: Dict[str, Any]) -> Dict[str, Any]:
+    def _format_transaction(self, tx: Dict[str, Any]) -> TxRecord:
         """Format transaction data for storage."""
-        return {
-            'signature': tx['transaction']['signatures'][0],
-            'slot': tx['slot'],
-            'error': tx.get('meta', {}).get('err'),
-            'fee': tx.get('meta', {}).get('fee'),
-            'status': 'success' if not tx.get('meta', {}).get('err') else 'failed'
-        } 
\ No newline at end of file
+        meta = tx.get('meta') or {}
+        err = meta.get('err')
+        return TxRecord(
+            tx['transaction']['signatures'][0],
+            tx['slot'],
+            err,
+            meta.get('fee'),
+            'success' if err is None else 'failed'
+        ) 
\ No newline at end of file
@@ -1,37 +1,84 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
+import csv
+import io
 import logging
 from datetime import datetime
+import orjson
 from sqlalchemy import text
+from psycopg2.extras import execute_values
 from src.storage.storage_optimizer import StorageOptimizer
 
 logger = logging.getLogger(__name__)
 
+COLUMNS = ('timestamp', 'data', 'metadata', 'version')
+
+# Statements are built once and reused for every batch
+_INSERT_STMT = text(
+    "INSERT INTO processed_data (timestamp, data, metadata, version) "
+    "VALUES (:timestamp, :data, :metadata, :version)"
+)
+_INSERT_VALUES_SQL = f"INSERT INTO processed_data ({', '.join(COLUMNS)}) VALUES %s"
+_COPY_SQL = f"COPY processed_data ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# Keys may be block numbers and values may include non-JSON types such as
+# Decimal, which are stored as their string form
+_JSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+# Batches at least this large are streamed with COPY instead of INSERT
+COPY_THRESHOLD = 100
+
+def _dumps(value: Any) -> str:
+    """Serialize a value to JSON text."""
+    return orjson.dumps(value, default=str, option=_JSON_OPTIONS).decode()
+
 class DataLoader:
     """Load transformed data into storage."""
-    
-    def __init__(self, storage: StorageOptimizer):
+
+    def __init__(self, storage: StorageOptimizer, page_size: int = 1000,
+                 copy_threshold: int = COPY_THRESHOLD):
         self.storage = storage
-        
+        self.page_size = page_size
+        self.copy_threshold = copy_threshold
+
     def load_data(self, data: Dict[str, Any], data_type: str) -> bool:
-        """Load data into appropriate storage."""
+        """Load a single record into appropriate storage."""
+        return self.load_data_batch([data], data_type)
+
+    def load_data_batch(self, items: List[Dict[str, Any]], data_type: str) -> bool:
+        """Load a batch of records in one transaction.
+
+        Args:
+            items: Records to store
+            data_type: Type of data being loaded
+
+        Returns:
+            True if every record was stored
+        """
         try:
+            if not items:
+                return True
+
             # Add metadata
-            data_with_metadata = self._add_metadata(data, data_type)
-            
+            timestamp = datetime.now()
+            rows = [
+                self._to_row(self._add_metadata(item, data_type), timestamp)
+                for item in items
+            ]
+
             # Store in database
-            success = self._store_in_db(data_with_metadata)
-            
+            success = self._store_in_db(rows)
+
             if success:
-                logger.info(f"Successfully loaded {data_type} data")
+                logger.info(f"Successfully loaded {len(rows)} {data_type} records")
                 # Trigger storage optimization
                 self.storage.compress_old_data(f"{data_type}_data")
                 return True
             return False
-            
+
         except Exception as e:
             logger.error(f"Error loading data: {str(e)}")
             return False
-    
+
     def _add_metadata(self, data: Dict[str, Any], data_type: str) -> Dict[str, Any]:
         """Add metadata to the data before storage."""
         return {
@@ -42,26 +89,56 @@ class DataLoader:
                 'version': '1.0'
             }
         }
-    
-    def _store_in_db(self, data_with_metadata: Dict[str, Any]) -> bool:
-        """Store data in database."""
+
+    def _to_row(self, data_with_metadata: Dict[str, Any], timestamp: datetime) -> Tuple:
+        """Build an INSERT row in ``COLUMNS`` order.
+
+        ``data`` and ``metadata`` are encoded as JSON text, which Postgres
+        coerces on insert into JSONB columns.
+        """
+        return (
+            timestamp,
+            _dumps(data_with_metadata['data']),
+            _dumps(data_with_metadata['metadata']),
+            '1.0'
+        )
+
+    def _store_in_db(self, rows: List[Tuple]) -> bool:
+        """Store rows in database."""
         try:
             with self.storage.SessionFactory() as session:
-                session.execute(
-                    text("""
-                        INSERT INTO processed_data 
-                        (timestamp, data, metadata, version) 
-                        VALUES (:timestamp, :data, :metadata, :version)
-                    """),
-                    {
-                        'timestamp': datetime.now(),
-                        'data': str(data_with_metadata['data']),
-                        'metadata': str(data_with_metadata['metadata']),
-                        'version': '1.0'
-                    }
-                )
+                connection = session.connection()
+                if connection.dialect.name == 'postgresql':
+                    raw_conn = connection.connection
+                    if len(rows) >= self.copy_threshold:
+                        self._bulk_copy(raw_conn, rows)
+                    else:
+                        # Send multi-row VALUES pages instead of one round
+                        # trip per record
+                        with raw_conn.cursor() as cursor:
+                            execute_values(
+                                cursor,
+                                _INSERT_VALUES_SQL,
+                                rows,
+                                template="(%s, %s, %s, %s)",
+                                page_size=self.page_size
+                            )
+                else:
+                    session.execute(
+                        _INSERT_STMT,
+                        [dict(zip(COLUMNS, row)) for row in rows]
+                    )
                 session.commit()
                 return True
         except Exception as e:
             logger.error(f"Database storage error: {str(e)}")
-            return False 
\ No newline at end of file
+            return False
+
+    def _bulk_copy(self, raw_conn: Any, rows: List[Tuple]):
+        """Stream rows into processed_data with a single COPY FROM STDIN."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+
+        with raw_conn.cursor() as cursor:
+            cursor.copy_expert(_COPY_SQL, buffer)
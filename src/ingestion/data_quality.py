@@ -1,34 +1,122 @@
 from typing import Dict, Any, List
 import logging
+import time
+from collections import OrderedDict
 from datetime import datetime
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Required field sets, built once and checked with C-level subset tests
+_REQUIRED_FIELDS = frozenset({'timestamp', 'blocks'})
+_REQUIRED_BLOCK_FIELDS = frozenset({'number', 'hash', 'timestamp'})
+_COMPLETE_BLOCK_FIELDS = frozenset({'number', 'hash', 'timestamp', 'transactions'})
+_COMPLETE_TX_FIELDS = frozenset({'hash', 'from', 'to', 'value'})
+
+def _count_missing(stack: List[Dict[str, Any]]):
+    """Count missing and total fields across nested dicts.
+    
+    Returns:
+        Tuple of (missing_count, total_fields)
+    """
+    missing_count = 0
+    total_fields = 0
+    
+    # Walk nested dicts with an explicit stack instead of recursing, with
+    # builtins bound locally for the per-field loop
+    _dict = dict
+    _list = list
+    _isinstance = isinstance
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        for v in pop().values():
+            total_fields += 1
+            if v is None or v == '':
+                missing_count += 1
+            elif _isinstance(v, _dict):
+                push(v)
+            elif _isinstance(v, _list):
+                for item in v:
+                    if _isinstance(item, _dict):
+                        push(item)
+    
+    return missing_count, total_fields
+
+def _missing_summary(missing_count: int, total_fields: int) -> Dict[str, Any]:
+    """Format missing-value counts as a metrics entry."""
+    return {
+        'count': missing_count,
+        'total': total_fields,
+        'percentage': (missing_count / total_fields * 100) if total_fields > 0 else 0
+    }
+
+def _is_sequential(numbers: List[int]) -> bool:
+    """Check that block numbers increase by exactly one."""
+    if len(numbers) < 2:
+        return True
+    return bool((np.diff(np.asarray(numbers, dtype=np.int64)) == 1).all())
+
+def _timestamps_ordered(timestamps: List[Any]) -> bool:
+    """Check that timestamps are non-decreasing."""
+    if len(timestamps) < 2:
+        return True
+    
+    first = timestamps[0]
+    if isinstance(first, str):
+        first = datetime.fromisoformat(first)
+    if not isinstance(first, datetime):
+        # Epoch numbers and other plain values compare directly
+        return all(t1 <= t2 for t1, t2 in zip(timestamps, timestamps[1:]))
+    
+    if first.tzinfo is None:
+        # Naive values compare as int64 nanoseconds in one vector op
+        try:
+            values = np.array(timestamps, dtype='datetime64[ns]')
+            return bool((values[1:] >= values[:-1]).all())
+        except (TypeError, ValueError):
+            pass
+    
+    # numpy has no timezone support, so aware or unusual values are
+    # compared as Python datetimes
+    parsed = [
+        datetime.fromisoformat(t) if isinstance(t, str) else t
+        for t in timestamps
+    ]
+    return all(t1 <= t2 for t1, t2 in zip(parsed, parsed[1:]))
+
 class DataQualityChecker:
     """Check data quality during ingestion and transformation."""
     
-    def __init__(self):
-        self.quality_metrics = {}
+    def __init__(self, max_metrics: int = 1000):
+        # Bounded history of checks, oldest first
+        self.quality_metrics = OrderedDict()
+        self.max_metrics = max_metrics
         
     def check_data_quality(self, data: Dict[str, Any], stage: str) -> bool:
         """Check data quality at different pipeline stages."""
         try:
             # First check required fields
-            required_fields = {'timestamp', 'blocks'}
-            if not all(field in data for field in required_fields):
+            if not _REQUIRED_FIELDS.issubset(data):
                 logger.warning(f"Missing required fields in {stage}")
                 return False
             
+            # Gather every block-level metric in a single pass over the blocks
+            fused = self._single_pass(data)
+            
             metrics = {
                 'timestamp': datetime.now().isoformat(),
                 'stage': stage,
-                'total_records': self._count_records(data),
-                'missing_values': self._check_missing_values(data),
+                'total_records': fused['total_records'],
+                'missing_values': fused['missing_values'],
                 'data_types': self._validate_data_types(data),
-                'consistency': self.check_data_consistency(data)
+                'consistency': fused['consistency']
             }
             
-            self.quality_metrics[f"{stage}_{datetime.now().isoformat()}"] = metrics
+            # Monotonic keys are unique per check and cheaper than ISO strings
+            self.quality_metrics[(stage, time.monotonic_ns())] = metrics
+            if len(self.quality_metrics) > self.max_metrics:
+                self.quality_metrics.popitem(last=False)
             
             # Validate data quality
             if metrics['missing_values']['percentage'] > 20:
@@ -44,13 +132,12 @@ class DataQualityChecker:
                 return False
             
             # Additional validation for blocks
-            for block in data['blocks']:
-                if not isinstance(block, dict):
-                    logger.warning(f"Invalid block format in {stage}")
-                    return False
-                if not all(field in block for field in ['number', 'hash', 'timestamp']):
-                    logger.warning(f"Missing required block fields in {stage}")
-                    return False
+            if not fused['blocks_format_valid']:
+                logger.warning(f"Invalid block format in {stage}")
+                return False
+            if not fused['block_fields_valid']:
+                logger.warning(f"Missing required block fields in {stage}")
+                return False
             
             return True
             
@@ -66,28 +153,79 @@ class DataQualityChecker:
     
     def _check_missing_values(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Check for missing or null values."""
-        missing_count = 0
-        total_fields = 0
+        missing_count, total_fields = _count_missing([data])
+        return _missing_summary(missing_count, total_fields)
+    
+    def _single_pass(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Compute record, missing-value and consistency metrics in one pass.
+        
+        Each block is visited once; its fields are counted for missing values
+        and its transactions tallied, while block numbers and timestamps are
+        gathered for vectorized ordering checks.
+        
+        Args:
+            data: Payload with an optional ``blocks`` list
+            
+        Returns:
+            Dictionary of fused metrics
+        """
+        blocks = data.get('blocks')
+        if isinstance(blocks, list):
+            # Count top-level fields here and descend into blocks below
+            missing_count, total_fields = _count_missing(
+                [{k: v for k, v in data.items() if k != 'blocks'}]
+            )
+            total_fields += 1
+        else:
+            missing_count, total_fields = _count_missing([data])
+            blocks = []
         
-        def count_missing(d: Dict[str, Any]):
-            nonlocal missing_count, total_fields
-            for k, v in d.items():
-                total_fields += 1
-                if v is None or v == '':
-                    missing_count += 1
-                elif isinstance(v, dict):
-                    count_missing(v)
-                elif isinstance(v, list):
-                    for item in v:
-                        if isinstance(item, dict):
-                            count_missing(item)
+        _isinstance = isinstance
+        _dict = dict
+        required = _REQUIRED_BLOCK_FIELDS
         
-        count_missing(data)
+        numbers = []
+        timestamps = []
+        add_number = numbers.append
+        add_timestamp = timestamps.append
+        tx_total = 0
+        format_valid = fields_valid = True
+        
+        for block in blocks:
+            if not _isinstance(block, _dict):
+                format_valid = False
+                continue
+            
+            block_missing, block_total = _count_missing([block])
+            missing_count += block_missing
+            total_fields += block_total
+            tx_total += len(block.get('transactions', []))
+            
+            if not required.issubset(block):
+                fields_valid = False
+                continue
+            
+            add_number(block['number'])
+            add_timestamp(block['timestamp'])
+        
+        if 'blocks' in data:
+            reported_txs = data.get('transaction_metrics', {}).get('total_transactions', tx_total)
+            tx_counts_match = tx_total == reported_txs
+            total_records = len(data['blocks'])
+        else:
+            tx_counts_match = True
+            total_records = 1
         
         return {
-            'count': missing_count,
-            'total': total_fields,
-            'percentage': (missing_count / total_fields * 100) if total_fields > 0 else 0
+            'total_records': total_records,
+            'missing_values': _missing_summary(missing_count, total_fields),
+            'consistency': {
+                'block_sequence_valid': _is_sequential(numbers),
+                'transaction_counts_match': tx_counts_match,
+                'timestamps_valid': _timestamps_ordered(timestamps)
+            },
+            'blocks_format_valid': format_valid,
+            'block_fields_valid': fields_valid
         }
     
     def _validate_data_types(self, data: Dict[str, Any]) -> Dict[str, bool]:
@@ -104,65 +242,43 @@ class DataQualityChecker:
             'metrics': self.quality_metrics,
             'summary': {
                 'total_checks': len(self.quality_metrics),
-                'last_check': max(self.quality_metrics.keys()) if self.quality_metrics else None,
+                'last_check': self._last_check(),
                 'stages_checked': list(set(m['stage'] for m in self.quality_metrics.values()))
             }
         }
 
+    def _last_check(self):
+        """Return the timestamp of the most recent check, if any."""
+        if not self.quality_metrics:
+            return None
+        # Entries are inserted in check order, so the newest is last
+        latest = next(reversed(self.quality_metrics))
+        return self.quality_metrics[latest]['timestamp']
+
     def check_data_consistency(self, data: Dict[str, Any]) -> Dict[str, bool]:
         """Check data consistency and relationships."""
-        consistency = {
-            'block_sequence_valid': self._validate_block_sequence(data),
-            'transaction_counts_match': self._validate_transaction_counts(data),
-            'timestamps_valid': self._validate_timestamps(data)
-        }
-        return consistency
+        return self._single_pass(data)['consistency']
 
     def _validate_block_sequence(self, data: Dict[str, Any]) -> bool:
         """Validate that block numbers are sequential."""
-        if 'blocks' not in data:
-            return True
-        
-        block_numbers = [block['number'] for block in data['blocks']]
-        return all(
-            b2 - b1 == 1 
-            for b1, b2 in zip(block_numbers, block_numbers[1:])
-        )
+        return self.check_data_consistency(data)['block_sequence_valid']
 
     def _validate_transaction_counts(self, data: Dict[str, Any]) -> bool:
         """Validate transaction counts match across different parts of data."""
-        if 'blocks' not in data:
-            return True
-        
-        total_txs = sum(len(block.get('transactions', [])) for block in data['blocks'])
-        reported_txs = data.get('transaction_metrics', {}).get('total_transactions', total_txs)
-        return total_txs == reported_txs
+        return self.check_data_consistency(data)['transaction_counts_match']
 
     def _validate_timestamps(self, data: Dict[str, Any]) -> bool:
         """Validate timestamp ordering and ranges."""
-        if 'blocks' not in data:
-            return True
-        
-        timestamps = [
-            datetime.fromisoformat(block['timestamp']) 
-            if isinstance(block['timestamp'], str) 
-            else block['timestamp'] 
-            for block in data['blocks']
-        ]
-        
-        return all(t1 <= t2 for t1, t2 in zip(timestamps, timestamps[1:]))
+        return self.check_data_consistency(data)['timestamps_valid']
 
     def check_data_completeness(self, data: Dict[str, Any]) -> Dict[str, float]:
         """Check completeness of different data aspects."""
-        required_block_fields = {'number', 'hash', 'timestamp', 'transactions'}
-        required_tx_fields = {'hash', 'from', 'to', 'value'}
-        
         completeness = {
             'block_completeness': self._calculate_completeness(
-                data.get('blocks', []), required_block_fields
+                data.get('blocks', []), _COMPLETE_BLOCK_FIELDS
             ),
             'transaction_completeness': self._calculate_tx_completeness(
-                data.get('blocks', []), required_tx_fields
+                data.get('blocks', []), _COMPLETE_TX_FIELDS
             )
         }
         return completeness
@@ -182,9 +298,21 @@ class DataQualityChecker:
 
     def _calculate_tx_completeness(self, blocks: List[Dict], required_fields: set) -> float:
         """Calculate completeness percentage for transactions."""
-        all_txs = [
-            tx for block in blocks
-            for tx in block.get('transactions', [])
-            if isinstance(tx, dict)
-        ]
-        return self._calculate_completeness(all_txs, required_fields) 
\ No newline at end of file
+        # Count present fields directly instead of collecting every
+        # transaction into one list first
+        fields = tuple(required_fields)
+        field_count = len(fields)
+        total_fields = 0
+        present_fields = 0
+        for block in blocks:
+            for tx in block.get('transactions', ()):
+                if not isinstance(tx, dict):
+                    continue
+                total_fields += field_count
+                for field in fields:
+                    if tx.get(field) is not None:
+                        present_fields += 1
+        
+        if not total_fields:
+            return 100.0
+        return (present_fields / total_fields) * 100
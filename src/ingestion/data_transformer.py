@@ -1,4 +1,4 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 import logging
 from datetime import datetime
 from abc import ABC, abstractmethod
@@ -19,10 +19,11 @@ class BlockchainTransformer(DataTransformer):
     def transform(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Transform blockchain data into analyzable format."""
         try:
+            block_metrics, transaction_metrics = self._calculate_metrics(data['blocks'])
             transformed_data = {
                 'timestamp': data['timestamp'],
-                'block_metrics': self._calculate_block_metrics(data['blocks']),
-                'transaction_metrics': self._calculate_transaction_metrics(data['blocks']),
+                'block_metrics': block_metrics,
+                'transaction_metrics': transaction_metrics,
                 'raw_data': data  # Keep original data for reference
             }
             logger.info("Successfully transformed blockchain data")
@@ -31,25 +32,33 @@ class BlockchainTransformer(DataTransformer):
             logger.error(f"Error transforming data: {str(e)}")
             raise
     
-    def _calculate_block_metrics(self, blocks: List[Dict]) -> Dict[str, Any]:
-        """Calculate metrics from block data."""
-        return {
+    def _calculate_metrics(self, blocks: List[Dict]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Calculate block and transaction metrics in one pass over blocks."""
+        block_times = []
+        block_numbers = []
+        add_time = block_times.append
+        add_number = block_numbers.append
+        total_transactions = 0
+        for block in blocks:
+            add_time(block['timestamp'])
+            add_number(block['number'])
+            total_transactions += len(block['transactions'])
+        
+        block_metrics = {
             'total_blocks': len(blocks),
-            'block_times': [
-                block['timestamp'] for block in blocks
-            ],
-            'block_numbers': [
-                block['number'] for block in blocks
-            ]
+            'block_times': block_times,
+            'block_numbers': block_numbers
+        }
+        transaction_metrics = {
+            'total_transactions': total_transactions,
+            'transactions_per_block': total_transactions / len(blocks) if blocks else 0
         }
+        return block_metrics, transaction_metrics
+    
+    def _calculate_block_metrics(self, blocks: List[Dict]) -> Dict[str, Any]:
+        """Calculate metrics from block data."""
+        return self._calculate_metrics(blocks)[0]
     
     def _calculate_transaction_metrics(self, blocks: List[Dict]) -> Dict[str, Any]:
         """Calculate metrics from transaction data."""
-        all_transactions = []
-        for block in blocks:
-            all_transactions.extend(block['transactions'])
-            
-        return {
-            'total_transactions': len(all_transactions),
-            'transactions_per_block': len(all_transactions) / len(blocks) if blocks else 0
-        } 
\ No newline at end of file
+        return self._calculate_metrics(blocks)[1]
\ No newline at end of file
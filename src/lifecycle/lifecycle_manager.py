@@ -1,14 +1,23 @@
 from typing import Dict, Any, List, Optional
+import bisect
 import logging
 from datetime import datetime, timedelta
 import os
 import json
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 logger = logging.getLogger(__name__)
 
+# Per-directory index mapping file names to their metadata
+MANIFEST_NAME = 'manifest.json'
+
 class DataLifecycleManager:
     """Manage data lifecycle including retention, archival and cleanup."""
     
@@ -34,16 +43,53 @@ class DataLifecycleManager:
             }
         })
         
+        # Policies are static, so order them by retention once and bisect on
+        # age per item; the first policy listed wins a retention tie
+        by_retention = {}
+        for policy in self.policies.values():
+            if policy['retention_days'] > 0:
+                by_retention.setdefault(policy['retention_days'], policy)
+        self._retention_days = sorted(by_retention)
+        self._sorted_policies = [by_retention[days] for days in self._retention_days]
+        
+        # Manifests loaded so far, keyed by directory; the lock guards them
+        # while policies are applied from worker threads
+        self._manifests = {}
+        self._manifest_lock = threading.RLock()
+        
+        # Updates only mark a manifest dirty; each one is written once when
+        # a scan or policy pass flushes. Folded legacy sidecars are removed
+        # after their directory's manifest is written.
+        self._dirty_manifests = set()
+        self._folded_sidecars: Dict[str, List[str]] = {}
+        self.max_workers = config.get('lifecycle_workers', 16)
+        
         # Cloud storage settings
         self.use_cloud = config.get('use_cloud', False)
         if self.use_cloud:
+            # Bound uploads in flight across policy workers, and size the
+            # client's connection pool so every concurrent part PUT gets a
+            # kept-alive connection instead of a fresh TLS handshake
+            upload_concurrency = config.get('glacier_concurrency', 8)
+            part_concurrency = 10
+            self._upload_slots = threading.BoundedSemaphore(upload_concurrency)
+            
             self.s3_client = boto3.client(
                 's3',
                 aws_access_key_id=config.get('aws_access_key_id'),
                 aws_secret_access_key=config.get('aws_secret_access_key'),
-                region_name=config.get('aws_region')
+                region_name=config.get('aws_region'),
+                config=Config(max_pool_connections=upload_concurrency * part_concurrency)
             )
             self.bucket_name = config.get('bucket_name')
+            
+            # Upload large archives as parallel multipart transfers
+            self._transfer_config = TransferConfig(
+                multipart_threshold=8 * 1024 * 1024,
+                multipart_chunksize=8 * 1024 * 1024,
+                max_concurrency=part_concurrency,
+                use_threads=True
+            )
         
         # Create necessary directories
         os.makedirs(self.data_dir, exist_ok=True)
@@ -55,15 +101,21 @@ class DataLifecycleManager:
             # Get all data items with their metadata
             data_items = self._scan_data_directory()
             
+            pairs = []
             for item in data_items:
                 age_days = self._get_age_days(item['created_at'])
                 
                 # Determine appropriate policy
                 policy = self._get_applicable_policy(age_days)
                 if policy:
-                    self._apply_policy(item, policy)
+                    pairs.append((item, policy))
             
-            return True
+            # Moves and uploads are I/O bound, so overlap them across a pool
+            if pairs:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    list(executor.map(lambda pair: self._apply_policy(*pair), pairs))
+            
+            return self._flush_manifests()
             
         except Exception as e:
             logger.error(f"Error applying lifecycle policies: {e}")
@@ -73,42 +125,123 @@ class DataLifecycleManager:
         """Scan data directory and collect metadata."""
         items = []
         try:
-            for root, _, files in os.walk(self.data_dir):
-                for file in files:
-                    if file.endswith('.metadata'):
+            # One scandir pass per directory; DirEntry.stat() supplies size
+            # and times from a single syscall per file
+            pending = [self.data_dir]
+            while pending:
+                root = pending.pop()
+                manifest = self._load_manifest(root)
+                with os.scandir(root) as it:
+                    entries = list(it)
+                names = {entry.name for entry in entries}
+                
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                        continue
+                    if entry.name == MANIFEST_NAME or entry.name.endswith('.metadata'):
                         continue
-                        
-                    file_path = os.path.join(root, file)
-                    metadata = self._get_metadata(file_path)
                     
+                    metadata = manifest.get(entry.name)
+                    if metadata is None:
+                        metadata = {}
+                        if f"{entry.name}.metadata" in names:
+                            # Fold legacy sidecar files into the manifest
+                            metadata = self._read_sidecar(entry.path)
+                            self._update_metadata(entry.path, metadata)
+                            with self._manifest_lock:
+                                self._folded_sidecars.setdefault(root, []).append(
+                                    f"{entry.path}.metadata"
+                                )
+                    
+                    stat = entry.stat()
                     items.append({
-                        'path': file_path,
-                        'name': file,
-                        'size': os.path.getsize(file_path),
+                        'path': entry.path,
+                        'name': entry.name,
+                        'size': stat.st_size,
                         'created_at': metadata.get('created_at', 
-                            datetime.fromtimestamp(os.path.getctime(file_path)).isoformat()
+                            datetime.fromtimestamp(stat.st_ctime).isoformat()
                         ),
                         'last_accessed': metadata.get('last_accessed',
-                            datetime.fromtimestamp(os.path.getatime(file_path)).isoformat()
+                            datetime.fromtimestamp(stat.st_atime).isoformat()
                         ),
                         'storage_class': metadata.get('storage_class', 'local'),
-                        'metadata': metadata
+                        'metadata': dict(metadata)
                     })
             
+            self._flush_manifests()
             return items
             
         except Exception as e:
             logger.error(f"Error scanning data directory: {e}")
             return []
     
+    def _load_manifest(self, directory: str) -> Dict[str, Dict[str, Any]]:
+        """Load the metadata manifest for a directory, caching it."""
+        with self._manifest_lock:
+            manifest = self._manifests.get(directory)
+            if manifest is not None:
+                return manifest
+            
+            manifest = {}
+            manifest_path = os.path.join(directory, MANIFEST_NAME)
+            try:
+                with open(manifest_path, 'rb') as f:
+                    manifest = orjson.loads(f.read())
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Error reading manifest {manifest_path}: {e}")
+            
+            self._manifests[directory] = manifest
+            return manifest
+    
+    def _write_manifest(self, directory: str, manifest: Dict[str, Dict[str, Any]]):
+        """Atomically replace the manifest for a directory."""
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(manifest))
+        os.replace(tmp_path, manifest_path)
+    
+    def _flush_manifests(self) -> bool:
+        """Write every dirty manifest once, then drop folded sidecars."""
+        success = True
+        with self._manifest_lock:
+            dirty, self._dirty_manifests = self._dirty_manifests, set()
+            for directory in dirty:
+                try:
+                    self._write_manifest(directory, self._manifests[directory])
+                except Exception as e:
+                    logger.error(f"Error writing manifest for {directory}: {e}")
+                    self._dirty_manifests.add(directory)
+                    success = False
+                    continue
+                
+                for sidecar_path in self._folded_sidecars.pop(directory, ()):
+                    try:
+                        os.remove(sidecar_path)
+                    except FileNotFoundError:
+                        pass
+                    except Exception as e:
+                        logger.warning(f"Error removing sidecar {sidecar_path}: {e}")
+        return success
+    
+    def _read_sidecar(self, file_path: str) -> Dict[str, Any]:
+        """Read a legacy per-file ``.metadata`` sidecar."""
+        try:
+            with open(f"{file_path}.metadata", 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading metadata for {file_path}: {e}")
+            return {}
+    
     def _get_metadata(self, file_path: str) -> Dict[str, Any]:
         """Get metadata for a data file."""
         try:
-            metadata_path = f"{file_path}.metadata"
-            if os.path.exists(metadata_path):
-                with open(metadata_path, 'r') as f:
-                    return json.load(f)
-            return {}
+            directory, name = os.path.split(file_path)
+            with self._manifest_lock:
+                return dict(self._load_manifest(directory).get(name, {}))
             
         except Exception as e:
             logger.error(f"Error reading metadata for {file_path}: {e}")
@@ -117,15 +250,32 @@ class DataLifecycleManager:
     def _update_metadata(self, file_path: str, metadata: Dict[str, Any]) -> bool:
         """Update metadata for a data file."""
         try:
-            metadata_path = f"{file_path}.metadata"
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f)
+            directory, name = os.path.split(file_path)
+            with self._manifest_lock:
+                self._load_manifest(directory)[name] = metadata
+                self._dirty_manifests.add(directory)
             return True
             
         except Exception as e:
             logger.error(f"Error updating metadata for {file_path}: {e}")
             return False
     
+    def _remove_metadata(self, file_path: str) -> bool:
+        """Drop a data file's manifest entry and any legacy sidecar."""
+        try:
+            directory, name = os.path.split(file_path)
+            with self._manifest_lock:
+                manifest = self._load_manifest(directory)
+                if manifest.pop(name, None) is not None:
+                    self._dirty_manifests.add(directory)
+            if os.path.exists(f"{file_path}.metadata"):
+                os.remove(f"{file_path}.metadata")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error removing metadata for {file_path}: {e}")
+            return False
+    
     def _get_age_days(self, timestamp: str) -> int:
         """Calculate age in days from ISO timestamp."""
         try:
@@ -137,16 +287,9 @@ class DataLifecycleManager:
     
     def _get_applicable_policy(self, age_days: int) -> Optional[Dict[str, Any]]:
         """Get the applicable policy based on data age."""
-        applicable_policy = None
-        max_retention = 0
-        
-        for policy_name, policy in self.policies.items():
-            retention_days = policy['retention_days']
-            if age_days > retention_days and retention_days > max_retention:
-                applicable_policy = policy
-                max_retention = retention_days
-        
-        return applicable_policy
+        # Longest retention period that the item has outlived
+        i = bisect.bisect_left(self._retention_days, age_days)
+        return self._sorted_policies[i - 1] if i else None
     
     def _apply_policy(self, item: Dict[str, Any], policy: Dict[str, Any]) -> bool:
         """Apply lifecycle policy to a data item."""
@@ -178,13 +321,9 @@ class DataLifecycleManager:
             )
             os.makedirs(os.path.dirname(archive_path), exist_ok=True)
             
-            # Move file and metadata
+            # Move file and its manifest entry
             shutil.move(item['path'], archive_path)
-            if os.path.exists(f"{item['path']}.metadata"):
-                shutil.move(
-                    f"{item['path']}.metadata",
-                    f"{archive_path}.metadata"
-                )
+            self._remove_metadata(item['path'])
             
             # Update metadata
             metadata = item['metadata']
@@ -207,12 +346,16 @@ class DataLifecycleManager:
             
         try:
             # Upload to S3 Glacier
-            with open(item['path'], 'rb') as f:
-                self.s3_client.upload_fileobj(
-                    f,
+            with self._upload_slots:
+                self.s3_client.upload_file(
+                    item['path'],
                     self.bucket_name,
                     f"glacier/{item['name']}",
-                    ExtraArgs={'StorageClass': 'GLACIER'}
+                    ExtraArgs={
+                        'StorageClass': 'GLACIER',
+                        'ChecksumAlgorithm': 'CRC32'
+                    },
+                    Config=self._transfer_config
                 )
             
             # Update metadata and move to archive
@@ -231,8 +374,7 @@ class DataLifecycleManager:
         """Delete data and its metadata."""
         try:
             os.remove(item['path'])
-            if os.path.exists(f"{item['path']}.metadata"):
-                os.remove(f"{item['path']}.metadata")
+            self._remove_metadata(item['path'])
             
             logger.info(f"Deleted {item['path']}")
             return True
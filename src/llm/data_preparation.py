@@ -1,15 +1,27 @@
 from typing import Dict, Any, List, Optional, Union, Iterator
 import logging
 from pathlib import Path
+import hashlib
 import json
+import orjson
 import torch
 from torch.utils.data import Dataset, DataLoader
 from transformers import PreTrainedTokenizer
 import pandas as pd
-from datasets import load_dataset, Dataset as HFDataset
+from datasets import load_dataset, load_from_disk, Dataset as HFDataset
 
 logger = logging.getLogger(__name__)
 
+# Written next to a cached tokenized dataset to detect stale entries
+CACHE_MANIFEST = 'cache_manifest.json'
+
+def _iter_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield records from a JSONL file one line at a time."""
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
+
 class TrainingDataset(Dataset):
     """Custom dataset for LLM training data."""
     
@@ -26,9 +38,86 @@ class TrainingDataset(Dataset):
         self.max_length = max_length
         self.cache_dir = cache_dir or 'cache'
         
-        # Load and prepare data
-        self.data = self._load_data()
-        self.processed_data = self._preprocess_data()
+        # Reuse a tokenized copy from an earlier run when one is cached;
+        # Arrow files are memory-mapped, so loader workers share the pages
+        # instead of copying a list of tensors on fork
+        cache_path = self._tokenized_cache_path()
+        fingerprint = self._cache_fingerprint()
+        self.processed_data = self._load_cached(cache_path, fingerprint)
+        if self.processed_data is not None:
+            self.data = None
+        else:
+            # Load and prepare data
+            self.data = self._load_data()
+            self.processed_data = self._preprocess_data()
+            if len(self.processed_data):
+                self._save_cached(cache_path, fingerprint)
+        
+        self.processed_data.set_format('torch')
+    
+    def _tokenized_cache_path(self) -> Path:
+        """Get the cache location for this config, tokenizer and length."""
+        key = json.dumps({
+            'config': self.config,
+            'tokenizer': getattr(self.tokenizer, 'name_or_path', type(self.tokenizer).__name__),
+            'max_length': self.max_length
+        }, sort_keys=True, default=str)
+        digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+        return Path(self.cache_dir) / f"tokenized_{digest}"
+    
+    def _cache_fingerprint(self) -> Dict[str, str]:
+        """Hash the tokenizer vocabulary and local source files.
+        
+        The cache path only covers configuration, so a retrained tokenizer
+        or edited data files under the same names must invalidate it here.
+        """
+        vocab = hashlib.sha256()
+        get_vocab = getattr(self.tokenizer, 'get_vocab', None)
+        if callable(get_vocab):
+            vocab.update(json.dumps(sorted(get_vocab().items()), default=str).encode())
+        vocab.update(str(getattr(self.tokenizer, 'special_tokens_map', '')).encode())
+        
+        source = hashlib.sha256()
+        data_source = self.config.get('source', {})
+        if data_source.get('type', 'local') == 'local' and data_source.get('path'):
+            path = Path(data_source['path'])
+            files = sorted(path.glob('**/*')) if path.is_dir() else [path]
+            for file_path in files:
+                if file_path.is_file():
+                    stat = file_path.stat()
+                    source.update(f"{file_path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        
+        return {'vocab': vocab.hexdigest(), 'source': source.hexdigest()}
+    
+    def _load_cached(self, cache_path: Path, fingerprint: Dict[str, str]) -> Optional[HFDataset]:
+        """Load a cached tokenized dataset if its manifest still matches."""
+        manifest_path = cache_path / CACHE_MANIFEST
+        try:
+            if not manifest_path.exists():
+                return None
+            with open(manifest_path, 'r') as f:
+                if json.load(f) != fingerprint:
+                    logger.info(f"Tokenized cache at {cache_path} is stale")
+                    return None
+            
+            logger.info(f"Loading tokenized dataset from {cache_path}")
+            return load_from_disk(str(cache_path), keep_in_memory=False)
+            
+        except Exception as e:
+            logger.warning(f"Error loading tokenized cache: {e}")
+            return None
+    
+    def _save_cached(self, cache_path: Path, fingerprint: Dict[str, str]):
+        """Save the tokenized dataset and its manifest."""
+        try:
+            # Drop any stale manifest first and write the new one last, so a
+            # partial save is never reused
+            (cache_path / CACHE_MANIFEST).unlink(missing_ok=True)
+            self.processed_data.save_to_disk(str(cache_path))
+            with open(cache_path / CACHE_MANIFEST, 'w') as f:
+                json.dump(fingerprint, f)
+        except Exception as e:
+            logger.warning(f"Error caching tokenized dataset: {e}")
     
     def _load_data(self) -> HFDataset:
         """Load data from various sources."""
@@ -58,6 +147,23 @@ class TrainingDataset(Dataset):
     
     def _load_local_data(self, path: str) -> HFDataset:
         """Load data from local files."""
+        records = self._iter_local_records(path)
+        first = next(records, None)
+        if first is None:
+            raise ValueError(f"No records found in {path}")
+        
+        # Build columns in one pass over the records, keyed by the first
+        # record's fields
+        columns = {k: [v] for k, v in first.items()}
+        appends = [(k, column.append) for k, column in columns.items()]
+        for record in records:
+            for k, append in appends:
+                append(record[k])
+        
+        return HFDataset.from_dict(columns)
+    
+    def _iter_local_records(self, path: str) -> Iterator[Dict[str, Any]]:
+        """Yield records from a local file or every data file under a directory."""
         data_path = Path(path)
         
         if not data_path.exists():
@@ -66,31 +172,29 @@ class TrainingDataset(Dataset):
         if data_path.is_file():
             # Single file loading
             if data_path.suffix == '.json':
-                with open(data_path, 'r') as f:
-                    data = json.load(f)
+                with open(data_path, 'rb') as f:
+                    yield from orjson.loads(f.read())
             elif data_path.suffix == '.jsonl':
-                data = [json.loads(line) for line in open(data_path)]
+                yield from _iter_jsonl(data_path)
             elif data_path.suffix == '.csv':
-                data = pd.read_csv(data_path).to_dict('records')
+                yield from pd.read_csv(data_path).to_dict('records')
             else:
                 raise ValueError(f"Unsupported file format: {data_path.suffix}")
         else:
             # Directory loading
-            data = []
             for file_path in data_path.glob('**/*'):
                 if file_path.suffix in ['.json', '.jsonl', '.csv']:
-                    data.extend(self._load_local_data(str(file_path)))
-        
-        return HFDataset.from_dict({k: [d[k] for d in data] for k in data[0].keys()})
+                    yield from self._iter_local_records(str(file_path))
     
     def _load_custom_data(self, source_config: Dict[str, Any]) -> HFDataset:
         """Load data from custom source."""
         # Implement custom data loading logic
         raise NotImplementedError("Custom data loading not implemented")
     
-    def _preprocess_data(self) -> List[Dict[str, torch.Tensor]]:
+    def _preprocess_data(self) -> HFDataset:
         """Preprocess and tokenize data."""
-        processed = []
+        input_texts = []
+        target_texts = []
         
         # Get column mappings from config
         column_map = self.config.get('column_mapping', {
@@ -110,48 +214,64 @@ class TrainingDataset(Dataset):
                 if isinstance(target_text, (list, tuple)):
                     target_text = ' '.join(target_text)
                 
-                # Tokenize
-                tokenized = self._tokenize_text(input_text, target_text)
-                if tokenized:
-                    processed.append(tokenized)
+                input_texts.append(input_text)
+                target_texts.append(target_text or input_text)
                 
             except Exception as e:
                 logger.warning(f"Error processing item: {e}")
                 continue
         
-        return processed
+        # Tokenize the whole dataset in one call so fast tokenizers can
+        # encode in parallel
+        tokenized = self._tokenize_batch(input_texts, target_texts) if input_texts else None
+        if tokenized is None and input_texts:
+            # A single bad record fails the whole batch; retry one item at a
+            # time so only the records that cannot be encoded are dropped
+            logger.warning("Batch tokenization failed; falling back to per-item tokenization")
+            tokenized = {}
+            for input_text, target_text in zip(input_texts, target_texts):
+                item = self._tokenize_batch([input_text], [target_text])
+                if item is None:
+                    continue
+                for key, values in item.items():
+                    tokenized.setdefault(key, []).extend(values)
+        if not tokenized:
+            tokenized = {'input_ids': [], 'attention_mask': [], 'labels': []}
+        
+        return HFDataset.from_dict(tokenized)
     
-    def _tokenize_text(
+    def _tokenize_batch(
         self,
-        input_text: str,
-        target_text: Optional[str] = None
-    ) -> Optional[Dict[str, torch.Tensor]]:
-        """Tokenize input and target text."""
+        input_texts: List[str],
+        target_texts: List[str]
+    ) -> Optional[Dict[str, List[List[int]]]]:
+        """Tokenize input and target texts as a batch."""
         try:
-            # Tokenize input
+            if not getattr(self.tokenizer, 'is_fast', True):
+                logger.warning("Slow tokenizer in use; batch encoding will not be parallel")
+            
+            # Tokenize inputs
             inputs = self.tokenizer(
-                input_text,
+                input_texts,
                 max_length=self.max_length,
                 padding='max_length',
-                truncation=True,
-                return_tensors='pt'
+                truncation=True
             )
             
-            # Tokenize target if provided
-            if target_text and target_text != input_text:
+            # Targets equal to their inputs encode identically, so only a
+            # batch with differing targets needs a second pass
+            if target_texts != input_texts:
                 labels = self.tokenizer(
-                    target_text,
+                    target_texts,
                     max_length=self.max_length,
                     padding='max_length',
-                    truncation=True,
-                    return_tensors='pt'
+                    truncation=True
                 )
                 inputs['labels'] = labels['input_ids']
             else:
-                inputs['labels'] = inputs['input_ids'].clone()
+                inputs['labels'] = inputs['input_ids']
             
-            # Convert to single tensors
-            return {k: v.squeeze(0) for k, v in inputs.items()}
+            return dict(inputs)
             
         except Exception as e:
             logger.warning(f"Error tokenizing text: {e}")
@@ -189,13 +309,25 @@ class DataPreparationPipeline:
                 cache_dir=self.cache_dir
             )
             
+            # Keep workers alive across epochs and prefetch further ahead;
+            # both options are only valid with worker processes
+            num_workers = self.config.get('num_workers', 2)
+            worker_kwargs = {}
+            if num_workers > 0:
+                worker_kwargs = {
+                    'persistent_workers': self.config.get('persistent_workers', True),
+                    'prefetch_factor': self.config.get('prefetch_factor', 4)
+                }
+            
             # Create data loader
             return DataLoader(
                 dataset,
                 batch_size=self.config.get('batch_size', 8),
                 shuffle=self.config.get('shuffle', True),
-                num_workers=self.config.get('num_workers', 2),
-                pin_memory=self.config.get('pin_memory', True)
+                num_workers=num_workers,
+                pin_memory=self.config.get('pin_memory', True),
+                drop_last=self.config.get('drop_last', True),
+                **worker_kwargs
             )
             
         except Exception as e:
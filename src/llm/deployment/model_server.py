@@ -1,22 +1,28 @@
 from typing import Dict, Any, List, Optional, Union
+import json
 import logging
-from pathlib import Path
+import os
+import zlib
 import torch
-import asyncio
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from pydantic import BaseModel, Field
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+import httpx
 from .monitoring import track_request, MetricsCollector
-from prometheus_client import make_asgi_app
 
 from ..model_registry import ModelRegistry
 from ..inference_pipeline import InferencePipeline
 
 logger = logging.getLogger(__name__)
 
+# Worker processes rebuild the server from the config stored here
+CONFIG_ENV = 'MODEL_SERVER_CONFIG'
+
 class GenerationRequest(BaseModel):
     """Request model for text generation."""
+    # model_name is a field, not a pydantic namespace
+    model_config = ConfigDict(protected_namespaces=(), str_strip_whitespace=False)
+    
     prompt: Union[str, List[str]] = Field(..., description="Input prompt(s) for generation")
     model_name: Optional[str] = Field(None, description="Model name to use")
     version: Optional[str] = Field(None, description="Model version to use")
@@ -28,6 +34,8 @@ class GenerationRequest(BaseModel):
 
 class GenerationResponse(BaseModel):
     """Response model for text generation."""
+    model_config = ConfigDict(protected_namespaces=())
+    
     generated_text: Union[str, List[str]]
     model_name: str
     version: str
@@ -37,11 +45,27 @@ class GenerationResponse(BaseModel):
 class ModelServer:
     """Server for model deployment and inference."""
     
-    def __init__(self, config: Dict[str, Any]):
-        """Initialize model server."""
+    def __init__(self, config: Dict[str, Any], model_registry: Optional[ModelRegistry] = None):
+        """Initialize model server.
+
+        Args:
+            config: Server configuration
+            model_registry: Registry shared with other servers in this
+                process; a new one is built if omitted
+        """
+        # Tune the caching allocator before the first CUDA allocation so
+        # memory is reused across requests rather than released per call
+        os.environ.setdefault(
+            "PYTORCH_CUDA_ALLOC_CONF",
+            "expandable_segments:True,max_split_size_mb=512,"
+            "garbage_collection_threshold:0.8"
+        )
         self.config = config
-        self.model_registry = ModelRegistry(config.get('model_registry', {}))
-        self.inference_pipeline = InferencePipeline(config.get('inference_pipeline', {}))
+        self.model_registry = model_registry or ModelRegistry(config.get('model_registry', {}))
+        self.inference_pipeline = InferencePipeline(
+            config.get('inference_pipeline', {}),
+            model_registry=self.model_registry
+        )
         
         # Server settings
         self.host = config.get('host', 'localhost')
@@ -57,56 +81,72 @@ class ModelServer:
         self.app = FastAPI(
             title="LLM Model Server",
             description="API for LLM inference",
-            version="1.0.0"
+            version="1.0.0",
+            default_response_class=ORJSONResponse
         )
         self._setup_routes()
         
-        # Model cache
-        self._model_cache = {}
-        self._cache_lock = asyncio.Lock()
-        
         # Add metrics endpoint
+        from prometheus_client import make_asgi_app
         metrics_app = make_asgi_app()
         self.app.mount("/metrics", metrics_app)
         
-        # Setup metrics collection
+        # Setup metrics collection; the GPU gauge reads the pipeline's
+        # background memory samples at scrape time
         self.metrics_collector = MetricsCollector()
+        self.metrics_collector.track_gpu_memory(
+            lambda: self.inference_pipeline.last_gpu_memory
+        )
     
     def _setup_routes(self):
         """Setup API routes."""
+        @self.app.on_event("startup")
+        async def start_pipeline():
+            # Queue prompts from concurrent requests into shared batches
+            # and sample memory usage in the background
+            await self.inference_pipeline.start()
+        
+        @self.app.on_event("shutdown")
+        async def stop_pipeline():
+            await self.inference_pipeline.stop()
+        
         @self.app.post("/generate", response_model=GenerationResponse)
-        async def generate(request: GenerationRequest, background_tasks: BackgroundTasks):
-            try:
-                # Get model and version
-                model_name = request.model_name or self.default_model
-                version = request.version or self.default_version
-                
-                # Generate text
-                result = await self.inference_pipeline.generate(
-                    prompt=request.prompt,
-                    model_name=model_name,
-                    version=version,
-                    max_length=request.max_length,
-                    temperature=request.temperature,
-                    top_p=request.top_p,
-                    top_k=request.top_k,
-                    num_return_sequences=request.num_return_sequences
-                )
-                
-                # Schedule cache cleanup
-                background_tasks.add_task(self._cleanup_cache)
-                
-                return GenerationResponse(
-                    generated_text=[r['generated'] for r in result],
-                    model_name=model_name,
-                    version=version,
-                    generation_time=sum(r.get('generation_time', 0) for r in result),
-                    token_count=sum(r.get('tokens', 0) for r in result)
-                )
-                
-            except Exception as e:
-                logger.error(f"Generation error: {e}")
-                raise HTTPException(status_code=500, detail=str(e))
+        async def generate(request: GenerationRequest):
+            response = await self.generate(request)
+            self.metrics_collector.update_cache_metrics(
+                len(self.inference_pipeline.model_cache)
+            )
+            return response
+        
+        @self.app.post("/generate_stream")
+        async def generate_stream(request: GenerationRequest):
+            """Stream generated text as server-sent events."""
+            if isinstance(request.prompt, list):
+                if len(request.prompt) != 1:
+                    raise HTTPException(status_code=400, detail="Streaming takes a single prompt")
+                prompt = request.prompt[0]
+            else:
+                prompt = request.prompt
+            
+            chunks = self.inference_pipeline.generate_stream(
+                prompt,
+                model_name=request.model_name or self.default_model,
+                version=request.version or self.default_version,
+                max_length=request.max_length,
+                temperature=request.temperature,
+                top_p=request.top_p,
+                top_k=request.top_k
+            )
+            
+            async def events():
+                try:
+                    async for text in chunks:
+                        yield f"data: {json.dumps({'token': text})}\n\n"
+                except Exception as e:
+                    logger.error(f"Streaming error: {e}")
+                    yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            
+            return StreamingResponse(events(), media_type="text/event-stream")
         
         @self.app.get("/models")
         async def list_models():
@@ -127,7 +167,7 @@ class ModelServer:
             return {
                 'status': 'healthy',
                 'gpu_available': torch.cuda.is_available(),
-                'loaded_models': list(self._model_cache.keys())
+                'loaded_models': list(self.inference_pipeline.model_cache.keys())
             }
     
     @track_request("generate")
@@ -138,7 +178,7 @@ class ModelServer:
             version = request.version or self.default_version
             
             result = await self.inference_pipeline.generate(
-                prompt=request.prompt,
+                prompts=request.prompt,
                 model_name=model_name,
                 version=version,
                 max_length=request.max_length,
@@ -148,62 +188,118 @@ class ModelServer:
                 num_return_sequences=request.num_return_sequences
             )
             
+            # Collect texts and totals in one pass over the results
+            generated_text = []
+            generation_time = 0.0
+            token_count = 0
+            for r in result:
+                generated_text.append(r['generated'])
+                generation_time += r.get('generation_time', 0)
+                token_count += r.get('tokens', 0)
+            
             return GenerationResponse(
-                generated_text=[r['generated'] for r in result],
+                generated_text=generated_text,
                 model_name=model_name,
                 version=version,
-                generation_time=sum(r.get('generation_time', 0) for r in result),
-                token_count=sum(r.get('tokens', 0) for r in result)
+                generation_time=generation_time,
+                token_count=token_count
             )
         except Exception as e:
             logger.error(f"Generation error: {e}")
             raise HTTPException(status_code=500, detail=str(e))
     
-    async def _cleanup_cache(self):
-        """Clean up model cache."""
-        async with self._cache_lock:
-            current_memory = torch.cuda.memory_allocated() if torch.cuda.is_available() else 0
-            if current_memory > self.config.get('max_memory', 0.9) * torch.cuda.max_memory_allocated():
-                self._model_cache.clear()
-                torch.cuda.empty_cache()
-            self.metrics_collector.update_cache_metrics(len(self._model_cache))
-            self.metrics_collector.update_gpu_metrics()
-    
     def start(self):
-        """Start the model server."""
-        uvicorn.run(
-            self.app,
-            host=self.host,
-            port=self.port,
-            workers=self.workers
-        )
+        """Start the model server.
+
+        uvicorn only spawns worker processes for an import string, so with
+        more than one worker each process builds its own server, and model
+        replica, through ``create_app``.
+        """
+        import uvicorn
+        
+        run_kwargs = {
+            'host': self.host,
+            'port': self.port,
+            'access_log': self.config.get('access_log', False),
+            'log_level': self.config.get('log_level', 'warning')
+        }
+        if self.workers > 1:
+            os.environ[CONFIG_ENV] = json.dumps(self.config)
+            uvicorn.run(
+                f"{__name__}:create_app",
+                factory=True,
+                workers=self.workers,
+                **run_kwargs
+            )
+        else:
+            uvicorn.run(self.app, **run_kwargs)
+
+def create_app() -> FastAPI:
+    """Build a server app from the config in ``MODEL_SERVER_CONFIG``."""
+    return ModelServer(json.loads(os.environ[CONFIG_ENV])).app
 
 class LoadBalancer:
-    """Load balancer for multiple model servers."""
+    """Load balancer for multiple model servers.
+
+    Requests go to the server with the fewest requests in flight. Prompts
+    that share a prefix prefer the same server while its load stays close
+    to the least loaded one, so repeated prefixes reuse that server's
+    caches.
+    """
     
     def __init__(self, config: Dict[str, Any]):
         """Initialize load balancer."""
         self.config = config
         self.servers = []
-        self.current_server = 0
         
-        # Initialize servers
+        # Initialize servers around one registry so models load once
+        self.shared_registry = ModelRegistry(config.get('model_registry', {}))
         for server_config in config.get('servers', []):
-            self.servers.append(ModelServer(server_config))
+            self.servers.append(ModelServer(server_config, model_registry=self.shared_registry))
+        
+        # Routing state
+        self.inflight = [0] * len(self.servers)
+        self._server_index = {id(server): i for i, server in enumerate(self.servers)}
+        self.affinity_prefix = config.get('affinity_prefix', 256)
+        self.affinity_slack = config.get('affinity_slack', 2)
+    
+    def get_next_server(self, prompt: Optional[str] = None) -> ModelServer:
+        """Pick a server for a request and count it as in flight.
+
+        Callers must hand the server back with ``release_server``.
+        """
+        least = min(range(len(self.servers)), key=self.inflight.__getitem__)
+        index = least
+        if prompt:
+            preferred = zlib.crc32(prompt[:self.affinity_prefix].encode()) % len(self.servers)
+            if self.inflight[preferred] <= self.inflight[least] + self.affinity_slack:
+                index = preferred
+        
+        self.inflight[index] += 1
+        return self.servers[index]
     
-    def get_next_server(self) -> ModelServer:
-        """Get next available server (round-robin)."""
-        server = self.servers[self.current_server]
-        self.current_server = (self.current_server + 1) % len(self.servers)
-        return server
+    def release_server(self, server: ModelServer):
+        """Mark a request dispatched to ``server`` as finished."""
+        self.inflight[self._server_index[id(server)]] -= 1
+    
+    async def generate(self, request: GenerationRequest) -> GenerationResponse:
+        """Route a generation request to a server."""
+        prompt = request.prompt if isinstance(request.prompt, str) else next(iter(request.prompt), None)
+        server = self.get_next_server(prompt)
+        try:
+            return await server.generate(request)
+        finally:
+            self.release_server(server)
     
     async def health_check(self) -> Dict[str, Any]:
         """Check health of all servers."""
         results = {}
-        for i, server in enumerate(self.servers):
-            try:
-                health = await server.app.get("/health")
-                results[f'server_{i}'] = health
-            except Exception as e:
-                results[f'server_{i}'] = {'status': 'unhealthy', 'error': str(e)}
-        return results
\ No newline at end of file
+        async with httpx.AsyncClient(timeout=self.config.get('health_timeout', 5.0)) as client:
+            for i, server in enumerate(self.servers):
+                try:
+                    response = await client.get(f"http://{server.host}:{server.port}/health")
+                    response.raise_for_status()
+                    results[f'server_{i}'] = response.json()
+                except Exception as e:
+                    results[f'server_{i}'] = {'status': 'unhealthy', 'error': str(e)}
+        return results
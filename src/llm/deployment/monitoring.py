@@ -1,5 +1,6 @@
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Tuple
 import time
+import torch
 from prometheus_client import Counter, Histogram, Gauge
 from functools import wraps
 
@@ -26,40 +27,54 @@ MODEL_CACHE_SIZE = Gauge(
     'Number of models in cache'
 )
 
+# Labelled children per (endpoint, model): success counter, error counter
+# and latency histogram. labels() takes a lock on every call, so each
+# child is looked up once and reused
+_request_metrics: Dict[Tuple[str, str], Tuple[Any, Any, Any]] = {}
+
+def _metrics_for(endpoint: str, model_name: str) -> Tuple[Any, Any, Any]:
+    """Return the cached metric children for an endpoint and model."""
+    key = (endpoint, model_name)
+    children = _request_metrics.get(key)
+    if children is None:
+        children = (
+            REQUESTS.labels(endpoint=endpoint, model=model_name, status='success'),
+            REQUESTS.labels(endpoint=endpoint, model=model_name, status='error'),
+            LATENCY.labels(endpoint=endpoint, model=model_name)
+        )
+        _request_metrics[key] = children
+    return children
+
 def track_request(endpoint: str):
     """Decorator to track request metrics."""
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            start_time = time.time()
-            model_name = kwargs.get('model_name', 'default')
+            start_time = time.perf_counter()
+            success, error, latency = _metrics_for(
+                endpoint, kwargs.get('model_name', 'default')
+            )
             
             try:
                 result = await func(*args, **kwargs)
-                REQUESTS.labels(
-                    endpoint=endpoint,
-                    model=model_name,
-                    status='success'
-                ).inc()
+                success.inc()
                 return result
-            except Exception as e:
-                REQUESTS.labels(
-                    endpoint=endpoint,
-                    model=model_name,
-                    status='error'
-                ).inc()
+            except Exception:
+                error.inc()
                 raise
             finally:
-                LATENCY.labels(
-                    endpoint=endpoint,
-                    model=model_name
-                ).observe(time.time() - start_time)
+                latency.observe(time.perf_counter() - start_time)
         return wrapper
     return decorator
 
 class MetricsCollector:
     """Collector for system and model metrics."""
     
+    @staticmethod
+    def track_gpu_memory(source: Callable[[], float]):
+        """Read GPU memory from ``source`` whenever metrics are scraped."""
+        GPU_MEMORY.set_function(source)
+    
     @staticmethod
     def update_gpu_metrics():
         """Update GPU metrics."""
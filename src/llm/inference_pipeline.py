@@ -1,21 +1,220 @@
-from typing import Dict, Any, List, Optional, Union, Tuple
+from typing import Dict, Any, List, Optional, Union, Tuple, AsyncIterator
 import logging
+import asyncio
+import bisect
+import contextlib
+import copy
+import hashlib
+import time
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import torch
 import psutil
+from cachetools import LRUCache
 import gc
+import threading
 from datetime import datetime
-from functools import lru_cache
+from transformers import TextIteratorStreamer
 from .model_registry import ModelRegistry
 
+try:
+    from transformers import DynamicCache, StaticCache
+except ImportError:  # transformers < 4.38
+    DynamicCache = StaticCache = None
+
 logger = logging.getLogger(__name__)
 
+# Sequence length buckets in tokens. Prompts are padded only within their
+# bucket, and one captured decode graph serves every request whose
+# max_length rounds up to the same bucket
+LENGTH_BUCKETS = (64, 128, 256, 512)
+
+# Prompt prefix lengths, in tokens, whose KV cache can be reused
+PREFIX_BUCKETS = (64, 128, 256, 512)
+
+# Rough characters per token, used to estimate prompt lengths before
+# tokenizing (pipeline bucketing, evaluator batch packing)
+CHARS_PER_TOKEN = 4
+
+# Samples kept in each metrics history
+METRICS_HISTORY = 1024
+
+# A prompt waiting in the batching queue; requests with the same signature
+# (model, version and generation kwargs) can share one generate() call
+QueuedPrompt = namedtuple(
+    'QueuedPrompt',
+    'signature prompt model_name version kwargs future'
+)
+
+class _LRU(OrderedDict):
+    """OrderedDict that evicts its least recently used entry past ``maxsize``."""
+    
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+    
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+    
+    def lookup(self, key):
+        """Return the cached value, marking it most recently used."""
+        value = self.get(key)
+        if value is not None:
+            self.move_to_end(key)
+        return value
+
+class _ModelCache(LRUCache):
+    """LRU cache of loaded models that reports each entry it evicts."""
+    
+    def __init__(self, maxsize: int, on_evict):
+        super().__init__(maxsize)
+        self._on_evict = on_evict
+    
+    def popitem(self):
+        key, value = super().popitem()
+        self._on_evict(key, value)
+        return key, value
+
+class _DecodeGraph:
+    """Greedy decode step captured as a CUDA graph.
+
+    Inputs, attention mask and the KV cache are static tensors sized for
+    one (batch, cache length) bucket, so every decode step replays the
+    same graph instead of launching each kernel from Python.
+    """
+    
+    def __init__(self, model: Any, batch_size: int, max_cache_len: int):
+        device = next(model.parameters()).device
+        self.model = model
+        self.batch_size = batch_size
+        self.max_cache_len = max_cache_len
+        self.cache = StaticCache(
+            config=model.config,
+            max_batch_size=batch_size,
+            max_cache_len=max_cache_len,
+            device=device,
+            dtype=model.dtype
+        )
+        self.input_ids = torch.zeros((batch_size, 1), dtype=torch.long, device=device)
+        self.position_ids = torch.zeros((batch_size, 1), dtype=torch.long, device=device)
+        self.cache_position = torch.zeros(1, dtype=torch.long, device=device)
+        self.attention_mask = torch.zeros(
+            (batch_size, max_cache_len), dtype=torch.long, device=device
+        )
+        self.graph = None
+        self.logits = None
+    
+    def _step(self) -> torch.Tensor:
+        """Run one decode step on the static tensors."""
+        return self.model(
+            input_ids=self.input_ids,
+            attention_mask=self.attention_mask,
+            position_ids=self.position_ids,
+            cache_position=self.cache_position,
+            past_key_values=self.cache,
+            use_cache=True
+        ).logits[:, -1]
+    
+    def capture(self):
+        """Warm up on a side stream, then record the decode step."""
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(2):
+                self._step()
+        torch.cuda.current_stream().wait_stream(stream)
+        
+        self.graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(self.graph):
+            self.logits = self._step()
+    
+    def generate(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor,
+        max_length: int,
+        pad_token_id: Optional[int],
+        eos_token_id: Optional[int]
+    ) -> torch.Tensor:
+        """Greedily decode a left-padded batch up to ``max_length`` tokens.
+
+        Args:
+            input_ids: Prompt tokens, at most ``batch_size`` rows
+            attention_mask: Mask for ``input_ids``
+            max_length: Total length of prompt plus generated tokens
+            pad_token_id: Token written after a row has finished
+            eos_token_id: Token that finishes a row
+
+        Returns:
+            Prompt and generated tokens, shaped like ``model.generate`` output
+        """
+        rows, prompt_len = input_ids.shape
+        if rows < self.batch_size:
+            # Fill the bucket with copies of the first row
+            filler = self.batch_size - rows
+            input_ids = torch.cat([input_ids, input_ids[:1].expand(filler, -1)])
+            attention_mask = torch.cat([attention_mask, attention_mask[:1].expand(filler, -1)])
+        
+        self.cache.reset()
+        self.attention_mask.zero_()
+        self.attention_mask[:, :prompt_len] = attention_mask
+        positions = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+        
+        # Prefill runs eagerly since prompt lengths vary
+        logits = self.model(
+            input_ids=input_ids,
+            attention_mask=self.attention_mask,
+            position_ids=positions,
+            cache_position=torch.arange(prompt_len, device=input_ids.device),
+            past_key_values=self.cache,
+            use_cache=True
+        ).logits[:, -1]
+        next_tokens = logits.argmax(-1)
+        generated = [next_tokens]
+        if eos_token_id is not None:
+            finished = next_tokens == eos_token_id
+        else:
+            finished = torch.zeros_like(next_tokens, dtype=torch.bool)
+        last_position = positions[:, -1:]
+        
+        for position in range(prompt_len, max_length - 1):
+            if finished.all():
+                break
+            self.input_ids.copy_(next_tokens.unsqueeze(-1))
+            self.position_ids.copy_(last_position + (position - prompt_len + 1))
+            self.cache_position.fill_(position)
+            self.attention_mask[:, position] = 1
+            self.graph.replay()
+            
+            next_tokens = self.logits.argmax(-1)
+            if pad_token_id is not None:
+                next_tokens = next_tokens.masked_fill(finished, pad_token_id)
+            generated.append(next_tokens)
+            if eos_token_id is not None:
+                finished = finished | (next_tokens == eos_token_id)
+        
+        outputs = torch.cat([input_ids, torch.stack(generated, dim=1)], dim=1)
+        return outputs[:rows]
+
 class InferencePipeline:
     """Pipeline for model inference with advanced optimization features."""
     
-    def __init__(self, config: Dict[str, Any]):
-        """Initialize inference pipeline."""
+    def __init__(self, config: Dict[str, Any], model_registry: Optional[ModelRegistry] = None):
+        """Initialize inference pipeline.
+
+        Args:
+            config: Pipeline configuration
+            model_registry: Registry shared with the caller; a new one is
+                built from ``config['model_registry']`` if omitted
+        """
         self.config = config
-        self.model_registry = ModelRegistry(config.get('model_registry', {}))
+        self.model_registry = model_registry or ModelRegistry(config.get('model_registry', {}))
         
         # Inference settings
         self.max_batch_size = config.get('max_batch_size', 32)
@@ -29,12 +228,34 @@ class InferencePipeline:
         self.fp16 = config.get('fp16', self.use_cuda)
         self.cache_models = config.get('cache_models', True)
         
+        # Tokenize off the event loop so the loop keeps serving requests
+        self._tok_pool = ThreadPoolExecutor(max_workers=config.get('tokenizer_workers', 2))
+        
         # Advanced optimization settings
         self.dynamic_batching = config.get('dynamic_batching', True)
         self.min_batch_size = config.get('min_batch_size', 1)
         self.memory_threshold = config.get('memory_threshold', 0.9)  # 90% memory threshold
         self.cache_size = config.get('cache_size', 1024)  # LRU cache size
         self.optimize_for_inference = config.get('optimize_for_inference', True)
+        self.cuda_graphs = config.get('cuda_graphs', True)
+        self.compile_model = config.get('compile_model', True)
+        
+        # Weight format for loaded models: 'none', 'int8' or 'fp8'
+        self.quantization = config.get('quantization', 'none')
+        
+        # Server-side batching: prompts from concurrent requests are queued
+        # and merged for up to max_batch_delay_ms before generating
+        self.max_batch_delay = config.get('max_batch_delay_ms', 10) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_task: Optional[asyncio.Task] = None
+        
+        # Memory usage sampled in the background while the pipeline runs,
+        # so requests read cached values instead of querying /proc and CUDA
+        self.memory_sample_interval = config.get('memory_sample_interval', 1.0)
+        self._metrics_task: Optional[asyncio.Task] = None
+        self.last_system_memory = 0.0
+        self.last_gpu_memory = 0
+        self._gpu_total = 0
         
         # Initialize caches
         self._init_caches()
@@ -45,29 +266,75 @@ class InferencePipeline:
             'total_tokens': 0,
             'avg_latency': 0,
             'cache_hits': 0,
-            'memory_usage': [],
-            'batch_sizes': []
+            'prefix_hits': 0,
+            'memory_usage': deque(maxlen=METRICS_HISTORY),
+            'batch_sizes': deque(maxlen=METRICS_HISTORY)
         }
+        
+        # Running batch size statistics over all batches
+        self._batch_sum = 0
+        self._batch_n = 0
+        self._batch_min = float('inf')
+        self._batch_max = 0
     
     def _init_caches(self):
         """Initialize various caches for optimization."""
-        # LRU cache for generated responses
-        self.response_cache = lru_cache(maxsize=self.cache_size)(self._generate_cached)
+        # LRU cache for deterministic responses, keyed per prompt
+        self.response_cache = _LRU(self.cache_size)
+        
+        # Loaded models, keyed by "name:version"; the least recently used
+        # model is released once more than max_cached_models are loaded
+        self.model_cache = _ModelCache(
+            self.config.get('max_cached_models', 4),
+            self._evict_model
+        )
         
-        # Tokenization cache
-        self.tokenization_cache = {}
+        # This cache decides which models stay loaded. The registry's own
+        # bound is raised to match so it does not evict models held here,
+        # and models it evicts for other callers are dropped here too.
+        registry = self.model_registry
+        if registry.max_loaded and registry.max_loaded < self.model_cache.maxsize:
+            registry.max_loaded = self.model_cache.maxsize
+        registry.add_evict_listener(self._on_registry_evict)
         
         # Model optimization states
         self.optimized_models = set()
+        
+        # Models whose forward was actually compiled, by the registry or
+        # here; a failed compile leaves the model eager and out of this set
+        self._compiled_models = set()
+        
+        # Captured decode graphs keyed by (model_key, batch, cache length),
+        # and the models that can be decoded through them
+        self._decode_graphs: Dict[Tuple[str, int, int], _DecodeGraph] = {}
+        self._graph_models = set()
+        
+        # KV cache bytes per token for each loaded model, used to size batches
+        self._kv_bpt: Dict[str, Optional[int]] = {}
+        
+        # Models with fp32 weights, which run under autocast when fp16 is on
+        self._autocast_models = set()
+        
+        # Prefill KV caches for prompt prefixes, keyed by (model_key, digest).
+        # A prefix is cached the second time it is seen, so one-off prompts
+        # never pay for an extra prefill
+        self.prefix_caching = self.config.get('prefix_caching', True)
+        self._prefix_cache = _LRU(self.config.get('prefix_cache_size', 64))
+        self._prefix_seen = _LRU(self.config.get('prefix_cache_size', 64) * 16)
     
     async def generate(
         self,
         prompts: Union[str, List[str]],
         model_name: Optional[str] = None,
         version: Optional[str] = None,
+        merge: bool = True,
         **kwargs
     ) -> List[Dict[str, Any]]:
-        """Generate responses with optimizations."""
+        """Generate responses with optimizations.
+        
+        With ``merge`` off, prompts are generated in their own batches even
+        while the batching loop is running, e.g. for latency measurements.
+        """
         try:
             start_time = datetime.now()
             
@@ -78,30 +345,33 @@ class InferencePipeline:
             if isinstance(prompts, str):
                 prompts = [prompts]
             
-            # Check cache first
-            if self.cache_models:
-                cached_results = self._check_cache(prompts, kwargs)
-                if cached_results:
-                    return cached_results
+            model_name = model_name or self.default_model
+            version = version or self.default_version
             
-            # Load and optimize model
-            model_data = await self._load_and_optimize_model(model_name, version)
-            if not model_data:
-                raise ValueError(f"Failed to load model {model_name}:{version}")
-            
-            # Dynamic batching
-            batches = self._dynamic_batch(prompts) if self.dynamic_batching else self._batch_inputs(prompts)
+            # Serve cached prompts and generate only the misses
+            keys = None
+            if self.cache_models and self._is_cacheable(kwargs):
+                keys = [self._cache_key(p, model_name, version, kwargs) for p in prompts]
+                results = [self.response_cache.lookup(key) for key in keys]
+                missing = [i for i, result in enumerate(results) if result is None]
+                self.metrics['cache_hits'] += len(prompts) - len(missing)
+            else:
+                results = [None] * len(prompts)
+                missing = list(range(len(prompts)))
             
-            # Process batches
-            results = []
-            for batch in batches:
-                batch_results = await self._generate_optimized(
-                    model_data['model'],
-                    model_data['tokenizer'],
-                    batch,
-                    **kwargs
-                )
-                results.extend(batch_results)
+            if missing:
+                pending = [prompts[i] for i in missing]
+                
+                # Merge with concurrent requests when the batching loop is running
+                if merge and self._batch_task is not None:
+                    generated = await self._enqueue(pending, model_name, version, kwargs)
+                else:
+                    generated = await self._generate_direct(pending, model_name, version, kwargs)
+                
+                for i, result in zip(missing, generated):
+                    results[i] = result
+                    if keys is not None:
+                        self.response_cache[keys[i]] = result
             
             # Update metrics
             self._update_metrics(
@@ -116,6 +386,151 @@ class InferencePipeline:
             logger.error(f"Error in inference: {e}")
             raise
     
+    async def start(self):
+        """Start the background loops that batch queued prompts and
+        sample memory usage."""
+        if self._metrics_task is None:
+            self._metrics_task = asyncio.create_task(self._metrics_loop())
+        if self._batch_task is None:
+            self._queue = asyncio.Queue()
+            self._batch_task = asyncio.create_task(self._batch_loop())
+    
+    async def stop(self):
+        """Stop the background loops, failing any prompts still queued."""
+        if self._metrics_task is not None:
+            self._metrics_task.cancel()
+            try:
+                await self._metrics_task
+            except asyncio.CancelledError:
+                pass
+            self._metrics_task = None
+        
+        if self._batch_task is None:
+            return
+        
+        self._batch_task.cancel()
+        try:
+            await self._batch_task
+        except asyncio.CancelledError:
+            pass
+        self._batch_task = None
+        
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("Inference pipeline stopped"))
+        self._queue = None
+    
+    async def _enqueue(
+        self,
+        prompts: List[str],
+        model_name: Optional[str],
+        version: Optional[str],
+        kwargs: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Queue prompts for the batching loop and wait for their results."""
+        loop = asyncio.get_running_loop()
+        signature = (
+            model_name,
+            version,
+            tuple(sorted((k, repr(v)) for k, v in kwargs.items()))
+        )
+        
+        futures = []
+        for prompt in prompts:
+            future = loop.create_future()
+            await self._queue.put(QueuedPrompt(
+                signature, prompt, model_name, version, kwargs, future
+            ))
+            futures.append(future)
+        
+        return list(await asyncio.gather(*futures))
+    
+    async def _batch_loop(self):
+        """Collect queued prompts into batches and generate them together."""
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            try:
+                deadline = loop.time() + self.max_batch_delay
+                while len(items) < self.max_batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        items.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                
+                # Only prompts with identical generation settings share a batch
+                groups: Dict[Tuple, List[QueuedPrompt]] = {}
+                for item in items:
+                    groups.setdefault(item.signature, []).append(item)
+                
+                for group in groups.values():
+                    first = group[0]
+                    try:
+                        results = await self._generate_direct(
+                            [item.prompt for item in group],
+                            first.model_name,
+                            first.version,
+                            first.kwargs
+                        )
+                        for item, result in zip(group, results):
+                            if not item.future.done():
+                                item.future.set_result(result)
+                    except Exception as e:
+                        for item in group:
+                            if not item.future.done():
+                                item.future.set_exception(e)
+            except BaseException as e:
+                # stop() cancels the loop mid-batch; fail every prompt taken
+                # off the queue so its caller is not left waiting
+                error = e
+                if isinstance(e, asyncio.CancelledError):
+                    error = RuntimeError("Inference pipeline stopped")
+                for item in items:
+                    if not item.future.done():
+                        item.future.set_exception(error)
+                raise
+    
+    async def _generate_direct(
+        self,
+        prompts: List[str],
+        model_name: Optional[str],
+        version: Optional[str],
+        kwargs: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Load the model and generate prompts in memory-sized batches."""
+        # Load and optimize model
+        model_data = await self._load_and_optimize_model(model_name, version)
+        if not model_data:
+            raise ValueError(f"Failed to load model {model_name}:{version}")
+        
+        # Dynamic batching
+        if self.dynamic_batching:
+            batches = self._dynamic_batch(
+                prompts,
+                model_key=f"{model_name}:{version}",
+                max_length=kwargs.get('max_length', self.max_length)
+            )
+        else:
+            batches = self._batch_inputs(prompts)
+        
+        # Process batches
+        results = []
+        for batch in batches:
+            batch_results = await self._generate_optimized(
+                model_data['model'],
+                model_data['tokenizer'],
+                batch,
+                model_key=f"{model_name}:{version}",
+                **kwargs
+            )
+            results.extend(batch_results)
+        
+        return results
+    
     async def _load_and_optimize_model(
         self,
         model_name: Optional[str],
@@ -124,96 +539,328 @@ class InferencePipeline:
         """Load and optimize model for inference."""
         model_name = model_name or self.default_model
         version = version or self.default_version
+        model_key = f"{model_name}:{version}"
+        
+        model_data = self.model_cache.get(model_key)
+        if model_data is not None:
+            return model_data
         
         model_data = self.model_registry.load_model(
             model_name,
             version,
-            self.device
+            self.device,
+            quantization=self.quantization
         )
         
         if not model_data:
             return None
         
-        model_key = f"{model_name}:{version}"
+        self._kv_bpt[model_key] = self._kv_bytes_per_token(model_data['model'])
+        if self.fp16 and self.use_cuda and self._param_dtype(model_data['model']) == torch.float32:
+            self._autocast_models.add(model_key)
+        
         if self.optimize_for_inference and model_key not in self.optimized_models:
-            model_data['model'] = self._optimize_model(model_data['model'])
+            model_data['model'] = self._optimize_model(
+                model_data['model'],
+                compiled=model_data.get('compiled', False),
+                model_key=model_key
+            )
+            if self._supports_cuda_graphs(model_key, model_data['model']):
+                self._graph_models.add(model_key)
             self.optimized_models.add(model_key)
         
+        self.model_cache[model_key] = model_data
         return model_data
     
-    def _optimize_model(self, model: torch.nn.Module) -> torch.nn.Module:
-        """Apply various optimization techniques to the model."""
+    def unload_model(self, model_name: Optional[str] = None, version: Optional[str] = None) -> bool:
+        """Evict a model from the cache and the registry."""
+        model_name = model_name or self.default_model
+        version = version or self.default_version
+        model_key = f"{model_name}:{version}"
+        
+        return self._evict_model(model_key, self.model_cache.pop(model_key, None))
+    
+    def _evict_model(self, model_key: str, model_data: Optional[Dict[str, Any]]) -> bool:
+        """Release a model's weights, decode graphs and registry entry."""
+        self._release_model(model_key, model_data)
+        model_name, _, version = model_key.rpartition(':')
+        return self.model_registry.unload_model(model_name, version)
+    
+    def _on_registry_evict(self, model_key: str):
+        """Drop a model the registry evicted so no stale copy stays loaded."""
+        self._release_model(model_key, self.model_cache.pop(model_key, None))
+    
+    def _release_model(self, model_key: str, model_data: Optional[Dict[str, Any]]):
+        """Release a model's weights, decode graphs and optimization state."""
+        self.release_graphs(model_key)
+        self.optimized_models.discard(model_key)
+        self._kv_bpt.pop(model_key, None)
+        self._autocast_models.discard(model_key)
+        self._compiled_models.discard(model_key)
+        for key in [k for k in self._prefix_cache if k[0] == model_key]:
+            del self._prefix_cache[key]
+        
+        if model_data is not None:
+            try:
+                model_data['model'].to('cpu')
+            except Exception as e:
+                logger.warning(f"Could not move {model_key} to CPU: {e}")
+    
+    def release_graphs(self, model_key: Optional[str] = None):
+        """Drop captured decode graphs for one model, or for all models."""
+        for key in list(self._decode_graphs):
+            if model_key is None or key[0] == model_key:
+                del self._decode_graphs[key]
+        if model_key is None:
+            self._graph_models.clear()
+        else:
+            self._graph_models.discard(model_key)
+    
+    def _optimize_model(
+        self,
+        model: torch.nn.Module,
+        compiled: bool = False,
+        model_key: Optional[str] = None
+    ) -> torch.nn.Module:
+        """Apply various optimization techniques to the model.
+
+        On CUDA the forward pass is compiled in ``reduce-overhead`` mode,
+        which also replays decode steps from CUDA graphs. Only ``forward``
+        is compiled so that ``model.generate`` keeps working, and one
+        warm-up generation is run so the first request does not pay for
+        compilation. Models the registry already compiled are left as is.
+        Compiled models are recorded under ``model_key``.
+        """
         try:
             # Convert to inference mode
             model.eval()
-            
-            if self.optimize_for_inference:
-                # Fuse operations where possible
-                if hasattr(torch.ao.quantization, 'fuse_modules'):
-                    torch.ao.quantization.fuse_modules(model, ['conv', 'bn', 'relu'])
-                
-                # Enable torch script if supported
-                if hasattr(model, 'torchscript'):
-                    model = torch.jit.script(model)
-                
-                # Optimize memory format
-                if self.use_cuda:
-                    model = model.to(memory_format=torch.channels_last)
-            
-            return model
-            
         except Exception as e:
             logger.warning(f"Model optimization failed: {e}")
             return model
+        
+        if compiled:
+            self._compiled_models.add(model_key)
+        elif self.optimize_for_inference and self.use_cuda and self.compile_model:
+            eager_forward = model.forward
+            try:
+                model.forward = torch.compile(
+                    eager_forward,
+                    mode='reduce-overhead',
+                    dynamic=True
+                )
+                warmup_ids = torch.ones((1, 8), dtype=torch.long, device=self.device)
+                with torch.inference_mode():
+                    model.generate(
+                        input_ids=warmup_ids,
+                        attention_mask=torch.ones_like(warmup_ids),
+                        max_new_tokens=1
+                    )
+                self._compiled_models.add(model_key)
+            except Exception as e:
+                logger.warning(f"torch.compile failed, running eagerly: {e}")
+                model.forward = eager_forward
+        
+        return model
+    
+    def _supports_cuda_graphs(self, model_key: str, model: Any) -> bool:
+        """Whether greedy decode for this model can be captured as a CUDA graph."""
+        # Compiled models already replay CUDA graphs in reduce-overhead mode;
+        # models that fell back to eager after a failed compile do not
+        return (
+            self.cuda_graphs
+            and model_key not in self._compiled_models
+            and self.use_cuda
+            and StaticCache is not None
+            and getattr(model, '_supports_static_cache', False)
+        )
+    
+    def _get_decode_graph(
+        self,
+        model_key: str,
+        model: Any,
+        batch_size: int,
+        max_length: int
+    ) -> Optional[_DecodeGraph]:
+        """Return the captured graph for a bucket, capturing it on first use."""
+        cache_len = next((b for b in LENGTH_BUCKETS if b >= max_length), None)
+        if cache_len is None:
+            return None
+        
+        # Round the batch up to a power of two so few graphs are captured
+        batch_bucket = 1 << (batch_size - 1).bit_length()
+        key = (model_key, batch_bucket, cache_len)
+        graph = self._decode_graphs.get(key)
+        if graph is None:
+            try:
+                graph = _DecodeGraph(model, batch_bucket, cache_len)
+                graph.capture()
+            except Exception as e:
+                logger.warning(f"CUDA graph capture failed for {model_key}: {e}")
+                self._graph_models.discard(model_key)
+                return None
+            self._decode_graphs[key] = graph
+        return graph
+    
+    def _prefix_kv(self, model_key: Optional[str], model: Any, inputs: Any) -> Optional[Any]:
+        """Return a private copy of the cached KV for the batch's shared prefix.
+
+        Only unpadded batches whose rows all start with the same prefix of
+        a ``PREFIX_BUCKETS`` length qualify. A prefix seen for the second
+        time is prefilled and cached. Must be called in inference mode.
+        """
+        if not self.prefix_caching or model_key is None or DynamicCache is None:
+            return None
+        
+        attention_mask = inputs.get('attention_mask')
+        if attention_mask is not None and not bool(attention_mask.all()):
+            return None
+        
+        input_ids = inputs['input_ids']
+        rows = input_ids.tolist()
+        if len(rows) > 1 and not hasattr(DynamicCache, 'batch_repeat_interleave'):
+            return None
+        
+        # Longest shared prefix first; keep at least one token to prefill
+        keys = []
+        for k in reversed(PREFIX_BUCKETS):
+            if k >= len(rows[0]) or any(row[:k] != rows[0][:k] for row in rows[1:]):
+                continue
+            digest = hashlib.sha1(array('q', rows[0][:k]).tobytes()).digest()
+            keys.append((k, (model_key, digest)))
+        
+        for k, key in keys:
+            cache = self._prefix_cache.lookup(key)
+            if cache is not None:
+                break
+        else:
+            cache = None
+            for k, key in keys:
+                if self._prefix_seen.lookup(key) is not None:
+                    cache = self._store_prefix(key, model, input_ids[:1, :k])
+                    break
+                self._prefix_seen[key] = True
+            if cache is None:
+                return None
+        
+        self.metrics['prefix_hits'] += 1
+        cache = copy.deepcopy(cache)
+        if len(rows) > 1:
+            cache.batch_repeat_interleave(len(rows))
+        return cache
+    
+    def _store_prefix(self, key: Tuple[str, bytes], model: Any, prefix_ids: Any) -> Any:
+        """Prefill a prompt prefix and cache its KV, evicting old prefixes
+        while GPU memory is above the memory threshold."""
+        cache = model(
+            input_ids=prefix_ids,
+            past_key_values=DynamicCache(),
+            use_cache=True
+        ).past_key_values
+        
+        if self.use_cuda:
+            _, total = torch.cuda.mem_get_info()
+            while (self._prefix_cache
+                   and torch.cuda.memory_allocated() / total > self.memory_threshold):
+                self._prefix_cache.popitem(last=False)
+        
+        self._prefix_cache[key] = cache
+        return cache
+    
+    async def _metrics_loop(self):
+        """Sample memory usage every ``memory_sample_interval`` seconds."""
+        while True:
+            try:
+                self._sample_memory()
+            except Exception as e:
+                logger.warning(f"Memory sampling failed: {e}")
+            await asyncio.sleep(self.memory_sample_interval)
+    
+    def _sample_memory(self):
+        """Record current system and GPU memory usage."""
+        self.last_system_memory = psutil.virtual_memory().percent
+        if self.use_cuda:
+            self.last_gpu_memory = torch.cuda.memory_allocated()
+            _, self._gpu_total = torch.cuda.mem_get_info()
     
     def _manage_memory(self):
         """Manage system and GPU memory."""
         try:
+            # Without the background sampler, measure inline
+            if self._metrics_task is None:
+                self._sample_memory()
+            
             if self.use_cuda:
-                # GPU memory management
-                allocated = torch.cuda.memory_allocated()
-                max_allocated = torch.cuda.max_memory_allocated()
-                
-                if max_allocated > 0 and allocated / max_allocated > self.memory_threshold:
-                    torch.cuda.empty_cache()
+                # Cached blocks stay with the allocator so later requests
+                # reuse them instead of going back to cudaMalloc; freeing
+                # Python references is enough to return them to the pool
+                if self._gpu_total > 0 and self.last_gpu_memory / self._gpu_total > self.memory_threshold:
                     gc.collect()
             
             # System memory management
-            if psutil.virtual_memory().percent > self.memory_threshold * 100:
+            if self.last_system_memory > self.memory_threshold * 100:
                 gc.collect()
             
             # Update metrics
             self.metrics['memory_usage'].append({
-                'timestamp': datetime.now().isoformat(),
-                'system_memory': psutil.virtual_memory().percent,
-                'gpu_memory': torch.cuda.memory_allocated() if self.use_cuda else 0
+                'timestamp': int(time.time()),
+                'system_memory': self.last_system_memory,
+                'gpu_memory': self.last_gpu_memory
             })
             
         except Exception as e:
             logger.warning(f"Memory management failed: {e}")
     
-    def _dynamic_batch(self, inputs: List[str]) -> List[List[str]]:
-        """Dynamically determine optimal batch size based on system resources."""
+    def _param_dtype(self, model: Any) -> Optional[torch.dtype]:
+        """Dtype of the model's first parameter, or None if it has none."""
+        try:
+            return next(model.parameters()).dtype
+        except (AttributeError, StopIteration, TypeError):
+            return None
+    
+    def _kv_bytes_per_token(self, model: Any) -> Optional[int]:
+        """Bytes of KV cache one token occupies, from the model config.
+
+        Returns None when the config lacks the attention dimensions.
+        """
+        try:
+            cfg = model.config
+            n_heads = cfg.num_attention_heads
+            n_kv_heads = getattr(cfg, 'num_key_value_heads', None) or n_heads
+            head_dim = getattr(cfg, 'head_dim', None) or cfg.hidden_size // n_heads
+            dtype_bytes = torch.finfo(model.dtype).bits // 8
+            return int(2 * cfg.num_hidden_layers * n_kv_heads * head_dim * dtype_bytes)
+        except (AttributeError, TypeError, ValueError):
+            return None
+    
+    def _dynamic_batch(
+        self,
+        inputs: List[str],
+        model_key: Optional[str] = None,
+        max_length: Optional[int] = None
+    ) -> List[List[str]]:
+        """Size batches so their KV cache fits in free GPU memory."""
         try:
             if not self.use_cuda:
                 return self._batch_inputs(inputs)
             
-            # Calculate available memory
-            free_memory = torch.cuda.get_device_properties(0).total_memory - torch.cuda.memory_allocated()
-            
-            # Estimate memory per input (based on previous runs)
-            if self.metrics['batch_sizes']:
-                avg_memory_per_input = torch.cuda.memory_allocated() / sum(self.metrics['batch_sizes'])
-                optimal_batch_size = min(
-                    int(free_memory / avg_memory_per_input * 0.8),  # 80% of theoretical max
-                    self.max_batch_size
-                )
+            kv_bpt = self._kv_bpt.get(model_key)
+            if kv_bpt:
+                # Each sequence can grow to max_length tokens of KV cache;
+                # keep 20% of free memory for activations
+                free_memory, _ = torch.cuda.mem_get_info()
+                max_seq = max_length or self.max_length
+                budget = int(free_memory * 0.8)
+                optimal_batch_size = min(self.max_batch_size, budget // (kv_bpt * max_seq))
                 optimal_batch_size = max(optimal_batch_size, self.min_batch_size)
             else:
                 optimal_batch_size = self.max_batch_size
             
             # Update metrics
             self.metrics['batch_sizes'].append(optimal_batch_size)
+            self._batch_sum += optimal_batch_size
+            self._batch_n += 1
+            self._batch_min = min(self._batch_min, optimal_batch_size)
+            self._batch_max = max(self._batch_max, optimal_batch_size)
             
             # Create batches
             return [
@@ -225,44 +872,25 @@ class InferencePipeline:
             logger.warning(f"Dynamic batching failed: {e}")
             return self._batch_inputs(inputs)
     
-    @lru_cache(maxsize=1024)
-    def _generate_cached(
-        self,
-        prompt: str,
-        model_name: str,
-        version: str,
-        **kwargs
-    ) -> Dict[str, Any]:
-        """Cached version of single prompt generation."""
-        return {
-            'prompt': prompt,
-            'generated': None,  # Placeholder for actual generation
-            'cached': True
-        }
+    def _is_cacheable(self, kwargs: Dict[str, Any]) -> bool:
+        """Only greedy decoding is deterministic enough to cache."""
+        return not kwargs.get('do_sample', True) or kwargs.get('temperature') == 0
     
-    def _check_cache(
+    def _cache_key(
         self,
-        prompts: List[str],
+        prompt: str,
+        model_name: Optional[str],
+        version: Optional[str],
         kwargs: Dict[str, Any]
-    ) -> Optional[List[Dict[str, Any]]]:
-        """Check cache for existing generations."""
-        try:
-            cache_key = (
-                tuple(prompts),
-                kwargs.get('model_name', self.default_model),
-                kwargs.get('version', self.default_version),
-                frozenset(kwargs.items())
-            )
-            
-            if cache_key in self.tokenization_cache:
-                self.metrics['cache_hits'] += 1
-                return self.tokenization_cache[cache_key]
-            
-            return None
-            
-        except Exception as e:
-            logger.warning(f"Cache check failed: {e}")
-            return None
+    ) -> bytes:
+        """Hash a prompt with its model and generation settings."""
+        params = '|'.join(f"{k}={kwargs[k]!r}" for k in sorted(kwargs))
+        digest = hashlib.blake2b(
+            f"{model_name}|{version}|{params}|".encode(),
+            digest_size=16
+        )
+        digest.update(prompt.encode())
+        return digest.digest()
     
     def get_detailed_metrics(self) -> Dict[str, Any]:
         """Get detailed metrics including memory and batch statistics."""
@@ -270,18 +898,18 @@ class InferencePipeline:
         
         # Add memory statistics
         if self.metrics['memory_usage']:
-            recent_memory = self.metrics['memory_usage'][-10:]  # Last 10 measurements
+            recent_memory = list(islice(reversed(self.metrics['memory_usage']), 10))  # Last 10 measurements
             metrics['memory_stats'] = {
                 'avg_system_memory': sum(m['system_memory'] for m in recent_memory) / len(recent_memory),
                 'avg_gpu_memory': sum(m['gpu_memory'] for m in recent_memory) / len(recent_memory) if self.use_cuda else 0
             }
         
         # Add batch statistics
-        if self.metrics['batch_sizes']:
+        if self._batch_n:
             metrics['batch_stats'] = {
-                'avg_batch_size': sum(self.metrics['batch_sizes']) / len(self.metrics['batch_sizes']),
-                'min_batch_size': min(self.metrics['batch_sizes']),
-                'max_batch_size': max(self.metrics['batch_sizes'])
+                'avg_batch_size': self._batch_sum / self._batch_n,
+                'min_batch_size': self._batch_min,
+                'max_batch_size': self._batch_max
             }
         
         return metrics
@@ -317,57 +945,232 @@ class InferencePipeline:
         for i in range(0, len(inputs), self.max_batch_size):
             yield inputs[i:i + self.max_batch_size]
     
+    def _to_device(self, encoded: Any) -> Any:
+        """Move tokenized inputs to the inference device."""
+        if not self.use_cuda:
+            return encoded.to(self.device)
+        
+        # Pinned pages allow an asynchronous DMA, so the host returns at once
+        # and queues generate() behind the copy on the same stream
+        return {
+            k: v.pin_memory().to(self.device, non_blocking=True)
+            for k, v in encoded.items()
+        }
+    
     async def _generate_optimized(
         self,
         model: Any,
         tokenizer: Any,
         prompts: List[str],
+        model_key: Optional[str] = None,
         **kwargs
     ) -> List[Dict[str, Any]]:
-        """Generate responses for a batch of prompts with optimizations."""
-        try:
-            # Prepare generation config
-            gen_kwargs = {
-                'max_length': kwargs.get('max_length', self.max_length),
-                'num_return_sequences': kwargs.get('num_sequences', 1),
-                'temperature': kwargs.get('temperature', 0.7),
-                'top_p': kwargs.get('top_p', 0.9),
-                'top_k': kwargs.get('top_k', 50),
-                'do_sample': kwargs.get('do_sample', True),
-                'pad_token_id': tokenizer.pad_token_id,
-                'eos_token_id': tokenizer.eos_token_id
-            }
-            
-            # Tokenize inputs
-            inputs = tokenizer(
+        """Generate responses for a batch of prompts with optimizations.
+
+        Prompts are grouped by estimated length so that short prompts are
+        not padded to the longest one in the batch; results are returned
+        in the original prompt order.
+        """
+        results = [None] * len(prompts)
+        for indices in self._length_buckets(prompts):
+            bucket_results = await self._generate_padded(
+                model,
+                tokenizer,
+                [prompts[i] for i in indices],
+                model_key,
+                **kwargs
+            )
+            for i, result in zip(indices, bucket_results):
+                results[i] = result
+        return results
+    
+    def _length_buckets(self, prompts: List[str]) -> List[List[int]]:
+        """Group prompt indices by length bucket, shortest first.
+
+        Each group holds at most ``max_batch_size`` indices.
+        """
+        lengths = [len(p) // CHARS_PER_TOKEN for p in prompts]
+        order = sorted(range(len(prompts)), key=lengths.__getitem__)
+        
+        groups: List[List[int]] = []
+        current_bucket = None
+        for i in order:
+            bucket = bisect.bisect_right(LENGTH_BUCKETS, lengths[i])
+            if (bucket != current_bucket
+                    or len(groups[-1]) >= self.max_batch_size):
+                groups.append([])
+                current_bucket = bucket
+            groups[-1].append(i)
+        return groups
+    
+    def _generation_kwargs(self, tokenizer: Any, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Build ``model.generate`` arguments from request kwargs."""
+        return {
+            'max_length': kwargs.get('max_length', self.max_length),
+            'num_return_sequences': kwargs.get('num_sequences', 1),
+            'temperature': kwargs.get('temperature', 0.7),
+            'top_p': kwargs.get('top_p', 0.9),
+            'top_k': kwargs.get('top_k', 50),
+            'do_sample': kwargs.get('do_sample', True),
+            'pad_token_id': tokenizer.pad_token_id,
+            'eos_token_id': tokenizer.eos_token_id
+        }
+    
+    async def _tokenize(self, tokenizer: Any, prompts: List[str]) -> Any:
+        """Tokenize prompts on the tokenizer pool and move them to the device."""
+        loop = asyncio.get_running_loop()
+        encoded = await loop.run_in_executor(
+            self._tok_pool,
+            partial(
+                tokenizer,
                 prompts,
                 padding=True,
                 truncation=True,
                 return_tensors='pt'
-            ).to(self.device)
+            )
+        )
+        return self._to_device(encoded)
+    
+    async def generate_stream(
+        self,
+        prompt: str,
+        model_name: Optional[str] = None,
+        version: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Yield generated text for one prompt as it is decoded.
+
+        ``model.generate`` runs on its own thread and feeds a
+        ``TextIteratorStreamer``; each request gets its own streamer.
+
+        Args:
+            prompt: Input prompt
+            model_name: Model to use, the default model if omitted
+            version: Model version, the default version if omitted
+            **kwargs: Generation settings as accepted by ``generate``
+
+        Yields:
+            Decoded text chunks, excluding the prompt
+        """
+        model_data = await self._load_and_optimize_model(model_name, version)
+        if not model_data:
+            raise ValueError(f"Failed to load model {model_name}:{version}")
+        model, tokenizer = model_data['model'], model_data['tokenizer']
+        
+        gen_kwargs = self._generation_kwargs(tokenizer, kwargs)
+        gen_kwargs['num_return_sequences'] = 1
+        inputs = await self._tokenize(tokenizer, [prompt])
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        
+        errors = []
+        
+        def run():
+            try:
+                with torch.inference_mode():
+                    model.generate(**inputs, **gen_kwargs, streamer=streamer)
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+        
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        
+        # The streamer blocks between tokens, so wait for each one off the loop
+        loop = asyncio.get_running_loop()
+        done = object()
+        while True:
+            text = await loop.run_in_executor(None, next, streamer, done)
+            if text is done:
+                break
+            if text:
+                yield text
+        
+        await loop.run_in_executor(None, thread.join)
+        if errors:
+            raise errors[0]
+    
+    async def _generate_padded(
+        self,
+        model: Any,
+        tokenizer: Any,
+        prompts: List[str],
+        model_key: Optional[str] = None,
+        **kwargs
+    ) -> List[Dict[str, Any]]:
+        """Generate one padded batch of prompts.
+
+        Greedy requests (``do_sample=False``) on models registered for CUDA
+        graphs decode through a captured graph for their length bucket.
+        Sampling is never captured, since replaying a graph would replay
+        the same random draws, and lengths beyond the largest bucket fall
+        back to ``model.generate``.
+        """
+        try:
+            gen_kwargs = self._generation_kwargs(tokenizer, kwargs)
+            inputs = await self._tokenize(tokenizer, prompts)
             
             # Generate
             with torch.inference_mode():
-                if self.fp16 and self.use_cuda:
-                    with torch.cuda.amp.autocast():
-                        outputs = model.generate(**inputs, **gen_kwargs)
+                graph = None
+                if (model_key in self._graph_models
+                        and not gen_kwargs['do_sample']
+                        and gen_kwargs['num_return_sequences'] == 1):
+                    graph = self._get_decode_graph(
+                        model_key, model, len(prompts), gen_kwargs['max_length']
+                    )
+                
+                if graph is not None:
+                    outputs = graph.generate(
+                        inputs['input_ids'],
+                        inputs['attention_mask'],
+                        gen_kwargs['max_length'],
+                        gen_kwargs['pad_token_id'],
+                        gen_kwargs['eos_token_id']
+                    )
                 else:
-                    outputs = model.generate(**inputs, **gen_kwargs)
+                    if gen_kwargs['num_return_sequences'] == 1:
+                        past_key_values = self._prefix_kv(model_key, model, inputs)
+                        if past_key_values is not None:
+                            # generate() skips the positions already cached
+                            gen_kwargs['past_key_values'] = past_key_values
+                    
+                    # Half precision weights need no per-op casts
+                    if model_key in self._autocast_models:
+                        autocast = torch.autocast('cuda', dtype=torch.bfloat16)
+                    else:
+                        autocast = contextlib.nullcontext()
+                    with autocast:
+                        outputs = model.generate(**inputs, **gen_kwargs)
             
-            # Decode outputs
-            decoded = tokenizer.batch_decode(
-                outputs,
-                skip_special_tokens=True
+            # Decode outputs off the event loop
+            decoded = await asyncio.get_running_loop().run_in_executor(
+                self._tok_pool,
+                partial(tokenizer.batch_decode, outputs, skip_special_tokens=True)
             )
             
+            # Count real tokens in one reduction per batch; padded rows
+            # would otherwise all report the longest row's length
+            pad_token_id = gen_kwargs['pad_token_id']
+            if pad_token_id is not None:
+                real_lens = (outputs != pad_token_id).sum(dim=1).tolist()
+            else:
+                real_lens = [outputs.shape[1]] * outputs.shape[0]
+            attention_mask = inputs.get('attention_mask')
+            if attention_mask is not None:
+                input_lens = attention_mask.sum(dim=1).tolist()
+            else:
+                input_lens = [inputs['input_ids'].shape[1]] * len(prompts)
+            
             # Format results
+            max_length = gen_kwargs['max_length']
             results = []
             for i, prompt in enumerate(prompts):
+                new_tokens = real_lens[i] - input_lens[i]
                 results.append({
                     'prompt': prompt,
                     'generated': decoded[i],
-                    'tokens': len(outputs[i]),
-                    'finish_reason': 'length' if len(outputs[i]) >= gen_kwargs['max_length'] else 'stop'
+                    'tokens': real_lens[i],
+                    'finish_reason': 'length' if new_tokens >= max_length - input_lens[i] else 'stop'
                 })
             
             return results
@@ -1,13 +1,24 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import asyncio
+import contextlib
+import hashlib
 import logging
+import threading
+import time
+from collections.abc import Mapping
 from datetime import datetime
 import numpy as np
+from cachetools import LRUCache
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support
 import torch
-from .inference_pipeline import InferencePipeline
+from .inference_pipeline import InferencePipeline, CHARS_PER_TOKEN
 
 logger = logging.getLogger(__name__)
 
+def _isoformat(timestamp_ns: int) -> str:
+    """Format a ``time.time_ns()`` timestamp as a local ISO 8601 string."""
+    return datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+
 class ModelEvaluator:
     """Component for evaluating model performance and quality."""
     
@@ -20,9 +31,16 @@ class ModelEvaluator:
         self.metrics = config.get('metrics', ['accuracy', 'perplexity', 'latency'])
         self.num_samples = config.get('num_samples', 1000)
         self.batch_size = config.get('batch_size', 32)
+        # Padded tokens per perplexity batch
+        self.token_budget = config.get('token_budget', 8192)
         
         # Evaluation results
         self.results: Dict[str, Dict[str, Any]] = {}
+        
+        # CPU encodings of evaluation batches, so benchmarking several
+        # versions against the same data tokenizes it only once
+        self._tokenize_cache = LRUCache(maxsize=config.get('tokenize_cache_size', 1024))
+        self._tokenize_lock = threading.Lock()
     
     async def evaluate_model(
         self,
@@ -34,33 +52,51 @@ class ModelEvaluator:
         """Evaluate model on specified metrics."""
         try:
             metrics = metrics or self.metrics
-            start_time = datetime.now()
+            start_ns = time.time_ns()
             
             # Initialize results
-            evaluation_id = f"{model_name}_{version}_{start_time.isoformat()}"
+            evaluation_id = f"{model_name}_{version}_{start_ns}"
             self.results[evaluation_id] = {
                 'model_name': model_name,
                 'version': version,
                 'metrics': {},
                 'samples_evaluated': len(eval_data),
-                'start_time': start_time.isoformat()
+                'start_time': _isoformat(start_ns)
             }
             
-            # Evaluate each metric
-            for metric in metrics:
-                metric_value = await self._evaluate_metric(
-                    metric,
-                    model_name,
-                    version,
-                    eval_data
+            # Accuracy and latency share one timed generation pass
+            fused = 'accuracy' in metrics and 'latency' in metrics
+            timed = [
+                metric for metric in metrics
+                if metric == 'latency' or (fused and metric == 'accuracy')
+            ]
+            untimed = [metric for metric in metrics if metric not in timed]
+            
+            # Evaluate untimed metrics concurrently
+            values = await asyncio.gather(*(
+                self._evaluate_metric(metric, model_name, version, eval_data)
+                for metric in untimed
+            ))
+            metric_values = dict(zip(untimed, values))
+            
+            # The timed pass runs on its own afterwards, so latency does not
+            # include contention with the other metrics
+            if fused:
+                metric_values['accuracy'], metric_values['latency'] = (
+                    await self._evaluate_accuracy_latency(model_name, version, eval_data)
+                )
+            elif timed:
+                metric_values['latency'] = await self._evaluate_latency(
+                    model_name, version, eval_data
                 )
-                self.results[evaluation_id]['metrics'][metric] = metric_value
+            self.results[evaluation_id]['metrics'] = {
+                metric: metric_values[metric] for metric in metrics
+            }
             
             # Add completion time
-            self.results[evaluation_id]['end_time'] = datetime.now().isoformat()
-            self.results[evaluation_id]['duration_seconds'] = (
-                datetime.now() - start_time
-            ).total_seconds()
+            end_ns = time.time_ns()
+            self.results[evaluation_id]['end_time'] = _isoformat(end_ns)
+            self.results[evaluation_id]['duration_seconds'] = (end_ns - start_ns) / 1e9
             
             return self.results[evaluation_id]
             
@@ -92,20 +128,46 @@ class ModelEvaluator:
         eval_data: List[Dict[str, Any]]
     ) -> Dict[str, Any]:
         """Evaluate model accuracy."""
-        predictions = []
-        references = []
+        # Submit every prompt in one call so the pipeline can pack them
+        # into its own length-bucketed, memory-sized batches
+        prompts, references = self._columns(eval_data)
+        results = await self.pipeline.generate(
+            prompts.tolist(),
+            model_name=model_name,
+            version=version
+        )
         
-        for batch in self._batch_data(eval_data):
-            prompts = [item['prompt'] for item in batch]
-            results = await self.pipeline.generate(
-                prompts,
-                model_name=model_name,
-                version=version
-            )
-            
-            for i, result in enumerate(results):
-                predictions.append(result['generated'])
-                references.append(batch[i]['expected'])
+        return self._accuracy_metrics(results, references)
+    
+    async def _evaluate_accuracy_latency(
+        self,
+        model_name: str,
+        version: str,
+        eval_data: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Evaluate accuracy and latency from a single generation pass."""
+        prompts, references = self._columns(eval_data)
+        results, latencies, token_throughputs = await self._timed_generate(
+            model_name,
+            version,
+            prompts
+        )
+        return (
+            self._accuracy_metrics(results, references),
+            self._latency_metrics(latencies, token_throughputs, len(eval_data))
+        )
+    
+    def _accuracy_metrics(
+        self,
+        results: List[Dict[str, Any]],
+        references: np.ndarray
+    ) -> Dict[str, Any]:
+        """Score generated outputs against the expected references."""
+        predictions = np.fromiter(
+            (result['generated'] for result in results),
+            dtype=object,
+            count=len(results)
+        )
         
         # Calculate metrics
         accuracy = accuracy_score(references, predictions)
@@ -129,13 +191,12 @@ class ModelEvaluator:
         eval_data: List[Dict[str, Any]]
     ) -> Dict[str, Any]:
         """Evaluate model perplexity."""
-        total_loss = 0
-        total_tokens = 0
+        device = self.pipeline.device
         
         model_data = self.pipeline.model_registry.load_model(
             model_name,
             version,
-            self.pipeline.device
+            device
         )
         
         if not model_data:
@@ -144,61 +205,159 @@ class ModelEvaluator:
         model = model_data['model']
         tokenizer = model_data['tokenizer']
         
+        # Running totals stay on the device so batches are not serialized
+        # by a host sync; they are read back once after the loop
+        total_loss = torch.zeros((), device=device)
+        total_tokens = torch.zeros((), dtype=torch.long, device=device)
+        
+        # Run the forward in bf16 on GPU, with host-to-device copies issued
+        # on a separate stream so they overlap the previous batch's compute
+        if device == 'cuda':
+            autocast = torch.autocast('cuda', dtype=torch.bfloat16)
+            copy_stream = torch.cuda.Stream()
+        else:
+            autocast = contextlib.nullcontext()
+            copy_stream = None
+        
+        # Tokenize up to two batches ahead of the forward pass
+        queue = asyncio.Queue(maxsize=2)
+        prefetch = asyncio.create_task(
+            self._prefetch_batches(tokenizer, eval_data, device, copy_stream, queue)
+        )
+        
         try:
-            for batch in self._batch_data(eval_data):
-                # Tokenize inputs
-                inputs = tokenizer(
-                    [item['prompt'] for item in batch],
-                    padding=True,
-                    truncation=True,
-                    return_tensors='pt'
-                )
-                if hasattr(inputs, 'to'):
-                    inputs = inputs.to(self.pipeline.device)
-                elif isinstance(inputs, dict):
-                    inputs = {k: v.to(self.pipeline.device) if hasattr(v, 'to') else v 
-                            for k, v in inputs.items()}
-                
-                # Get target outputs
-                labels = tokenizer(
-                    [item['expected'] for item in batch],
-                    padding=True,
-                    truncation=True,
-                    return_tensors='pt'
-                )
-                if hasattr(labels, 'to'):
-                    labels = labels.to(self.pipeline.device)
-                elif isinstance(labels, dict):
-                    labels = {k: v.to(self.pipeline.device) if hasattr(v, 'to') else v 
-                            for k, v in labels.items()}
+            while (item := await queue.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                inputs, label_ids, label_mask = item
+                if copy_stream is not None:
+                    current = torch.cuda.current_stream()
+                    current.wait_stream(copy_stream)
+                    # The tensors were allocated on the copy stream; keep
+                    # their blocks from the next prefetched copy until this
+                    # forward has finished reading them
+                    for tensor in (*inputs.values(), label_ids, label_mask):
+                        if tensor is not None:
+                            tensor.record_stream(current)
                 
                 # Calculate loss
-                with torch.inference_mode():
-                    if isinstance(labels, dict):
-                        outputs = model(**inputs, labels=labels['input_ids'])
-                    else:
-                        outputs = model(**inputs, labels=labels)
-                    loss = outputs.loss.item()
+                with torch.inference_mode(), autocast:
+                    outputs = model(**inputs, labels=label_ids)
                 
                 # Update totals
-                if isinstance(labels, dict):
-                    token_count = labels['input_ids'].ne(tokenizer.pad_token_id).sum().item()
+                # The attention mask already marks non-pad label tokens
+                if label_mask is not None:
+                    token_count = label_mask.sum(dtype=torch.long)
                 else:
-                    token_count = labels.ne(tokenizer.pad_token_id).sum().item()
-                    
-                total_loss += loss * token_count
+                    token_count = label_ids.ne(tokenizer.pad_token_id).sum()
+                total_loss += outputs.loss.detach().float() * token_count
                 total_tokens += token_count
             
-            perplexity = np.exp(total_loss / total_tokens)
+            avg_loss = total_loss.item() / total_tokens.item()
+            perplexity = np.exp(avg_loss)
             
             return {
                 'perplexity': float(perplexity),
-                'avg_loss': float(total_loss / total_tokens)
+                'avg_loss': float(avg_loss)
             }
             
         except Exception as e:
             logger.error(f"Error calculating perplexity: {e}")
             raise
+        finally:
+            prefetch.cancel()
+    
+    async def _prefetch_batches(
+        self,
+        tokenizer: Any,
+        eval_data: List[Dict[str, Any]],
+        device: str,
+        copy_stream: Optional[Any],
+        queue: asyncio.Queue
+    ):
+        """Tokenize evaluation batches in a worker thread and queue them.
+
+        Puts ``(inputs, label_ids, label_mask)`` per batch, then ``None`` once every batch
+        is queued. An error is put on the queue for the consumer to raise.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            for prompts, expected in self._pack_batches(*self._columns(eval_data)):
+                item = await loop.run_in_executor(
+                    None,
+                    self._encode_batch,
+                    tokenizer,
+                    prompts,
+                    expected,
+                    device,
+                    copy_stream
+                )
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(None)
+    
+    def _encode_batch(
+        self,
+        tokenizer: Any,
+        prompts: np.ndarray,
+        expected: np.ndarray,
+        device: str,
+        copy_stream: Optional[Any]
+    ) -> Tuple[Any, Any, Optional[Any]]:
+        """Tokenize prompts and expected outputs and move them to ``device``."""
+        inputs, labels = self._tokenize_batch(tokenizer, prompts, expected)
+        
+        if copy_stream is not None:
+            with torch.cuda.stream(copy_stream):
+                inputs = {
+                    k: v.pin_memory().to(device, non_blocking=True)
+                    for k, v in inputs.items()
+                }
+                labels = {
+                    k: v.pin_memory().to(device, non_blocking=True)
+                    for k, v in labels.items()
+                }
+        else:
+            inputs = inputs.to(device) if hasattr(inputs, 'to') else inputs
+            labels = labels.to(device) if hasattr(labels, 'to') else labels
+        
+        if isinstance(labels, Mapping):
+            return inputs, labels['input_ids'], labels.get('attention_mask')
+        return inputs, labels, None
+    
+    def _tokenize_batch(
+        self,
+        tokenizer: Any,
+        prompts: np.ndarray,
+        expected: np.ndarray
+    ) -> Tuple[Any, Any]:
+        """Tokenize a batch on the CPU, reusing earlier encodings of the
+        same texts with the same tokenizer."""
+        hasher = hashlib.sha256()
+        for text in (*prompts, *expected):
+            hasher.update(text.encode())
+            hasher.update(b'\0')
+        key = (getattr(tokenizer, 'name_or_path', id(tokenizer)), hasher.hexdigest())
+        
+        with self._tokenize_lock:
+            cached = self._tokenize_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        encoded = tuple(
+            tokenizer(
+                texts.tolist(),
+                padding=True,
+                truncation=True,
+                return_tensors='pt'
+            )
+            for texts in (prompts, expected)
+        )
+        with self._tokenize_lock:
+            self._tokenize_cache[key] = encoded
+        return encoded
     
     async def _evaluate_latency(
         self,
@@ -207,37 +366,113 @@ class ModelEvaluator:
         eval_data: List[Dict[str, Any]]
     ) -> Dict[str, Any]:
         """Evaluate model latency."""
-        latencies = []
-        token_throughputs = []
+        prompts, _ = self._columns(eval_data)
+        _, latencies, token_throughputs = await self._timed_generate(
+            model_name,
+            version,
+            prompts
+        )
+        return self._latency_metrics(latencies, token_throughputs, len(eval_data))
+    
+    async def _timed_generate(
+        self,
+        model_name: str,
+        version: str,
+        prompts: np.ndarray
+    ) -> Tuple[List[Dict[str, Any]], np.ndarray, np.ndarray]:
+        """Generate prompts batch by batch, timing each batch.
+
+        Returns:
+            Generation results in prompt order, per-batch latencies in
+            seconds and per-batch token throughputs
+        """
+        n_batches = -(-len(prompts) // self.batch_size)
+        latencies = np.empty(n_batches, dtype=np.float64)
+        token_throughputs = np.empty(n_batches, dtype=np.float64)
+        outputs = []
         
-        for batch in self._batch_data(eval_data):
-            start_time = datetime.now()
+        for i, (batch,) in enumerate(self._batch_data(prompts)):
+            start_ns = time.perf_counter_ns()
             
+            # Bypass the pipeline's request batching so other callers'
+            # prompts are not merged into the timed batch
             results = await self.pipeline.generate(
-                [item['prompt'] for item in batch],
+                batch.tolist(),
                 model_name=model_name,
-                version=version
+                version=version,
+                merge=False
             )
             
-            duration = (datetime.now() - start_time).total_seconds()
+            duration = (time.perf_counter_ns() - start_ns) * 1e-9
             total_tokens = sum(r['tokens'] for r in results)
             
-            latencies.append(duration)
-            token_throughputs.append(total_tokens / duration)
+            latencies[i] = duration
+            token_throughputs[i] = total_tokens / duration
+            outputs.extend(results)
         
+        return outputs, latencies, token_throughputs
+    
+    def _latency_metrics(
+        self,
+        latencies: np.ndarray,
+        token_throughputs: np.ndarray,
+        samples: int
+    ) -> Dict[str, Any]:
+        """Summarize per-batch latencies and throughputs."""
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
         return {
-            'avg_latency': float(np.mean(latencies)),
-            'p50_latency': float(np.percentile(latencies, 50)),
-            'p90_latency': float(np.percentile(latencies, 90)),
-            'p99_latency': float(np.percentile(latencies, 99)),
-            'avg_throughput': float(np.mean(token_throughputs)),
-            'samples_processed': len(eval_data)
+            'avg_latency': float(latencies.mean()),
+            'p50_latency': float(p50),
+            'p90_latency': float(p90),
+            'p99_latency': float(p99),
+            'avg_throughput': float(token_throughputs.mean()),
+            'samples_processed': samples
         }
     
-    def _batch_data(self, data: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
-        """Split evaluation data into batches."""
-        for i in range(0, len(data), self.batch_size):
-            yield data[i:i + self.batch_size]
+    def _columns(self, eval_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Split evaluation records into parallel prompt and expected arrays."""
+        n = len(eval_data)
+        prompts = np.fromiter((d['prompt'] for d in eval_data), dtype=object, count=n)
+        expected = np.fromiter((d['expected'] for d in eval_data), dtype=object, count=n)
+        return prompts, expected
+    
+    def _pack_batches(
+        self,
+        prompts: np.ndarray,
+        expected: np.ndarray
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Group samples of similar length into batches under ``token_budget``.
+
+        Samples are sorted by estimated token length and packed greedily, so
+        each batch pads to a length close to that of all its rows. A batch
+        costs its row count times its longest prompt plus longest expected
+        output. Order is not preserved, which is fine for summed losses.
+        """
+        prompt_lens = np.fromiter(map(len, prompts), dtype=np.int64, count=len(prompts))
+        expected_lens = np.fromiter(map(len, expected), dtype=np.int64, count=len(expected))
+        prompt_lens = prompt_lens // CHARS_PER_TOKEN + 1
+        expected_lens = expected_lens // CHARS_PER_TOKEN + 1
+        
+        order = np.argsort(prompt_lens + expected_lens, kind='stable')
+        start = 0
+        max_prompt = max_expected = 0
+        for i, j in enumerate(order):
+            next_prompt = max(max_prompt, prompt_lens[j])
+            next_expected = max(max_expected, expected_lens[j])
+            if i > start and (i - start + 1) * (next_prompt + next_expected) > self.token_budget:
+                rows = order[start:i]
+                yield prompts[rows], expected[rows]
+                start = i
+                next_prompt, next_expected = prompt_lens[j], expected_lens[j]
+            max_prompt, max_expected = next_prompt, next_expected
+        if start < len(order):
+            rows = order[start:]
+            yield prompts[rows], expected[rows]
+    
+    def _batch_data(self, *columns: np.ndarray) -> Iterator[Tuple[np.ndarray, ...]]:
+        """Split parallel evaluation arrays into batches of views."""
+        for i in range(0, len(columns[0]), self.batch_size):
+            yield tuple(column[i:i + self.batch_size] for column in columns)
     
     def get_evaluation_results(
         self,
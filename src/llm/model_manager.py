@@ -2,6 +2,12 @@ from typing import Dict, Any, Optional
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer
 import logging
+from .model_registry import _DEFAULT_DEVICE
+
+try:
+    from transformers import StaticCache
+except ImportError:  # transformers < 4.38
+    StaticCache = None
 
 logger = logging.getLogger(__name__)
 
@@ -12,17 +18,21 @@ class ModelManager:
         self.config = config
         self.model = None
         self.tokenizer = None
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.device = torch.device(_DEFAULT_DEVICE)
+        
+        # KV cache reused across generate calls instead of reallocated
+        self._kv_cache = None
     
     async def load_model(self, model_name: str) -> bool:
         """Load model and tokenizer."""
         try:
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
             self.model = AutoModelForCausalLM.from_pretrained(
                 model_name,
                 device_map='auto',
                 torch_dtype=torch.float16
             )
+            self._kv_cache = None
             logger.info(f"Successfully loaded model: {model_name}")
             return True
         except Exception as e:
@@ -41,15 +51,41 @@ class ModelManager:
                 raise ValueError("Model not loaded")
             
             inputs = self.tokenizer(prompt, return_tensors="pt").to(self.device)
-            outputs = self.model.generate(
-                **inputs,
-                max_length=max_length,
-                temperature=temperature,
-                do_sample=True
-            )
+            kv_cache = self._static_cache(max_length)
+            cache_kwargs = {'past_key_values': kv_cache} if kv_cache is not None else {}
+            with torch.inference_mode():
+                outputs = self.model.generate(
+                    **inputs,
+                    max_length=max_length,
+                    temperature=temperature,
+                    do_sample=True,
+                    **cache_kwargs
+                )
             
             return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
             
         except Exception as e:
             logger.error(f"Error generating text: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+    
+    def _static_cache(self, max_length: int) -> Optional[Any]:
+        """Return a reset StaticCache holding at least ``max_length`` tokens.
+
+        The cache is only reallocated when a longer ``max_length`` is
+        requested. Returns None when the model or the installed transformers
+        does not support static caches.
+        """
+        if StaticCache is None or not getattr(self.model, '_supports_static_cache', False):
+            return None
+        
+        if self._kv_cache is None or self._kv_cache.max_cache_len < max_length:
+            self._kv_cache = StaticCache(
+                config=self.model.config,
+                max_batch_size=1,
+                max_cache_len=max_length,
+                device=self.device,
+                dtype=self.model.dtype
+            )
+        else:
+            self._kv_cache.reset()
+        return self._kv_cache
@@ -1,14 +1,130 @@
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List
 import logging
 import os
-import json
+import sys
+import orjson
 from datetime import datetime
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, PreTrainedModel, PreTrainedTokenizer
+import torch.nn as nn
+import torch.nn.functional as F
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer, PreTrainedModel, PreTrainedTokenizer
 import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from packaging.version import InvalidVersion, Version
+
+try:
+    import blake3
+except ImportError:  # registry falls back to SHA-256
+    blake3 = None
 
 logger = logging.getLogger(__name__)
 
+QUANTIZATION_MODES = ('none', 'int8', 'fp8')
+
+# Any one of these holds the model weights, single file or sharded
+WEIGHT_FILES = (
+    'model.safetensors',
+    'model.safetensors.index.json',
+    'pytorch_model.bin',
+    'pytorch_model.bin.index.json'
+)
+
+# Scheme of registry entries that predate 'hash_algo': a single SHA-256
+# over the concatenated file bytes, not comparable with per-file hashes
+LEGACY_HASH_ALGO = 'sha256-legacy'
+
+# Probing CUDA is not free, so the default device is resolved once at import
+_DEFAULT_DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+# Largest finite value of float8_e4m3fn
+_FP8_MAX = 448.0
+
+def _version_key(version: str) -> tuple:
+    """Sort key ordering versions semantically, so '10.0' follows '2.0'.
+
+    Strings that are not valid versions sort before all valid ones, by
+    their text.
+    """
+    try:
+        return (1, Version(version))
+    except InvalidVersion:
+        return (0, version)
+
+def _fp8_matmul_supported() -> bool:
+    """Whether this device can run FP8 GEMMs through ``torch._scaled_mm``.
+    
+    FP8 tensor cores need compute capability 8.9 (Ada) or newer.
+    """
+    return (
+        hasattr(torch, '_scaled_mm')
+        and torch.cuda.is_available()
+        and torch.cuda.get_device_capability() >= (8, 9)
+    )
+
+class FP8Linear(nn.Module):
+    """Linear layer holding its weight as float8_e4m3fn with a per-tensor scale.
+
+    The matmul runs on FP8 tensor cores through ``torch._scaled_mm``: the
+    activations are quantized per call and the FP8 weight is read directly,
+    so each call reads half the weight bytes of a 16-bit layer with no
+    dequantized copy.
+    """
+    
+    def __init__(self, linear: nn.Linear):
+        super().__init__()
+        weight = linear.weight.data
+        scale = weight.abs().max().float().clamp(min=1e-12) / _FP8_MAX
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features
+        self.register_buffer('weight', (weight.float() / scale).to(torch.float8_e4m3fn))
+        self.register_buffer('scale', scale)
+        self.bias = linear.bias
+    
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        shape = x.shape
+        x = x.reshape(-1, self.in_features)
+        x_scale = x.abs().max().float().clamp(min=1e-12) / _FP8_MAX
+        out = torch._scaled_mm(
+            (x / x_scale).to(torch.float8_e4m3fn),
+            self.weight.t(),
+            scale_a=x_scale,
+            scale_b=self.scale,
+            bias=self.bias,
+            out_dtype=x.dtype
+        )
+        # torch<2.4 also returns the output amax
+        if isinstance(out, tuple):
+            out = out[0]
+        return out.reshape(*shape[:-1], self.out_features)
+
+def quantize_fp8(model: PreTrainedModel) -> PreTrainedModel:
+    """Replace the Linear layers of a causal LM with FP8 weight layers.
+
+    The output projection (``lm_head``) keeps its original precision, as
+    do layers whose dimensions are not multiples of 16, which FP8 GEMMs
+    require. Without FP8 GEMM support the model is returned unchanged:
+    dequantizing inside forward would read more bytes than the 16-bit
+    weights it replaces.
+    """
+    if not hasattr(torch, 'float8_e4m3fn'):
+        raise RuntimeError("FP8 quantization requires torch>=2.1")
+    if not _fp8_matmul_supported():
+        logger.warning("FP8 matmul is not supported on this device; keeping 16-bit weights")
+        return model
+    
+    lm_head = model.get_output_embeddings()
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if (
+                isinstance(child, nn.Linear)
+                and child is not lm_head
+                and child.in_features % 16 == 0
+                and child.out_features % 16 == 0
+            ):
+                setattr(parent, name, FP8Linear(child))
+    return model
+
 class ModelRegistry:
     """Registry for managing LLM models and their versions."""
     
@@ -17,7 +133,7 @@ class ModelRegistry:
         self.config = config
         self.models_dir = config.get('models_dir', 'models')
         self.registry_file = os.path.join(self.models_dir, 'registry.json')
-        self.default_device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.default_device = _DEFAULT_DEVICE
         
         # Create models directory
         os.makedirs(self.models_dir, exist_ok=True)
@@ -25,8 +141,50 @@ class ModelRegistry:
         # Load registry
         self.registry = self._load_registry()
         
-        # Active models cache
-        self.active_models: Dict[str, Dict[str, Any]] = {}
+        # Latest version per model, kept current by register_model
+        self._latest_version: Dict[str, str] = {
+            name: max(data['versions'], key=_version_key)
+            for name, data in self.registry.items()
+            if data['versions']
+        }
+        
+        # With autosave off, registrations are kept in memory until flush()
+        self.autosave = config.get('autosave', True)
+        self._dirty = False
+        
+        # Active models cache, least recently used first; loading beyond
+        # max_loaded evicts the oldest model to bound GPU memory
+        self.active_models: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self.max_loaded = config.get('max_loaded', 2)
+        
+        # Called with the model key when the LRU evicts a model, so callers
+        # that keep the loaded dict, such as the inference pipeline, drop it
+        self._evict_listeners: List[Callable[[str], None]] = []
+        
+        # Compile CUDA models at load time for callers that use the registry
+        # directly; the inference pipeline compiles its own models, so this
+        # is off by default
+        self.compile = config.get('compile', False)
+        self.compile_warmup_length = config.get('compile_warmup_length', 512)
+        
+        # Keep CPU weights in shared memory so worker processes can attach
+        # to one copy through share_model/attach_model
+        self.shared = config.get('shared', False)
+        
+        # BLAKE3 hashes large files on all cores; each entry records the
+        # algorithm used, and entries without one are recomputed with the
+        # legacy whole-directory scheme
+        self.hash_algo = config.get('hash_algo', 'blake3' if blake3 else 'sha256')
+        
+        # Per-file (size, mtime_ns, digest) from earlier registrations keyed
+        # by (path, algorithm), so unchanged files are not re-read when a
+        # path is registered again
+        self._file_hashes: Dict[tuple, tuple] = {
+            (os.path.join(info['path'], rel), info.get('hash_algo', LEGACY_HASH_ALGO)): tuple(entry)
+            for model_data in self.registry.values()
+            for info in model_data['versions'].values()
+            for rel, entry in info.get('files', {}).items()
+        }
     
     def register_model(
         self,
@@ -44,6 +202,10 @@ class ModelRegistry:
             
             # Calculate model hash
             model_hash = self._calculate_model_hash(model_path)
+            files = {
+                rel: list(self._file_hashes[(os.path.join(model_path, rel), self.hash_algo)])
+                for rel in self._model_files(model_path)
+            }
             
             # Prepare model info
             model_info = {
@@ -51,6 +213,8 @@ class ModelRegistry:
                 'version': version,
                 'path': model_path,
                 'hash': model_hash,
+                'hash_algo': self.hash_algo,
+                'files': files,
                 'registered_at': datetime.now().isoformat(),
                 'metadata': metadata or {},
                 'status': 'registered'
@@ -61,7 +225,12 @@ class ModelRegistry:
                 self.registry[model_name] = {'versions': {}}
             
             self.registry[model_name]['versions'][version] = model_info
-            self._save_registry()
+            latest = self._latest_version.get(model_name)
+            if latest is None or _version_key(version) > _version_key(latest):
+                self._latest_version[model_name] = version
+            self._dirty = True
+            if self.autosave:
+                self._save_registry()
             
             logger.info(f"Registered model {model_name} version {version}")
             return True
@@ -74,9 +243,21 @@ class ModelRegistry:
         self,
         model_name: str,
         version: Optional[str] = None,
-        device: Optional[str] = None
+        device: Optional[str] = None,
+        quantization: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
-        """Load a model and its tokenizer."""
+        """Load a model and its tokenizer.
+
+        Args:
+            model_name: Registered model name
+            version: Model version, latest if omitted
+            device: Device to load onto
+            quantization: Weight format, one of ``QUANTIZATION_MODES``;
+                defaults to the registry's ``quantization`` setting
+
+        Returns:
+            Loaded model data, or None if loading failed
+        """
         try:
             # Get model info
             model_info = self._get_model_info(model_name, version)
@@ -86,16 +267,41 @@ class ModelRegistry:
             # Check if already loaded
             model_key = f"{model_name}:{model_info['version']}"
             if model_key in self.active_models:
+                self.active_models.move_to_end(model_key)
                 return self.active_models[model_key]
             
             # Load model and tokenizer
             device = device or self.default_device
-            model = AutoModelForCausalLM.from_pretrained(
-                model_info['path'],
-                device_map='auto' if device == 'cuda' else None,
-                torch_dtype=torch.float16 if device == 'cuda' else torch.float32
-            )
-            tokenizer = AutoTokenizer.from_pretrained(model_info['path'])
+            quantization = quantization or self.config.get('quantization', 'none')
+            if quantization not in QUANTIZATION_MODES:
+                raise ValueError(f"Unsupported quantization: {quantization}")
+            
+            # low_cpu_mem_usage materializes weights shard by shard instead
+            # of building the whole model on the host first; safetensors
+            # weights are preferred when present and are memory-mapped
+            load_kwargs = {
+                'device_map': 'auto' if device == 'cuda' else None,
+                'torch_dtype': torch.bfloat16 if device == 'cuda' else torch.float32,
+                'low_cpu_mem_usage': True
+            }
+            if quantization == 'int8':
+                from transformers import BitsAndBytesConfig
+                load_kwargs['quantization_config'] = BitsAndBytesConfig(load_in_8bit=True)
+                load_kwargs['device_map'] = 'auto'
+            elif quantization == 'fp8':
+                # The unquantized lm_head stays in bf16
+                load_kwargs['torch_dtype'] = torch.bfloat16
+            
+            compile_model = self.compile and device == 'cuda' and quantization == 'none'
+            
+            model = AutoModelForCausalLM.from_pretrained(model_info['path'], **load_kwargs)
+            if quantization == 'fp8':
+                model = quantize_fp8(model)
+            if compile_model:
+                compile_model = self._compile_model(model, device)
+            if self.shared and device == 'cpu' and quantization == 'none':
+                model.share_memory()
+            tokenizer = AutoTokenizer.from_pretrained(model_info['path'], use_fast=True)
             
             # Update model info
             loaded_model = {
@@ -103,9 +309,12 @@ class ModelRegistry:
                 'tokenizer': tokenizer,
                 'info': model_info,
                 'device': device,
+                'quantization': quantization,
+                'compiled': compile_model,
                 'loaded_at': datetime.now().isoformat()
             }
             self.active_models[model_key] = loaded_model
+            self._evict_models()
             
             logger.info(f"Loaded model {model_name} version {model_info['version']}")
             return loaded_model
@@ -114,6 +323,120 @@ class ModelRegistry:
             logger.error(f"Error loading model: {e}")
             return None
     
+    def share_model(
+        self,
+        model_name: str,
+        version: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Export a loaded model's weights for other processes.
+
+        CPU weights are moved to shared memory; CUDA weights are shared by
+        ``torch.multiprocessing`` as IPC handles when the returned dict is
+        sent through one of its queues or as a ``Process`` argument. Pass
+        it to ``attach_model`` in the receiving process.
+
+        Args:
+            model_name: Registered model name
+            version: Model version, latest if omitted
+
+        Returns:
+            Shared model handle, or None if the model cannot be shared
+        """
+        try:
+            loaded_model = self.load_model(model_name, version, quantization='none')
+            if not loaded_model:
+                return None
+            if loaded_model['quantization'] != 'none':
+                raise ValueError("Only unquantized models can be shared")
+            
+            model = loaded_model['model']
+            if loaded_model['device'] == 'cuda':
+                if sys.platform == 'win32':
+                    raise RuntimeError("CUDA IPC is not available on this platform")
+            else:
+                model.share_memory()
+            
+            # Non-persistent buffers (e.g. rotary inv_freq, causal masks) are
+            # left out of state_dict, so they travel alongside it
+            state_dict = model.state_dict()
+            buffers = {
+                name: buffer for name, buffer in model.named_buffers()
+                if name not in state_dict
+            }
+            
+            info = loaded_model['info']
+            return {
+                'name': model_name,
+                'version': info['version'],
+                'hash': info['hash'],
+                'device': loaded_model['device'],
+                'state_dict': state_dict,
+                'buffers': buffers
+            }
+            
+        except Exception as e:
+            logger.error(f"Error sharing model: {e}")
+            return None
+    
+    def attach_model(self, shared: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Load a model onto weights exported by ``share_model``.
+
+        The model is built on the meta device and its parameters and
+        buffers are pointed at the shared tensors, so no new weight memory
+        is allocated.
+
+        Args:
+            shared: Handle returned by ``share_model`` in another process
+
+        Returns:
+            Loaded model data, or None if attaching failed
+        """
+        try:
+            model_info = self._get_model_info(shared['name'], shared['version'])
+            if not model_info:
+                return None
+            if model_info['hash'] != shared['hash']:
+                raise ValueError(
+                    f"Shared weights do not match {shared['name']}:{shared['version']}"
+                )
+            
+            model_key = f"{shared['name']}:{model_info['version']}"
+            if model_key in self.active_models:
+                self.active_models.move_to_end(model_key)
+                return self.active_models[model_key]
+            
+            config = AutoConfig.from_pretrained(model_info['path'])
+            with torch.device('meta'):
+                model = AutoModelForCausalLM.from_config(config)
+            model.load_state_dict(shared['state_dict'], assign=True)
+            for name, buffer in shared['buffers'].items():
+                module_name, _, buffer_name = name.rpartition('.')
+                model.get_submodule(module_name).register_buffer(
+                    buffer_name, buffer, persistent=False
+                )
+            model.tie_weights()
+            model.eval()
+            tokenizer = AutoTokenizer.from_pretrained(model_info['path'], use_fast=True)
+            
+            loaded_model = {
+                'model': model,
+                'tokenizer': tokenizer,
+                'info': model_info,
+                'device': shared['device'],
+                'quantization': 'none',
+                'compiled': False,
+                'loaded_at': datetime.now().isoformat()
+            }
+            self.active_models[model_key] = loaded_model
+            self._evict_models()
+            
+            logger.info(f"Attached shared model {model_key}")
+            return loaded_model
+            
+        except Exception as e:
+            logger.error(f"Error attaching shared model: {e}")
+            return None
+    
     def unload_model(self, model_name: str, version: Optional[str] = None) -> bool:
         """Unload a model from memory."""
         try:
@@ -123,8 +446,8 @@ class ModelRegistry:
             
             model_key = f"{model_name}:{model_info['version']}"
             if model_key in self.active_models:
-                del self.active_models[model_key]
-                torch.cuda.empty_cache()
+                loaded_model = self.active_models.pop(model_key)
+                self._release(loaded_model)
                 logger.info(f"Unloaded model {model_name} version {model_info['version']}")
             
             return True
@@ -133,6 +456,63 @@ class ModelRegistry:
             logger.error(f"Error unloading model: {e}")
             return False
     
+    def _compile_model(self, model: PreTrainedModel, device: str) -> bool:
+        """Compile the model's forward pass in ``max-autotune`` mode.
+
+        Only ``forward`` is compiled so that ``model.generate`` keeps
+        working. One forward at ``compile_warmup_length`` tokens is run so
+        the first caller does not pay for compilation.
+
+        Returns:
+            True if the model was compiled
+        """
+        eager_forward = model.forward
+        try:
+            model.eval()
+            model.forward = torch.compile(
+                eager_forward,
+                mode='max-autotune',
+                fullgraph=False,
+                dynamic=True
+            )
+            warmup_ids = torch.ones(
+                (1, self.compile_warmup_length),
+                dtype=torch.long,
+                device=device
+            )
+            with torch.inference_mode():
+                model(input_ids=warmup_ids, attention_mask=torch.ones_like(warmup_ids))
+            return True
+        except Exception as e:
+            logger.warning(f"torch.compile failed, running eagerly: {e}")
+            model.forward = eager_forward
+            return False
+    
+    def add_evict_listener(self, listener: Callable[[str], None]):
+        """Register a callback run with the model key of each evicted model."""
+        self._evict_listeners.append(listener)
+    
+    def _evict_models(self):
+        """Unload least recently used models beyond ``max_loaded``."""
+        while self.max_loaded and len(self.active_models) > self.max_loaded:
+            model_key, loaded_model = self.active_models.popitem(last=False)
+            for listener in self._evict_listeners:
+                try:
+                    listener(model_key)
+                except Exception as e:
+                    logger.warning(f"Evict listener failed for {model_key}: {e}")
+            self._release(loaded_model)
+            logger.info(f"Evicted model {model_key}")
+    
+    def _release(self, loaded_model: Dict[str, Any]):
+        """Return cached GPU blocks once a model is no longer active.
+
+        The loaded dict is left intact since callers such as the inference
+        pipeline may still hold it; its memory is freed once they drop it.
+        """
+        if loaded_model['device'] == 'cuda':
+            torch.cuda.empty_cache()
+    
     def get_model_info(
         self,
         model_name: str,
@@ -159,17 +539,32 @@ class ModelRegistry:
         """Load model registry from file."""
         if os.path.exists(self.registry_file):
             try:
-                with open(self.registry_file, 'r') as f:
-                    return json.load(f)
+                with open(self.registry_file, 'rb') as f:
+                    return orjson.loads(f.read())
             except Exception as e:
                 logger.error(f"Error loading registry: {e}")
         return {}
     
+    def flush(self) -> bool:
+        """Write pending registry changes to disk.
+
+        Returns:
+            True if the registry file is up to date
+        """
+        return self._save_registry()
+    
     def _save_registry(self) -> bool:
-        """Save model registry to file."""
+        """Save model registry to file if it has unsaved changes."""
+        if not self._dirty:
+            return True
         try:
-            with open(self.registry_file, 'w') as f:
-                json.dump(self.registry, f, indent=2)
+            # Write a temp file and rename it over the registry so readers
+            # never see a partially written file
+            tmp_file = f"{self.registry_file}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(self.registry, option=orjson.OPT_INDENT_2))
+            os.replace(tmp_file, self.registry_file)
+            self._dirty = False
             return True
         except Exception as e:
             logger.error(f"Error saving registry: {e}")
@@ -177,23 +572,105 @@ class ModelRegistry:
     
     def _validate_model_files(self, model_path: str) -> bool:
         """Validate required model files exist."""
-        required_files = ['config.json', 'pytorch_model.bin', 'tokenizer.json']
-        return all(
+        required_files = ['config.json', 'tokenizer.json']
+        has_files = all(
             os.path.exists(os.path.join(model_path, f))
             for f in required_files
         )
+        has_weights = any(
+            os.path.exists(os.path.join(model_path, f))
+            for f in WEIGHT_FILES
+        )
+        return has_files and has_weights
+    
+    def _model_files(self, model_path: str) -> List[str]:
+        """List model files relative to ``model_path`` in sorted order."""
+        return sorted(
+            os.path.relpath(os.path.join(root, file), model_path)
+            for root, _, files in os.walk(model_path)
+            for file in files
+        )
     
-    def _calculate_model_hash(self, model_path: str) -> str:
-        """Calculate hash of model files for version validation."""
+    def _calculate_model_hash(self, model_path: str, algo: Optional[str] = None) -> str:
+        """Calculate hash of model files for version validation.
+
+        Each file is hashed independently in a thread pool (hashing releases
+        the GIL), then the per-file digests are combined in sorted
+        relative-path order so the result does not depend on directory walk
+        order. Files whose size and mtime match an earlier registration
+        reuse the recorded digest.
+
+        Args:
+            model_path: Directory holding the model files
+            algo: ``'blake3'``, a hashlib algorithm name or
+                ``LEGACY_HASH_ALGO``, defaulting to the registry's ``hash_algo``
+
+        Returns:
+            Hex digest of the model directory
+        """
+        algo = algo or self.hash_algo
+        if algo == LEGACY_HASH_ALGO:
+            return self._legacy_model_hash(model_path)
+        paths = self._model_files(model_path)
+        workers = min(len(paths), os.cpu_count() or 1) or 1
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            digests = list(pool.map(
+                lambda rel: self._hash_file(os.path.join(model_path, rel), algo),
+                paths
+            ))
+        
+        hasher = self._new_hasher(algo)
+        for rel, digest in zip(paths, digests):
+            hasher.update(rel.encode())
+            hasher.update(bytes.fromhex(digest))
+        return hasher.hexdigest()
+    
+    def _legacy_model_hash(self, model_path: str) -> str:
+        """Hash ``model_path`` the way entries without 'hash_algo' were hashed.
+        
+        All file contents are fed to one SHA-256 in ``os.walk`` order with
+        no path information, matching the ``hash`` of older registry entries.
+        """
         hasher = hashlib.sha256()
         for root, _, files in os.walk(model_path):
             for file in sorted(files):
-                file_path = os.path.join(root, file)
-                with open(file_path, 'rb') as f:
-                    for chunk in iter(lambda: f.read(4096), b''):
+                with open(os.path.join(root, file), 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
                         hasher.update(chunk)
         return hasher.hexdigest()
     
+    def _new_hasher(self, algo: str) -> Any:
+        """Create an incremental hasher for ``algo``."""
+        if algo == 'blake3':
+            if blake3 is None:
+                raise ValueError("blake3 hashing requires the blake3 package")
+            return blake3.blake3(max_threads=blake3.blake3.AUTO)
+        # usedforsecurity=False lets OpenSSL pick its fastest EVP
+        # implementation (SHA-NI / ARMv8 SHA2 where available)
+        return hashlib.new(algo, usedforsecurity=False)
+    
+    def _hash_file(self, file_path: str, algo: str) -> str:
+        """Return the hex digest of a single file."""
+        stat = os.stat(file_path)
+        cached = self._file_hashes.get((file_path, algo))
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+        
+        if algo == 'blake3':
+            # Memory-maps the file and hashes it across threads
+            hasher = self._new_hasher(algo)
+            hasher.update_mmap(file_path)
+            digest = hasher.hexdigest()
+        else:
+            # file_digest reads through a large C-side buffer with the GIL
+            # released
+            with open(file_path, 'rb') as f:
+                digest = hashlib.file_digest(
+                    f, lambda: self._new_hasher(algo)
+                ).hexdigest()
+        self._file_hashes[(file_path, algo)] = (stat.st_size, stat.st_mtime_ns, digest)
+        return digest
+    
     def _get_model_info(
         self,
         model_name: str,
@@ -208,7 +685,7 @@ class ModelRegistry:
             versions = self.registry[model_name]['versions']
             if not version:
                 # Get latest version
-                version = max(versions.keys())
+                version = self._latest_version[model_name]
             
             if version not in versions:
                 logger.error(f"Version {version} not found for model {model_name}")
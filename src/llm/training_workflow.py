@@ -1,4 +1,6 @@
 from typing import Dict, Any, Optional, List, Tuple
+import contextlib
+import functools
 import logging
 import os
 from pathlib import Path
@@ -6,6 +8,10 @@ import torch
 import torch.distributed as dist
 from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data import DataLoader, DistributedSampler
+try:
+    from torch.utils.checkpoint import CheckpointPolicy, create_selective_checkpoint_contexts
+except ImportError:  # torch < 2.4
+    CheckpointPolicy = create_selective_checkpoint_contexts = None
 from transformers import (
     PreTrainedModel,
     PreTrainedTokenizer,
@@ -21,6 +27,76 @@ from .model_registry import ModelRegistry
 
 logger = logging.getLogger(__name__)
 
+AMP_DTYPES = {
+    'fp16': torch.float16,
+    'bf16': torch.bfloat16
+}
+
+CHECKPOINT_POLICIES = ('full', 'matmul_saveable', 'offload')
+
+# Under the matmul_saveable policy these outputs are kept from the forward
+# pass; the cheap ops between them are recomputed during backward
+_SAVED_OPS = {
+    torch.ops.aten.mm.default,
+    torch.ops.aten.bmm.default,
+    torch.ops.aten.addmm.default,
+    torch.ops.aten._scaled_dot_product_flash_attention.default,
+    torch.ops.aten._scaled_dot_product_efficient_attention.default
+}
+
+def _save_matmuls(ctx, op, *args, **kwargs):
+    """Selective checkpoint policy that saves matmul and attention outputs."""
+    if op in _SAVED_OPS:
+        return CheckpointPolicy.MUST_SAVE
+    return CheckpointPolicy.PREFER_RECOMPUTE
+
+class _DevicePrefetcher:
+    """Iterate over batch dicts already moved to ``device``, one batch ahead.
+
+    On CUDA the next batch is copied with ``non_blocking=True`` on a side
+    stream while the current step computes. The copy only overlaps when the
+    host tensors are pinned, which the data loader's ``pin_memory`` provides.
+    """
+    
+    def __init__(self, dataloader: DataLoader, device: torch.device):
+        self.dataloader = dataloader
+        self.device = torch.device(device)
+        self.stream = torch.cuda.Stream(self.device) if self.device.type == 'cuda' else None
+    
+    def __len__(self) -> int:
+        return len(self.dataloader)
+    
+    def __iter__(self):
+        if self.stream is None:
+            for batch in self.dataloader:
+                yield self._to_device(batch)
+            return
+        
+        batches = iter(self.dataloader)
+        next_batch = self._preload(batches)
+        while next_batch is not None:
+            current = torch.cuda.current_stream(self.device)
+            current.wait_stream(self.stream)
+            batch = next_batch
+            # Tensors allocated on the side stream are used on the compute
+            # stream; keep their memory alive until that use completes
+            for v in batch.values():
+                v.record_stream(current)
+            next_batch = self._preload(batches)
+            yield batch
+    
+    def _preload(self, batches) -> Optional[Dict[str, torch.Tensor]]:
+        """Start copying the next batch on the side stream."""
+        try:
+            batch = next(batches)
+        except StopIteration:
+            return None
+        with torch.cuda.stream(self.stream):
+            return self._to_device(batch)
+    
+    def _to_device(self, batch: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        return {k: v.to(self.device, non_blocking=True) for k, v in batch.items()}
+
 class TrainingWorkflow:
     """Workflow for training LLM models."""
     
@@ -37,9 +113,14 @@ class TrainingWorkflow:
         self.gradient_accumulation_steps = config.get('gradient_accumulation_steps', 1)
         self.max_grad_norm = config.get('max_grad_norm', 1.0)
         self.fp16 = config.get('fp16', False)
+        # Mixed precision dtype: 'fp16' or 'bf16'. Unset with fp16 enabled
+        # picks bf16 where the GPU supports it.
+        self.amp_dtype = config.get('amp_dtype')
+        self._autocast_dtype = None
         
         # Additional optimization settings
         self.gradient_checkpointing = config.get('gradient_checkpointing', False)
+        self.checkpoint_policy = config.get('checkpoint_policy', 'full')
         self.optimizer_type = config.get('optimizer_type', 'adamw')
         self.loss_scaling = config.get('loss_scaling', 'dynamic')
         self.zero_optimization = config.get('zero_optimization', False)
@@ -51,6 +132,8 @@ class TrainingWorkflow:
         
         # Setup distributed training
         self.distributed = config.get('distributed', False)
+        self.ddp_bucket_cap_mb = config.get('ddp_bucket_cap_mb', 50)
+        self.ddp_static_graph = config.get('ddp_static_graph', True)
         if self.distributed:
             self._setup_distributed()
         
@@ -96,13 +179,21 @@ class TrainingWorkflow:
             if train_data is None:
                 train_data = self.data_pipeline.prepare_data(tokenizer)
             
+            # Pin host batches so device copies can run asynchronously
+            if torch.cuda.is_available():
+                for loader in (train_data, eval_data):
+                    if isinstance(loader, DataLoader) and not loader.pin_memory:
+                        loader.pin_memory = True
+            
             # Setup model for training
             model = self._setup_model(model)
             optimizer = self._setup_optimizer(model)
             scheduler = self._setup_scheduler(optimizer, len(train_data))
             
-            # Setup mixed precision training
-            scaler = torch.cuda.amp.GradScaler() if self.fp16 else None
+            # Setup mixed precision training. bf16 keeps fp32's exponent
+            # range, so only fp16 needs loss scaling.
+            self._autocast_dtype = self._resolve_amp_dtype()
+            scaler = torch.cuda.amp.GradScaler() if self._autocast_dtype == torch.float16 else None
             
             # Training loop
             logger.info("Starting training...")
@@ -155,39 +246,44 @@ class TrainingWorkflow:
         """Train for one epoch."""
         model.train()
         total_loss = 0
-        optimizer.zero_grad()
+        optimizer.zero_grad(set_to_none=True)
+        
+        # Batches arrive on the device, copied one step ahead
+        batches = _DevicePrefetcher(dataloader, self._model_device(model))
         
         with tqdm(total=len(dataloader), desc=f"Epoch {self.epoch}") as pbar:
-            for step, batch in enumerate(dataloader):
-                # Move batch to device
-                batch = {k: v.to(model.device) for k, v in batch.items()}
+            for step, batch in enumerate(batches):
+                # Gradients are only all-reduced on the step that updates
+                # the weights; earlier micro-steps accumulate locally
+                is_sync_step = (step + 1) % self.gradient_accumulation_steps == 0
+                if self.distributed and not is_sync_step and hasattr(model, 'no_sync'):
+                    sync_context = model.no_sync()
+                else:
+                    sync_context = contextlib.nullcontext()
                 
-                # Forward pass with mixed precision
-                if scaler:
-                    with torch.cuda.amp.autocast():
+                with sync_context:
+                    # Forward pass with mixed precision
+                    with self._autocast(), self._activation_offload():
                         outputs = model(**batch)
                         loss = outputs.loss / self.gradient_accumulation_steps
                     
-                    # Backward pass with gradient scaling
-                    scaler.scale(loss).backward()
-                    
-                    if (step + 1) % self.gradient_accumulation_steps == 0:
+                    # Backward pass, with gradient scaling for fp16
+                    if scaler:
+                        scaler.scale(loss).backward()
+                    else:
+                        loss.backward()
+                
+                if is_sync_step:
+                    if scaler:
                         scaler.unscale_(optimizer)
-                        torch.nn.utils.clip_grad_norm_(model.parameters(), self.max_grad_norm)
+                    torch.nn.utils.clip_grad_norm_(model.parameters(), self.max_grad_norm)
+                    if scaler:
                         scaler.step(optimizer)
                         scaler.update()
-                        scheduler.step()
-                        optimizer.zero_grad()
-                else:
-                    outputs = model(**batch)
-                    loss = outputs.loss / self.gradient_accumulation_steps
-                    loss.backward()
-                    
-                    if (step + 1) % self.gradient_accumulation_steps == 0:
-                        torch.nn.utils.clip_grad_norm_(model.parameters(), self.max_grad_norm)
+                    else:
                         optimizer.step()
-                        scheduler.step()
-                        optimizer.zero_grad()
+                    scheduler.step()
+                    optimizer.zero_grad(set_to_none=True)
                 
                 # Update metrics
                 total_loss += loss.item()
@@ -215,14 +311,72 @@ class TrainingWorkflow:
         model.eval()
         total_loss = 0
         
+        batches = _DevicePrefetcher(dataloader, self._model_device(model))
         with torch.no_grad():
-            for batch in tqdm(dataloader, desc="Evaluating"):
-                batch = {k: v.to(model.device) for k, v in batch.items()}
+            for batch in tqdm(batches, desc="Evaluating"):
                 outputs = model(**batch)
                 total_loss += outputs.loss.item()
         
         return total_loss / len(dataloader)
     
+    def _resolve_amp_dtype(self) -> Optional[torch.dtype]:
+        """Pick the autocast dtype for training, or None for full precision."""
+        if not torch.cuda.is_available():
+            return None
+        
+        amp_dtype = self.amp_dtype
+        if amp_dtype is None:
+            if not self.fp16:
+                return None
+            amp_dtype = 'bf16' if torch.cuda.is_bf16_supported() else 'fp16'
+        
+        if amp_dtype not in AMP_DTYPES:
+            raise ValueError(f"Unsupported amp_dtype: {amp_dtype}")
+        
+        if amp_dtype == 'bf16' and not torch.cuda.is_bf16_supported():
+            logger.warning("bf16 is not supported on this GPU, falling back to fp16")
+            amp_dtype = 'fp16'
+        
+        return AMP_DTYPES[amp_dtype]
+    
+    def _autocast(self):
+        """Autocast context for the forward pass."""
+        if self._autocast_dtype is None:
+            return contextlib.nullcontext()
+        return torch.autocast('cuda', dtype=self._autocast_dtype)
+    
+    def _checkpoint_kwargs(self) -> Dict[str, Any]:
+        """Arguments passed to torch.utils.checkpoint for each checkpointed layer.
+        
+        ``full`` recomputes the whole layer in backward. ``matmul_saveable``
+        keeps matmul and attention outputs and recomputes only the cheap ops
+        between them. ``offload`` recomputes like ``full`` and moves the saved
+        layer inputs to pinned CPU memory.
+        """
+        if self.checkpoint_policy not in CHECKPOINT_POLICIES:
+            raise ValueError(f"Unsupported checkpoint_policy: {self.checkpoint_policy}")
+        
+        kwargs = {'use_reentrant': False}
+        if self.checkpoint_policy == 'matmul_saveable':
+            if create_selective_checkpoint_contexts is None:
+                logger.warning("Selective checkpointing needs torch>=2.4, using full checkpointing")
+            else:
+                kwargs['context_fn'] = functools.partial(
+                    create_selective_checkpoint_contexts,
+                    _save_matmuls
+                )
+        return kwargs
+    
+    def _activation_offload(self):
+        """Context that keeps saved activations in CPU memory when offloading."""
+        if self.gradient_checkpointing and self.checkpoint_policy == 'offload':
+            return torch.autograd.graph.save_on_cpu(pin_memory=True)
+        return contextlib.nullcontext()
+    
+    def _model_device(self, model: PreTrainedModel) -> torch.device:
+        """Device of a model, looking through a DDP wrapper."""
+        return getattr(model, 'module', model).device
+    
     def _setup_model(self, model: PreTrainedModel) -> PreTrainedModel:
         """Setup model for training with optimizations."""
         device = torch.device(f'cuda:{self.local_rank}' if torch.cuda.is_available() else 'cpu')
@@ -230,7 +384,9 @@ class TrainingWorkflow:
         
         # Enable gradient checkpointing
         if self.gradient_checkpointing and hasattr(model, 'gradient_checkpointing_enable'):
-            model.gradient_checkpointing_enable()
+            model.gradient_checkpointing_enable(
+                gradient_checkpointing_kwargs=self._checkpoint_kwargs()
+            )
         
         # Memory optimizations
         if self.memory_efficient_fp16:
@@ -242,7 +398,12 @@ class TrainingWorkflow:
                 model,
                 device_ids=[self.local_rank],
                 output_device=self.local_rank,
-                find_unused_parameters=False  # Optimization
+                find_unused_parameters=False,  # Optimization
+                # Gradients live in the all-reduce buckets, saving the
+                # grad-to-bucket and bucket-to-grad copies each step
+                gradient_as_bucket_view=True,
+                static_graph=self.ddp_static_graph,
+                bucket_cap_mb=self.ddp_bucket_cap_mb
             )
         
         return model
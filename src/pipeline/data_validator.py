@@ -1,4 +1,4 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable
 import logging
 from datetime import datetime
 import json
@@ -15,24 +15,44 @@ class DataValidator:
             'model_metrics': self._validate_model_metrics,
             'training_data': self._validate_training_data
         }
+        self._compiled: Dict[str, Callable[[List[Dict[str, Any]]], bool]] = {}
     
     def validate_data(self, data: List[Dict[str, Any]], target: str) -> bool:
         """Validate data against target schema."""
-        try:
-            if target not in self.schema_validators:
-                raise ValueError(f"Unknown target schema: {target}")
-            
-            validator = self.schema_validators[target]
-            for record in data:
-                if not validator(record):
-                    return False
-            
-            logger.info(f"Data validation successful for target: {target}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Data validation failed: {str(e)}")
-            return False
+        return self.compiled(target)(data)
+    
+    def compiled(self, target: str) -> Callable[[List[Dict[str, Any]]], bool]:
+        """Return a cached validator for ``target`` to call directly in hot paths.
+        
+        Unknown targets resolve to a validator that rejects all data, the
+        same result ``validate_data`` gives for them.
+        """
+        validate = self._compiled.get(target)
+        if validate is None:
+            validate = self._compiled[target] = self._compile(target)
+        return validate
+    
+    def _compile(self, target: str) -> Callable[[List[Dict[str, Any]]], bool]:
+        """Bind the record validator for a target schema."""
+        validator = self.schema_validators.get(target)
+        
+        def validate(data: List[Dict[str, Any]]) -> bool:
+            try:
+                if validator is None:
+                    raise ValueError(f"Unknown target schema: {target}")
+                
+                for record in data:
+                    if not validator(record):
+                        return False
+                
+                logger.info(f"Data validation successful for target: {target}")
+                return True
+                
+            except Exception as e:
+                logger.error(f"Data validation failed: {str(e)}")
+                return False
+        
+        return validate
     
     def _validate_llm_input(self, record: Dict[str, Any]) -> bool:
         """Validate LLM input data."""
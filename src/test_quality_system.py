@@ -229,6 +229,23 @@ class TestQualitySystem(BaseTestCase):
         )
         self.assertFalse(quality_result, "Quality check passed for invalid data")
     
+    def test_epoch_timestamps(self):
+        """Test consistency checks accept integer epoch timestamps."""
+        data = {
+            'timestamp': datetime.now().isoformat(),
+            'blocks': [
+                {'number': 1000, 'hash': '0x123...', 'timestamp': 100},
+                {'number': 1001, 'hash': '0x456...', 'timestamp': 200}
+            ]
+        }
+        consistency = self.quality_checker.check_data_consistency(data)
+        self.assertTrue(consistency['timestamps_valid'])
+        
+        data['blocks'].reverse()
+        data['blocks'][0]['number'], data['blocks'][1]['number'] = 1000, 1001
+        consistency = self.quality_checker.check_data_consistency(data)
+        self.assertFalse(consistency['timestamps_valid'])
+    
     def test_quality_storage(self):
         """Test quality metrics storage."""
         try:
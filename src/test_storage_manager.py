@@ -92,7 +92,13 @@ def test_storage_manager():
             for subcategory in storage_manager.storage_structure[category]:
                 subfiles = storage_manager.list_data(category, subcategory)
                 logger.info(f"Files in {category}/{subcategory}: {subfiles}")
-        
+
+        # Test server-side move from raw to processed
+        raw_files = storage_manager.list_data("raw", "blockchain")
+        if raw_files:
+            moved_path = storage_manager.move_data(raw_files[-1], "processed", "features")
+            logger.info(f"Moved {raw_files[-1]} to: {moved_path}")
+
         return True
         
     except Exception as e:
@@ -1,11 +1,16 @@
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, MagicMock, patch
+import json
+from collections import namedtuple
+from decimal import Decimal
 import logging
 from datetime import datetime
+import httpx
 from sqlalchemy import create_engine, text
 from src.ingestion.connectors.api_connector import APIConnector
 from src.ingestion.connectors.db_connector import DatabaseConnector
 from src.ingestion.connectors.ethereum_connector import EthereumConnector
+from src.ingestion.connectors.httpx_provider import HTTPXProvider
 from src.ingestion.connectors.solana_connector import SolanaConnector
 
 logger = logging.getLogger(__name__)
@@ -55,7 +60,7 @@ class TestConnectors(unittest.TestCase):
         # Mock successful response
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {'data': [{'id': 1, 'name': 'test'}]}
+        mock_response.content = b'{"data": [{"id": 1, "name": "test"}]}'
         mock_session.return_value.get.return_value = mock_response
         mock_session.return_value.request.return_value = mock_response
         
@@ -99,8 +104,37 @@ class TestConnectors(unittest.TestCase):
         })
         self.assertEqual(len(data), 1)
         self.assertEqual(data[0]['name'], 'test2')
+        
+        # Test streamed fetching
+        batches = list(connector.stream_data({
+            'sql': 'SELECT * FROM test_table ORDER BY id'
+        }))
+        self.assertEqual(len(batches), 1)
+        self.assertEqual([row['name'] for row in batches[0]], ['test1', 'test2'])
     
-    @patch('web3.Web3')
+    def test_db_copy_column_types(self):
+        """Test COPY output is parsed with the result's column types."""
+        Column = namedtuple('Column', 'name type_code precision scale')
+        description = [
+            Column('code', 1043, None, None),    # varchar
+            Column('amount', 1700, 10, 2),       # numeric(10, 2)
+            Column('active', 16, None, None),    # bool
+            Column('note', 25, None, None)       # text
+        ]
+        cursor = Mock()
+        cursor.copy_expert.side_effect = lambda sql, buffer: buffer.write(
+            b'code,amount,active,note\n00123,1.50,t,NA\n,2.00,f,""\n'
+        )
+        
+        connector = DatabaseConnector(self.db_config)
+        rows = connector._copy_to_table(cursor, 'SELECT 1', description).to_pylist()
+        
+        self.assertEqual(rows, [
+            {'code': '00123', 'amount': Decimal('1.50'), 'active': True, 'note': 'NA'},
+            {'code': None, 'amount': Decimal('2.00'), 'active': False, 'note': ''}
+        ])
+    
+    @patch('src.ingestion.connectors.ethereum_connector.Web3')
     def test_ethereum_connector(self, MockWeb3):
         """Test Ethereum connector functionality."""
         # Create mock provider
@@ -110,15 +144,15 @@ class TestConnectors(unittest.TestCase):
         # Create mock eth object
         mock_eth = Mock(name='eth')
         mock_eth.block_number = 1000
-        mock_eth.get_block.return_value = {
+        mock_block = {
             'number': 1000,
-            'hash': '0x123',
-            'parentHash': '0x456',
+            'hash': bytes.fromhex('0123'),
+            'parentHash': bytes.fromhex('0456'),
             'timestamp': int(datetime.now().timestamp()),
             'transactions': [],
             'gasUsed': 1000,
             'gasLimit': 2000,
-            'extraData': '0x789',
+            'extraData': bytes.fromhex('0789'),
             'baseFeePerGas': None
         }
         
@@ -127,6 +161,11 @@ class TestConnectors(unittest.TestCase):
         mock_web3.eth = mock_eth
         mock_web3.is_connected.return_value = True
         
+        # Blocks are fetched through a JSON-RPC batch
+        mock_web3.batch_requests = MagicMock()
+        mock_batch = mock_web3.batch_requests.return_value.__enter__.return_value
+        mock_batch.execute.return_value = [mock_block]
+        
         # Set up the Web3 class mock
         MockWeb3.side_effect = lambda _: mock_web3
         
@@ -142,8 +181,70 @@ class TestConnectors(unittest.TestCase):
         self.assertEqual(len(data), 1)
         self.assertEqual(data[0]['number'], 1000)
     
-    @patch('solana.rpc.api.Client')
-    def test_solana_connector(self, MockClient):
+    def test_ethereum_block_cache_copies(self):
+        """Test callers cannot alter cached finalized blocks."""
+        raw_block = {
+            'number': 1000,
+            'hash': bytes.fromhex('0123'),
+            'parentHash': bytes.fromhex('0456'),
+            'timestamp': int(datetime.now().timestamp()),
+            'transactions': [{
+                'hash': bytes.fromhex('0abc'),
+                'from': '0x123',
+                'to': '0x456',
+                'value': 1,
+                'gas': 21000,
+                'gasPrice': 1,
+                'nonce': 0
+            }],
+            'gasUsed': 1000,
+            'gasLimit': 2000,
+            'extraData': bytes.fromhex('0789'),
+            'baseFeePerGas': None
+        }
+        connector = EthereumConnector({**self.eth_config, 'block_cache_size': 8})
+        connector.web3 = Mock()
+        connector.web3.eth.block_number = 1100
+        connector._pool = Mock(map=map)
+        
+        with patch.object(connector, '_fetch_blocks', return_value=[raw_block]) as mock_fetch:
+            first = connector.fetch_data({'start_block': 1000, 'end_block': 1000})
+            first[0]['gas_used'] = 0
+            first[0]['transactions'][0]['value'] = 0
+            
+            second = connector.fetch_data({'start_block': 1000, 'end_block': 1000})
+            second[0]['transactions'].clear()
+            third = connector.fetch_data({'start_block': 1000, 'end_block': 1000})
+        
+        mock_fetch.assert_called_once()
+        self.assertEqual(second[0]['gas_used'], 1000)
+        self.assertEqual(third[0]['transactions'][0]['value'], 1)
+    
+    def test_httpx_provider_batch(self):
+        """Test batched JSON-RPC requests through the HTTPX provider."""
+        def handler(request):
+            # Reply out of order to check responses are re-sorted by id
+            body = json.loads(request.content)
+            return httpx.Response(200, json=[
+                {'jsonrpc': '2.0', 'id': r['id'], 'result': r['method']}
+                for r in reversed(body)
+            ])
+        
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        provider = HTTPXProvider('http://localhost:8545', client=client)
+        
+        responses = provider.make_batch_request([
+            ('eth_blockNumber', []),
+            ('eth_chainId', [])
+        ])
+        self.assertEqual(
+            [r['result'] for r in responses],
+            ['eth_blockNumber', 'eth_chainId']
+        )
+    
+    @patch('requests.Session')
+    @patch('src.ingestion.connectors.solana_connector.Client')
+    def test_solana_connector(self, MockClient, mock_session):
         """Test Solana connector functionality."""
         # Create mock client with responses
         mock_client = Mock(name='SolanaClient')
@@ -166,12 +267,14 @@ class TestConnectors(unittest.TestCase):
             'blockTime': int(datetime.now().timestamp())
         }
         
-        # Mock get_block response
-        mock_client.get_block = Mock(return_value={
+        # Mock batched getBlock response
+        mock_response = Mock()
+        mock_response.content = json.dumps([{
             'jsonrpc': '2.0',
             'result': mock_block,
-            'id': 1
-        })
+            'id': 0
+        }]).encode()
+        mock_session.return_value.post.return_value = mock_response
         
         # Set up the Client class mock
         MockClient.side_effect = lambda endpoint: mock_client
@@ -188,5 +291,17 @@ class TestConnectors(unittest.TestCase):
         self.assertEqual(len(data), 1)
         self.assertEqual(data[0]['slot'], 100)
 
+        # Requests are bounded by the connector timeout
+        self.assertEqual(mock_session.return_value.post.call_args[1]['timeout'], 30)
+        
+        # A whole-batch RPC error is reported instead of failing to sort
+        mock_response.content = json.dumps({
+            'jsonrpc': '2.0',
+            'error': {'code': -32600, 'message': 'Invalid request'},
+            'id': None
+        }).encode()
+        with self.assertRaisesRegex(ValueError, 'Invalid request'):
+            connector.fetch_data({'slot': 100, 'until_slot': 100})
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import Mock, patch, AsyncMock
+from unittest.mock import Mock, patch
 import torch
 import asyncio
 from fastapi.testclient import TestClient
@@ -86,19 +86,22 @@ class TestModelServer(unittest.TestCase):
         self.assertIn('gpu_available', data)
         self.assertIn('loaded_models', data)
     
-    @patch('torch.cuda.memory_allocated')
-    @patch('torch.cuda.empty_cache')
-    async def test_cache_cleanup(self, mock_empty_cache, mock_memory_allocated):
-        """Test model cache cleanup."""
-        # Mock high memory usage
-        mock_memory_allocated.return_value = 8 * 1024**3  # 8GB
-        
-        # Trigger cleanup
-        await self.server._cleanup_cache()
-        
-        # Verify cache was cleared
-        self.assertEqual(len(self.server._model_cache), 0)
-        mock_empty_cache.assert_called_once()
+    @patch('uvicorn.run')
+    def test_start_workers(self, mock_run):
+        """Test multi-worker start passes an app factory import string."""
+        self.server.start()
+        self.assertIs(mock_run.call_args.args[0], self.server.app)
+        self.assertFalse(mock_run.call_args.kwargs['access_log'])
+        
+        self.server.workers = 2
+        with patch.dict('os.environ'):
+            self.server.start()
+        self.assertEqual(
+            mock_run.call_args.args[0],
+            'src.llm.deployment.model_server:create_app'
+        )
+        self.assertTrue(mock_run.call_args.kwargs['factory'])
+        self.assertEqual(mock_run.call_args.kwargs['workers'], 2)
     
     def test_error_handling(self):
         """Test error handling in endpoints."""
@@ -136,22 +139,46 @@ class TestLoadBalancer(unittest.TestCase):
         self.load_balancer = LoadBalancer(self.config)
     
     def test_server_rotation(self):
-        """Test round-robin server selection."""
+        """Test requests spread across servers by in-flight count."""
         first_server = self.load_balancer.get_next_server()
         second_server = self.load_balancer.get_next_server()
         third_server = self.load_balancer.get_next_server()
         
-        # Verify round-robin
+        # Verify equally loaded servers alternate
         self.assertNotEqual(first_server, second_server)
         self.assertEqual(first_server, third_server)
     
-    @patch('aiohttp.ClientSession.get')
+    def test_shared_registry(self):
+        """Test servers and their pipelines share one model registry."""
+        for server in self.load_balancer.servers:
+            self.assertIs(server.model_registry, self.load_balancer.shared_registry)
+            self.assertIs(server.inference_pipeline.model_registry, self.load_balancer.shared_registry)
+    
+    def test_least_outstanding(self):
+        """Test the least loaded server is chosen after releases."""
+        first_server = self.load_balancer.get_next_server()
+        second_server = self.load_balancer.get_next_server()
+        self.assertIsNot(first_server, second_server)
+        self.load_balancer.release_server(second_server)
+        
+        self.assertIs(self.load_balancer.get_next_server(), second_server)
+        self.assertEqual(self.load_balancer.inflight, [1, 1])
+    
+    def test_prefix_affinity(self):
+        """Test prompts with a shared prefix stick to one server until it is overloaded."""
+        prompt = 'Summarize the following block: ' * 20
+        server = self.load_balancer.get_next_server(prompt)
+        self.assertIs(self.load_balancer.get_next_server(prompt), server)
+        self.assertIs(self.load_balancer.get_next_server(prompt), server)
+        
+        # Three ahead of the other server exceeds the affinity slack
+        self.assertIsNot(self.load_balancer.get_next_server(prompt), server)
+    
+    @patch('httpx.AsyncClient.get')
     async def test_health_check(self, mock_get):
         """Test health check of all servers."""
         # Mock healthy responses
-        mock_get.return_value.__aenter__.return_value.json = AsyncMock(
-            return_value={'status': 'healthy'}
-        )
+        mock_get.return_value = Mock(json=Mock(return_value={'status': 'healthy'}))
         
         health_status = await self.load_balancer.health_check()
         
@@ -159,12 +186,12 @@ class TestLoadBalancer(unittest.TestCase):
         for server_status in health_status.values():
             self.assertEqual(server_status['status'], 'healthy')
     
-    @patch('aiohttp.ClientSession.get')
+    @patch('httpx.AsyncClient.get')
     async def test_unhealthy_server(self, mock_get):
         """Test handling of unhealthy server."""
         # Mock one server as unhealthy
         mock_get.side_effect = [
-            AsyncMock(return_value={'status': 'healthy'}),
+            Mock(json=Mock(return_value={'status': 'healthy'})),
             Exception("Connection failed")
         ]
         
@@ -30,6 +30,9 @@ class TestInferencePipeline(unittest.TestCase):
         mock_tokenizer = Mock()
         
         mock_model.generate.return_value = torch.tensor([[1, 2, 3]])
+        mock_tokenizer.return_value.to.return_value = {
+            'input_ids': torch.tensor([[5]])
+        }
         mock_tokenizer.batch_decode.return_value = ['Test response']
         mock_tokenizer.pad_token_id = 0
         mock_tokenizer.eos_token_id = 2
@@ -57,7 +60,11 @@ class TestInferencePipeline(unittest.TestCase):
         mock_model = Mock()
         mock_tokenizer = Mock()
         
-        mock_model.generate.return_value = torch.tensor([[1, 2], [3, 4]])
+        mock_model.generate.return_value = torch.tensor([[5, 1, 0], [6, 3, 4]])
+        mock_tokenizer.return_value.to.return_value = {
+            'input_ids': torch.tensor([[5], [6]]),
+            'attention_mask': torch.tensor([[1], [1]])
+        }
         mock_tokenizer.batch_decode.return_value = ['Response 1', 'Response 2']
         mock_tokenizer.pad_token_id = 0
         mock_tokenizer.eos_token_id = 2
@@ -76,6 +83,72 @@ class TestInferencePipeline(unittest.TestCase):
         self.assertEqual(result[1]['prompt'], 'Prompt 2')
         self.assertEqual(result[0]['generated'], 'Response 1')
         self.assertEqual(result[1]['generated'], 'Response 2')
+        
+        # Padding is not counted, and only rows that hit max_length report it
+        self.assertEqual([r['tokens'] for r in result], [2, 3])
+        self.assertEqual([r['finish_reason'] for r in result], ['stop', 'stop'])
+    
+    @patch('src.llm.model_registry.ModelRegistry.load_model')
+    def test_batching_queue(self, mock_load_model):
+        """Test concurrent requests are merged into one batch."""
+        # Mock model and tokenizer
+        mock_model = Mock()
+        mock_tokenizer = Mock()
+        
+        mock_model.generate.return_value = torch.tensor([[1, 2], [3, 4]])
+        mock_tokenizer.return_value.to.return_value = {
+            'input_ids': torch.tensor([[5], [6]])
+        }
+        mock_tokenizer.batch_decode.return_value = ['Response 1', 'Response 2']
+        mock_tokenizer.pad_token_id = 0
+        mock_tokenizer.eos_token_id = 2
+        
+        mock_load_model.return_value = {
+            'model': mock_model,
+            'tokenizer': mock_tokenizer
+        }
+        
+        # Keep the mock model in place of a scripted copy
+        self.pipeline.optimize_for_inference = False
+        
+        async def run_concurrent():
+            await self.pipeline.start()
+            try:
+                return await asyncio.gather(
+                    self.pipeline.generate('Prompt 1'),
+                    self.pipeline.generate('Prompt 2')
+                )
+            finally:
+                await self.pipeline.stop()
+        
+        first, second = asyncio.run(run_concurrent())
+        
+        self.assertEqual(first[0]['generated'], 'Response 1')
+        self.assertEqual(second[0]['generated'], 'Response 2')
+        
+        # Both prompts should share a single generate call
+        mock_model.generate.assert_called_once()
+        self.assertEqual(mock_tokenizer.call_args[0][0], ['Prompt 1', 'Prompt 2'])
+    
+    def test_stop_fails_inflight_prompts(self):
+        """Test stop() fails prompts already taken off the queue."""
+        async def run_stop():
+            started = asyncio.Event()
+            
+            async def stalled(*args, **kwargs):
+                started.set()
+                await asyncio.Event().wait()
+            
+            with patch.object(self.pipeline, '_generate_direct', side_effect=stalled):
+                await self.pipeline.start()
+                request = asyncio.create_task(self.pipeline.generate('Prompt 1'))
+                await started.wait()
+                await self.pipeline.stop()
+                
+                with self.assertRaises(RuntimeError):
+                    await asyncio.wait_for(request, 1)
+        
+        asyncio.run(run_stop())
     
     def test_metrics(self):
         """Test metrics tracking."""
@@ -110,6 +183,133 @@ class TestInferencePipeline(unittest.TestCase):
         self.assertEqual(batches[1], ['3', '4'])
         self.assertEqual(batches[2], ['5'])
     
+    @patch('src.llm.inference_pipeline.TextIteratorStreamer')
+    @patch('src.llm.model_registry.ModelRegistry.load_model')
+    def test_generate_stream(self, mock_load_model, mock_streamer):
+        """Test streamed generation yields decoded chunks in order."""
+        mock_model = Mock()
+        mock_tokenizer = Mock()
+        mock_tokenizer.return_value.to.return_value = {
+            'input_ids': torch.tensor([[5]])
+        }
+        mock_streamer.return_value = iter(['Hello', '', ' world'])
+        mock_load_model.return_value = {
+            'model': mock_model,
+            'tokenizer': mock_tokenizer
+        }
+        self.pipeline.optimize_for_inference = False
+        
+        async def collect():
+            return [chunk async for chunk in self.pipeline.generate_stream('Test prompt')]
+        
+        self.assertEqual(asyncio.run(collect()), ['Hello', ' world'])
+        self.assertIs(
+            mock_model.generate.call_args.kwargs['streamer'],
+            mock_streamer.return_value
+        )
+    
+    @patch('src.llm.model_registry.ModelRegistry.unload_model')
+    @patch('src.llm.model_registry.ModelRegistry.load_model')
+    def test_model_cache_eviction(self, mock_load_model, mock_unload_model):
+        """Test the least recently used model is released past max_cached_models."""
+        pipeline = InferencePipeline({
+            **self.config,
+            'max_cached_models': 1,
+            'optimize_for_inference': False
+        })
+        first_model = Mock()
+        mock_load_model.side_effect = [
+            {'model': first_model, 'tokenizer': Mock()},
+            {'model': Mock(), 'tokenizer': Mock()}
+        ]
+        
+        first = asyncio.run(pipeline._load_and_optimize_model('model_a', '1.0.0'))
+        self.assertIs(asyncio.run(pipeline._load_and_optimize_model('model_a', '1.0.0')), first)
+        self.assertEqual(mock_load_model.call_count, 1)
+        
+        asyncio.run(pipeline._load_and_optimize_model('model_b', '1.0.0'))
+        self.assertEqual(list(pipeline.model_cache.keys()), ['model_b:1.0.0'])
+        first_model.to.assert_called_with('cpu')
+        mock_unload_model.assert_called_once_with('model_a', '1.0.0')
+    
+    def test_registry_eviction_shared(self):
+        """Test the pipeline cache and a shared registry evict together."""
+        pipeline = InferencePipeline({**self.config, 'max_cached_models': 4})
+        registry = pipeline.model_registry
+        
+        # The registry never evicts before the pipeline cache is full
+        self.assertEqual(registry.max_loaded, 4)
+        
+        # A model the registry evicts for another caller is dropped here too
+        model = Mock()
+        pipeline.model_cache['model_a:1.0.0'] = {'model': model, 'tokenizer': Mock()}
+        registry.active_models['model_a:1.0.0'] = {'model': model, 'device': 'cpu'}
+        registry.active_models['model_b:1.0.0'] = {'model': Mock(), 'device': 'cpu'}
+        registry.max_loaded = 1
+        registry._evict_models()
+        
+        self.assertNotIn('model_a:1.0.0', pipeline.model_cache)
+        self.assertEqual(list(registry.active_models), ['model_b:1.0.0'])
+        model.to.assert_called_with('cpu')
+    
+    @patch('src.llm.inference_pipeline.DynamicCache')
+    def test_prefix_cache(self, mock_dynamic_cache):
+        """Test shared prompt prefixes are prefilled once and then reused."""
+        mock_model = Mock()
+        mock_model.return_value.past_key_values = {'prefix': 'kv'}
+        inputs = {
+            'input_ids': torch.tensor([list(range(70))]),
+            'attention_mask': torch.tensor([[1] * 70])
+        }
+        
+        # First sighting only records the prefix
+        self.assertIsNone(self.pipeline._prefix_kv('test_model:1.0.0', mock_model, inputs))
+        mock_model.assert_not_called()
+        
+        # Second sighting prefills the 64-token prefix
+        cache = self.pipeline._prefix_kv('test_model:1.0.0', mock_model, inputs)
+        self.assertEqual(cache, {'prefix': 'kv'})
+        self.assertEqual(len(mock_model.call_args.kwargs['input_ids'][0]), 64)
+        
+        # Later requests reuse a private copy without another prefill
+        reused = self.pipeline._prefix_kv('test_model:1.0.0', mock_model, inputs)
+        self.assertEqual(reused, cache)
+        self.assertIsNot(reused, cache)
+        self.assertEqual(mock_model.call_count, 1)
+        self.assertEqual(self.pipeline.metrics['prefix_hits'], 2)
+        
+        # Padded batches never use the prefix cache
+        inputs['attention_mask'] = torch.tensor([[0] + [1] * 69])
+        self.assertIsNone(self.pipeline._prefix_kv('test_model:1.0.0', mock_model, inputs))
+    
+    @patch('src.llm.model_registry.ModelRegistry.load_model')
+    def test_autocast_gating(self, mock_load_model):
+        """Test only fp32 models are registered for autocast."""
+        pipeline = InferencePipeline({**self.config, 'fp16': True, 'optimize_for_inference': False})
+        pipeline.use_cuda = True
+        
+        fp32_model = Mock()
+        fp32_model.parameters.return_value = iter([Mock(dtype=torch.float32)])
+        half_model = Mock()
+        half_model.parameters.return_value = iter([Mock(dtype=torch.bfloat16)])
+        mock_load_model.side_effect = [
+            {'model': fp32_model, 'tokenizer': Mock()},
+            {'model': half_model, 'tokenizer': Mock()}
+        ]
+        
+        asyncio.run(pipeline._load_and_optimize_model('fp32_model', '1.0.0'))
+        asyncio.run(pipeline._load_and_optimize_model('half_model', '1.0.0'))
+        self.assertEqual(pipeline._autocast_models, {'fp32_model:1.0.0'})
+    
+    def test_length_buckets(self):
+        """Test prompts are grouped by length and capped at max_batch_size."""
+        prompts = ['a' * 1000, 'b' * 10, 'c' * 300, 'd' * 20, 'e' * 30]
+        groups = self.pipeline._length_buckets(prompts)
+        
+        # Short prompts fill batches of two, long prompts get their own
+        self.assertEqual(groups, [[1, 3], [4], [2], [0]])
+        self.assertEqual(sorted(i for g in groups for i in g), list(range(len(prompts))))
+    
     @patch('torch.cuda')
     @patch('psutil.virtual_memory')
     def test_memory_management(self, mock_vmem, mock_cuda):
@@ -117,7 +317,7 @@ class TestInferencePipeline(unittest.TestCase):
         # Configure CUDA mock
         mock_cuda.is_available.return_value = True
         mock_cuda.memory_allocated.return_value = 4 * 1024**3  # 4GB used
-        mock_cuda.max_memory_allocated.return_value = 8 * 1024**3  # 8GB total
+        mock_cuda.mem_get_info.return_value = (4 * 1024**3, 8 * 1024**3)  # 8GB total
         
         # Configure system memory mock
         mock_vmem.return_value.percent = 85  # 85% system memory used
@@ -139,12 +339,29 @@ class TestInferencePipeline(unittest.TestCase):
         self.assertEqual(latest_memory['gpu_memory'], 4 * 1024**3)
         
         # Verify memory management calls
-        mock_cuda.empty_cache.assert_not_called()  # Should not be called as memory usage is 50%
+        mock_cuda.empty_cache.assert_not_called()
         
-        # Test memory threshold trigger
+        # Above the threshold the allocator cache is kept warm
         mock_cuda.memory_allocated.return_value = 7.5 * 1024**3  # 7.5GB used (above threshold)
         test_pipeline._manage_memory()
-        mock_cuda.empty_cache.assert_called_once()
+        mock_cuda.empty_cache.assert_not_called()
+    
+    @patch('psutil.virtual_memory')
+    def test_background_memory_sampling(self, mock_vmem):
+        """Test requests read sampled memory while the pipeline runs."""
+        mock_vmem.return_value.percent = 40
+        
+        async def run():
+            await self.pipeline.start()
+            await asyncio.sleep(0)
+            mock_vmem.reset_mock()
+            self.pipeline._manage_memory()
+            await self.pipeline.stop()
+        
+        asyncio.run(run())
+        mock_vmem.assert_not_called()
+        self.assertEqual(self.pipeline.metrics['memory_usage'][-1]['system_memory'], 40)
+        self.assertIsNone(self.pipeline._metrics_task)
     
     @patch('torch.cuda')
     def test_dynamic_batching(self, mock_cuda):
@@ -163,54 +380,131 @@ class TestInferencePipeline(unittest.TestCase):
         self.pipeline.metrics['batch_sizes'] = [4, 4, 4]  # Previous successful batches
         batches = list(self.pipeline._dynamic_batch(inputs))
         self.assertTrue(all(1 <= len(batch) <= self.pipeline.max_batch_size for batch in batches))
+        
+        # Batch size follows from KV cache bytes per token and free memory
+        self.pipeline.use_cuda = True
+        self.pipeline.max_batch_size = 8
+        self.pipeline._kv_bpt['test_model:1.0.0'] = 1024**2  # 1MB per token
+        mock_cuda.mem_get_info.return_value = (1000 * 1024**2, 8 * 1024**3)
+        batches = self.pipeline._dynamic_batch(
+            inputs, model_key='test_model:1.0.0', max_length=200
+        )
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
     
-    @patch('torch.jit')
-    def test_model_optimization(self, mock_jit):
+    @patch('torch.cuda')
+    def test_metrics_history_bounded(self, mock_cuda):
+        """Test batch size history is capped while statistics cover every batch."""
+        self.pipeline.use_cuda = True
+        for _ in range(1100):
+            self.pipeline._dynamic_batch(['prompt'])
+        
+        self.assertEqual(len(self.pipeline.metrics['batch_sizes']), 1024)
+        stats = self.pipeline.get_detailed_metrics()['batch_stats']
+        self.assertEqual(stats['avg_batch_size'], self.pipeline.max_batch_size)
+        self.assertEqual(self.pipeline._batch_n, 1100)
+    
+    @patch('torch.compile')
+    def test_model_optimization(self, mock_compile):
         """Test model optimization features."""
         # Create mock model
         mock_model = Mock()
         mock_model.eval = Mock()
-        mock_model.to = Mock(return_value=mock_model)
+        eager_forward = mock_model.forward
         
-        # Test optimization
+        # Test optimization without CUDA
+        self.pipeline.use_cuda = False
         optimized = self.pipeline._optimize_model(mock_model)
-        
-        # Verify optimizations were applied
         mock_model.eval.assert_called_once()
-        if self.pipeline.use_cuda:
-            mock_model.to.assert_called_with(memory_format=torch.channels_last)
-    
-    def test_caching(self):
-        """Test response and tokenization caching."""
-        # Test response cache
-        prompt = "test prompt"
-        cached_response = self.pipeline._generate_cached(
-            prompt=prompt,
-            model_name='test_model',
-            version='1.0.0'
+        mock_compile.assert_not_called()
+        
+        # On CUDA the forward pass is compiled and warmed up
+        self.pipeline.use_cuda = True
+        self.pipeline.device = 'cpu'
+        optimized = self.pipeline._optimize_model(mock_model, model_key='model_a:1.0.0')
+        mock_compile.assert_called_once_with(
+            eager_forward, mode='reduce-overhead', dynamic=True
         )
-        self.assertTrue(cached_response['cached'])
-        
-        # Test tokenization cache
-        prompts = ["prompt1", "prompt2"]
-        kwargs = {'temperature': 0.7}
-        
-        # First call should miss cache
-        result1 = self.pipeline._check_cache(prompts, kwargs)
-        self.assertIsNone(result1)
-        
-        # Add to cache
-        self.pipeline.tokenization_cache[(
-            tuple(prompts),
-            self.pipeline.default_model,
-            self.pipeline.default_version,
-            frozenset(kwargs.items())
-        )] = ['response1', 'response2']
-        
-        # Second call should hit cache
-        result2 = self.pipeline._check_cache(prompts, kwargs)
-        self.assertIsNotNone(result2)
+        self.assertIs(optimized.forward, mock_compile.return_value)
+        self.assertEqual(mock_model.generate.call_args.kwargs['max_new_tokens'], 1)
+        self.assertIn('model_a:1.0.0', self.pipeline._compiled_models)
+        
+        # A failed compile falls back to the eager forward, and the model is
+        # not treated as compiled, so decode graphs stay available to it
+        mock_model.forward = eager_forward
+        mock_compile.side_effect = RuntimeError("compile failed")
+        optimized = self.pipeline._optimize_model(mock_model, model_key='model_b:1.0.0')
+        self.assertIs(optimized.forward, eager_forward)
+        self.assertNotIn('model_b:1.0.0', self.pipeline._compiled_models)
+    
+    @patch('src.llm.model_registry.ModelRegistry.load_model')
+    def test_caching(self, mock_load_model):
+        """Test per-prompt response caching."""
+        # Mock model and tokenizer
+        mock_model = Mock()
+        mock_tokenizer = Mock()
+        
+        mock_model.generate.return_value = torch.tensor([[1, 2, 3]])
+        mock_tokenizer.return_value.to.return_value = {
+            'input_ids': torch.tensor([[5]])
+        }
+        mock_tokenizer.batch_decode.return_value = ['Cached response']
+        mock_tokenizer.pad_token_id = 0
+        mock_tokenizer.eos_token_id = 2
+        
+        mock_load_model.return_value = {
+            'model': mock_model,
+            'tokenizer': mock_tokenizer
+        }
+        self.pipeline.optimize_for_inference = False
+        
+        # First greedy call should miss the cache
+        result1 = asyncio.run(self.pipeline.generate('test prompt', do_sample=False))
+        self.assertEqual(self.pipeline.metrics['cache_hits'], 0)
+        
+        # Second identical call should hit the cache without generating
+        result2 = asyncio.run(self.pipeline.generate('test prompt', do_sample=False))
+        self.assertEqual(result2, result1)
         self.assertEqual(self.pipeline.metrics['cache_hits'], 1)
+        mock_model.generate.assert_called_once()
+        
+        # Different settings and sampled generation must not share entries
+        asyncio.run(self.pipeline.generate('test prompt', do_sample=False, top_k=5))
+        asyncio.run(self.pipeline.generate('test prompt'))
+        asyncio.run(self.pipeline.generate('test prompt'))
+        self.assertEqual(self.pipeline.metrics['cache_hits'], 1)
+        self.assertEqual(mock_model.generate.call_count, 4)
+    
+    def test_decode_graph_gating(self):
+        """Test that only greedy requests use captured decode graphs."""
+        mock_model = Mock()
+        mock_tokenizer = Mock()
+        
+        mock_model.generate.return_value = torch.tensor([[1, 2, 3]])
+        mock_tokenizer.return_value.to.return_value = {
+            'input_ids': torch.tensor([[5]]),
+            'attention_mask': torch.tensor([[1]])
+        }
+        mock_tokenizer.batch_decode.return_value = ['Test response']
+        
+        self.pipeline._graph_models.add('test_model:1.0.0')
+        with patch.object(self.pipeline, '_get_decode_graph', return_value=None) as mock_graph:
+            asyncio.run(self.pipeline._generate_optimized(
+                mock_model, mock_tokenizer, ['Test prompt'],
+                model_key='test_model:1.0.0', do_sample=True
+            ))
+            mock_graph.assert_not_called()
+            
+            asyncio.run(self.pipeline._generate_optimized(
+                mock_model, mock_tokenizer, ['Test prompt'],
+                model_key='test_model:1.0.0', do_sample=False
+            ))
+            mock_graph.assert_called_once_with(
+                'test_model:1.0.0', mock_model, 1, self.config['max_length']
+            )
+        
+        # Eviction drops the model's graphs
+        self.pipeline.release_graphs('test_model:1.0.0')
+        self.assertNotIn('test_model:1.0.0', self.pipeline._graph_models)
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
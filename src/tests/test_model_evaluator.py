@@ -105,6 +105,56 @@ class TestModelEvaluator(unittest.TestCase):
         self.assertIn('end_time', results)
         self.assertIn('duration_seconds', results)
     
+    @patch('src.llm.inference_pipeline.InferencePipeline.generate')
+    def test_accuracy_latency_single_pass(self, mock_generate):
+        """Test accuracy and latency share one generation pass."""
+        mock_generate.return_value = [
+            {'generated': 'Response 1', 'tokens': 10},
+            {'generated': 'Response 2', 'tokens': 12}
+        ]
+        
+        results = self.loop.run_until_complete(
+            self.evaluator.evaluate_model(
+                'test_model',
+                '1.0.0',
+                self.eval_data,
+                metrics=['latency', 'accuracy']
+            )
+        )
+        
+        mock_generate.assert_called_once()
+        self.assertEqual(list(results['metrics']), ['latency', 'accuracy'])
+        self.assertEqual(results['metrics']['accuracy']['accuracy'], 1.0)
+        self.assertEqual(results['metrics']['latency']['samples_processed'], 2)
+    
+    @patch('src.llm.inference_pipeline.InferencePipeline.generate')
+    def test_latency_runs_alone(self, mock_generate):
+        """Test the timed pass runs after the other metrics, unbatched."""
+        calls = []
+        
+        async def perplexity(*args):
+            calls.append('perplexity')
+            return {'perplexity': 1.0, 'avg_loss': 0.0}
+        
+        async def generate(*args, **kwargs):
+            calls.append('generate')
+            return [{'generated': 'Response 1', 'tokens': 10}]
+        
+        mock_generate.side_effect = generate
+        with patch.object(self.evaluator, '_evaluate_perplexity', side_effect=perplexity):
+            results = self.loop.run_until_complete(
+                self.evaluator.evaluate_model(
+                    'test_model',
+                    '1.0.0',
+                    self.eval_data[:1],
+                    metrics=['latency', 'perplexity']
+                )
+            )
+        
+        self.assertEqual(calls, ['perplexity', 'generate'])
+        self.assertFalse(mock_generate.call_args.kwargs['merge'])
+        self.assertEqual(list(results['metrics']), ['latency', 'perplexity'])
+    
     @patch('src.llm.model_registry.ModelRegistry.load_model')
     def test_perplexity_evaluation(self, mock_load_model):
         """Test perplexity evaluation."""
@@ -185,15 +235,51 @@ class TestModelEvaluator(unittest.TestCase):
         self.assertIn('avg_throughput', results)
         self.assertEqual(results['samples_processed'], 2)
     
+    def test_tokenize_cache(self):
+        """Test evaluation batches are tokenized once per tokenizer."""
+        tokenizer = Mock(name_or_path='test_model')
+        prompts, expected = self.evaluator._columns(self.eval_data)
+
+        first = self.evaluator._tokenize_batch(tokenizer, prompts, expected)
+        second = self.evaluator._tokenize_batch(tokenizer, prompts, expected)
+
+        # One call each for prompts and expected outputs
+        self.assertEqual(tokenizer.call_count, 2)
+        self.assertIs(first, second)
+
+        # A different tokenizer encodes the data again
+        other = Mock(name_or_path='other_model')
+        self.evaluator._tokenize_batch(other, prompts, expected)
+        self.assertEqual(other.call_count, 2)
+
+    def test_pack_batches(self):
+        """Test samples are packed by length under the token budget."""
+        self.evaluator.token_budget = 40
+        data = [
+            {'prompt': 'x' * length, 'expected': 'y'}
+            for length in (60, 4, 30, 8, 90, 2)
+        ]
+        prompts, expected = self.evaluator._columns(data)
+        batches = list(self.evaluator._pack_batches(prompts, expected))
+
+        # Every sample appears once, in ascending length order
+        packed = [p for batch_prompts, _ in batches for p in batch_prompts]
+        self.assertEqual([len(p) for p in packed], [2, 4, 8, 30, 60, 90])
+
+        # Short samples share a batch, long ones are split off
+        self.assertEqual([len(batch_prompts) for batch_prompts, _ in batches], [4, 1, 1])
+
     def test_batch_data(self):
         """Test data batching."""
-        data = [{'id': i} for i in range(5)]
-        batches = list(self.evaluator._batch_data(data))
+        data = [{'prompt': f'p{i}', 'expected': f'e{i}'} for i in range(5)]
+        prompts, expected = self.evaluator._columns(data)
+        batches = list(self.evaluator._batch_data(prompts, expected))
         
         self.assertEqual(len(batches), 3)
-        self.assertEqual(len(batches[0]), 2)
-        self.assertEqual(len(batches[1]), 2)
-        self.assertEqual(len(batches[2]), 1)
+        self.assertEqual(len(batches[0][0]), 2)
+        self.assertEqual(len(batches[1][0]), 2)
+        self.assertEqual(len(batches[2][0]), 1)
+        self.assertEqual(list(batches[2][1]), ['e4'])
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
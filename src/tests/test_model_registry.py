@@ -3,10 +3,27 @@ from unittest.mock import Mock, patch, mock_open
 import os
 import json
 import tempfile
+import hashlib
 import shutil
 from datetime import datetime
 import torch
-from src.llm.model_registry import ModelRegistry
+from src.llm.model_registry import (
+    ModelRegistry, FP8Linear, quantize_fp8, LEGACY_HASH_ALGO, _fp8_matmul_supported
+)
+
+class _TinyLM(torch.nn.Module):
+    """Minimal causal LM head for quantization tests."""
+    
+    def __init__(self):
+        super().__init__()
+        self.block = torch.nn.Sequential(torch.nn.Linear(16, 16), torch.nn.ReLU())
+        self.lm_head = torch.nn.Linear(16, 4, bias=False)
+    
+    def get_output_embeddings(self):
+        return self.lm_head
+    
+    def forward(self, x):
+        return self.lm_head(self.block(x))
 
 class TestModelRegistry(unittest.TestCase):
     """Test suite for ModelRegistry class."""
@@ -64,11 +81,9 @@ class TestModelRegistry(unittest.TestCase):
             with open(file_path, mode) as f:
                 f.write(content)
     
-    @patch('torch.cuda.is_available')
-    def test_init(self, mock_cuda):
+    @patch('src.llm.model_registry._DEFAULT_DEVICE', 'cpu')
+    def test_init(self):
         """Test initialization of ModelRegistry."""
-        mock_cuda.return_value = False
-        
         registry = ModelRegistry(self.config)
         
         self.assertEqual(registry.models_dir, self.models_dir)
@@ -96,7 +111,24 @@ class TestModelRegistry(unittest.TestCase):
         self.assertEqual(model_info['path'], self.model_path)
         self.assertEqual(model_info['status'], 'registered')
         self.assertEqual(model_info['metadata'], {'description': 'Test model'})
+        self.assertEqual(model_info['hash_algo'], self.registry.hash_algo)
+        self.assertEqual(
+            model_info['hash'],
+            self.registry._calculate_model_hash(self.model_path, model_info['hash_algo'])
+        )
     
+    def test_deferred_save(self):
+        """Test registrations are written once on flush without autosave."""
+        registry = ModelRegistry({**self.config, 'autosave': False})
+        registry.register_model('test_model', self.model_path, '1.0.0')
+        registry.register_model('test_model', self.model_path, '2.0.0')
+        self.assertFalse(os.path.exists(registry.registry_file))
+
+        self.assertTrue(registry.flush())
+        with open(registry.registry_file) as f:
+            saved = json.load(f)
+        self.assertEqual(set(saved['test_model']['versions']), {'1.0.0', '2.0.0'})
+
     @patch('transformers.AutoModelForCausalLM.from_pretrained')
     @patch('transformers.AutoTokenizer.from_pretrained')
     def test_load_model(self, mock_tokenizer, mock_model):
@@ -152,10 +184,61 @@ class TestModelRegistry(unittest.TestCase):
         mock_model.assert_called_once_with(
             self.model_path,
             device_map=None,
-            torch_dtype=torch.float32
+            torch_dtype=torch.float32,
+            low_cpu_mem_usage=True
         )
-        mock_tokenizer.assert_called_once_with(self.model_path)
+        mock_tokenizer.assert_called_once_with(self.model_path, use_fast=True)
     
+    @patch('transformers.AutoModelForCausalLM.from_pretrained')
+    @patch('transformers.AutoTokenizer.from_pretrained')
+    def test_active_models_lru(self, mock_tokenizer, mock_model):
+        """Test loading past max_loaded evicts the least recently used model."""
+        for version in ('1.0.0', '2.0.0', '3.0.0'):
+            self.registry.register_model('test_model', self.model_path, version)
+
+        self.registry.load_model('test_model', '1.0.0')
+        self.registry.load_model('test_model', '2.0.0')
+        # Touch 1.0.0 so 2.0.0 becomes least recently used
+        self.registry.load_model('test_model', '1.0.0')
+        self.registry.load_model('test_model', '3.0.0')
+
+        self.assertEqual(
+            list(self.registry.active_models),
+            ['test_model:1.0.0', 'test_model:3.0.0']
+        )
+
+    @patch('torch.ones_like')
+    @patch('torch.ones')
+    @patch('torch.compile')
+    @patch('transformers.AutoModelForCausalLM.from_pretrained')
+    @patch('transformers.AutoTokenizer.from_pretrained')
+    def test_compile_on_load(self, mock_tokenizer, mock_model, mock_compile,
+                             mock_ones, mock_ones_like):
+        """Test CUDA models are compiled and warmed up when enabled."""
+        registry = ModelRegistry({**self.config, 'compile': True})
+        registry.register_model('test_model', self.model_path, '1.0.0')
+        model = mock_model.return_value
+        eager_forward = model.forward
+
+        result = registry.load_model('test_model', '1.0.0', device='cuda')
+
+        self.assertTrue(result['compiled'])
+        mock_compile.assert_called_once_with(
+            eager_forward,
+            mode='max-autotune',
+            fullgraph=False,
+            dynamic=True
+        )
+        self.assertIs(model.forward, mock_compile.return_value)
+        self.assertEqual(mock_model.call_args.kwargs['torch_dtype'], torch.bfloat16)
+        model.assert_called_once()
+
+        # CPU models are never compiled
+        registry.unload_model('test_model', '1.0.0')
+        result = registry.load_model('test_model', '1.0.0', device='cpu')
+        self.assertFalse(result['compiled'])
+        mock_compile.assert_called_once()
+
     def test_get_model_info(self):
         """Test getting model information."""
         # Register test model
@@ -181,6 +264,67 @@ class TestModelRegistry(unittest.TestCase):
         versions = {model['version'] for model in models}
         self.assertEqual(versions, {'1.0.0', '2.0.0'})
     
+    @patch('transformers.AutoModelForCausalLM.from_config')
+    @patch('transformers.AutoConfig.from_pretrained')
+    @patch('transformers.AutoModelForCausalLM.from_pretrained')
+    @patch('transformers.AutoTokenizer.from_pretrained')
+    def test_share_and_attach(self, mock_tokenizer, mock_model, mock_config, mock_from_config):
+        """Test a worker registry attaches to weights shared by another."""
+        mock_model.return_value.named_buffers.return_value = []
+        self.registry.register_model('test_model', self.model_path, '1.0.0')
+        shared = self.registry.share_model('test_model')
+
+        self.assertIsNotNone(shared)
+        mock_model.return_value.share_memory.assert_called_once()
+        self.assertIs(shared['state_dict'], mock_model.return_value.state_dict.return_value)
+
+        # A second registry reading the same registry.json attaches to them
+        worker = ModelRegistry(self.config)
+        loaded = worker.attach_model(shared)
+
+        self.assertIsNotNone(loaded)
+        mock_from_config.return_value.load_state_dict.assert_called_once_with(
+            shared['state_dict'], assign=True
+        )
+        self.assertIn('test_model:1.0.0', worker.active_models)
+        mock_model.assert_called_once()
+
+        # Weights for a different model hash are rejected
+        worker.unload_model('test_model', '1.0.0')
+        self.assertIsNone(worker.attach_model({**shared, 'hash': 'stale'}))
+
+    @patch('transformers.AutoTokenizer.from_pretrained')
+    def test_attach_forward(self, mock_tokenizer):
+        """Test an attached model runs the same forward pass as its source."""
+        from transformers import GPT2Config, GPT2LMHeadModel
+        
+        source = GPT2LMHeadModel(GPT2Config(n_layer=1, n_embd=8, n_head=2, vocab_size=32))
+        source.save_pretrained(self.model_path)
+        self.registry.register_model('test_model', self.model_path, '1.0.0')
+        shared = self.registry.share_model('test_model')
+        
+        # Non-persistent buffers are restored on the shared tensors
+        worker = ModelRegistry(self.config)
+        attached = worker.attach_model(shared)['model']
+        self.assertFalse(any(b.is_meta for b in attached.buffers()))
+        
+        input_ids = torch.tensor([[1, 2, 3, 4]])
+        with torch.no_grad():
+            expected = self.registry.active_models['test_model:1.0.0']['model'](input_ids).logits
+            actual = attached(input_ids).logits
+        self.assertTrue(torch.equal(actual, expected))
+    
+    def test_latest_version(self):
+        """Test the latest version is resolved semantically."""
+        for version in ('2.0.0', '10.0.0', '9.1.0'):
+            self.registry.register_model('test_model', self.model_path, version)
+
+        self.assertEqual(self.registry.get_model_info('test_model')['version'], '10.0.0')
+
+        # The latest version is rebuilt when the registry is reloaded
+        registry = ModelRegistry(self.config)
+        self.assertEqual(registry.get_model_info('test_model')['version'], '10.0.0')
+
     def test_validate_model_files(self):
         """Test model file validation."""
         # Test with valid model path
@@ -190,6 +334,13 @@ class TestModelRegistry(unittest.TestCase):
         invalid_path = os.path.join(self.test_dir, 'invalid_model')
         os.makedirs(invalid_path)
         self.assertFalse(self.registry._validate_model_files(invalid_path))
+        
+        # safetensors weights are accepted in place of pytorch_model.bin
+        os.rename(
+            os.path.join(self.model_path, 'pytorch_model.bin'),
+            os.path.join(self.model_path, 'model.safetensors')
+        )
+        self.assertTrue(self.registry._validate_model_files(self.model_path))
     
     def test_calculate_model_hash(self):
         """Test model hash calculation."""
@@ -207,6 +358,40 @@ class TestModelRegistry(unittest.TestCase):
         
         hash3 = self.registry._calculate_model_hash(self.model_path)
         self.assertNotEqual(hash1, hash3)
+
+    def test_legacy_model_hash(self):
+        """Test entries without 'hash_algo' keep the whole-directory SHA-256."""
+        hasher = hashlib.sha256()
+        for filename in sorted(os.listdir(self.model_path)):
+            with open(os.path.join(self.model_path, filename), 'rb') as f:
+                hasher.update(f.read())
+        
+        self.assertEqual(
+            self.registry._calculate_model_hash(self.model_path, LEGACY_HASH_ALGO),
+            hasher.hexdigest()
+        )
+        self.assertNotEqual(
+            self.registry._calculate_model_hash(self.model_path, 'sha256'),
+            hasher.hexdigest()
+        )
+    
+    def test_hash_cache_reused(self):
+        """Test unchanged files are not re-hashed on re-registration."""
+        # Pin a hashlib algorithm so every file read goes through file_digest
+        config = {**self.config, 'hash_algo': 'sha256'}
+        registry = ModelRegistry(config)
+        with patch('hashlib.file_digest', wraps=hashlib.file_digest) as mock_digest:
+            registry.register_model('test_model', self.model_path, '1.0.0')
+        self.assertTrue(mock_digest.called)
+
+        # A fresh registry picks up file digests from registry.json
+        registry = ModelRegistry(config)
+        with patch('hashlib.file_digest') as mock_digest:
+            registry.register_model('test_model', self.model_path, '2.0.0')
+
+        mock_digest.assert_not_called()
+        versions = registry.registry['test_model']['versions']
+        self.assertEqual(versions['1.0.0']['hash'], versions['2.0.0']['hash'])
     
     def test_error_handling(self):
         """Test error handling scenarios."""
@@ -221,6 +406,34 @@ class TestModelRegistry(unittest.TestCase):
         # Test registering model with invalid path
         result = self.registry.register_model('test_model', '/invalid/path', '1.0.0')
         self.assertFalse(result)
+        
+        # Test loading with an unknown quantization mode
+        self.registry.register_model('test_model', self.model_path, '1.0.0')
+        result = self.registry.load_model('test_model', '1.0.0', quantization='int4')
+        self.assertIsNone(result)
+    
+    @unittest.skipUnless(_fp8_matmul_supported(), "FP8 matmul requires an sm_89+ GPU")
+    def test_quantize_fp8(self):
+        """Test FP8 weight quantization keeps lm_head in full precision."""
+        model = _TinyLM().to('cuda', torch.bfloat16)
+        x = torch.randn(2, 16, device='cuda', dtype=torch.bfloat16)
+        expected = model(x)
+        
+        model = quantize_fp8(model)
+        
+        self.assertIsInstance(model.block[0], FP8Linear)
+        self.assertEqual(model.block[0].weight.dtype, torch.float8_e4m3fn)
+        self.assertIsInstance(model.lm_head, torch.nn.Linear)
+        self.assertTrue(torch.allclose(model(x), expected, atol=0.1))
+    
+    @unittest.skipUnless(hasattr(torch, 'float8_e4m3fn'), "FP8 requires torch>=2.1")
+    @patch('src.llm.model_registry._fp8_matmul_supported', return_value=False)
+    def test_quantize_fp8_unsupported(self, mock_supported):
+        """Test models keep 16-bit weights without FP8 matmul support."""
+        model = quantize_fp8(_TinyLM())
+        
+        self.assertIsInstance(model.block[0], torch.nn.Linear)
+        self.assertNotIsInstance(model.block[0], FP8Linear)
 
     def _verify_model_loaded(self, model_name: str, version: str) -> bool:
         """Helper to verify model is properly loaded."""